@@ -0,0 +1,466 @@
+"""Local async JSON API over the dashboard's data, for tools other than the browser.
+
+Runs next to (or instead of) Streamlit and shares the same snapshot manager,
+derived-result cache and query functions, so numbers always match the pages
+and nothing is re-read from CSV per request:
+
+- one asyncio coroutine per connection (HTTP/1.1 keep-alive), so thousands of
+  idle or slow consumers cost no threads
+- queries run in a small thread pool; pandas and SQLite release the GIL for
+  most of their work
+- JSON bodies are cached per (URL, data version) in the shared LRU cache and
+  carry the version as ETag, so repeat polls are answered with 304
+- exports are streamed with chunked transfer encoding, one chunk of rows at a
+  time, so memory does not grow with the result size
+
+Endpoints (all GET):
+    /health                          data version and snapshot state
+    /kpis?names=a,b                  metrics from utils.kpis (all by default)
+    /disagreements                   filtered, searched, paginated rows
+    /disagreements/<post_id>         one row
+    /disagreements/<post_id>/similar near-duplicate rows
+    /annotators                      annotator stats, filterable and sortable
+    /annotators/<id>                 one annotator, with leave-one-out impact
+    /review-queue                    posts with no agreement, paginated
+    /export/disagreements            every matching row as NDJSON or CSV
+
+Filters: agreement_type, majority_label, rca_category (comma-separated or
+repeated), q for text search, limit and offset for pagination.
+
+Usage:
+    python -m api.server --port 8765
+"""
+import argparse
+import asyncio
+import json
+import re
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+from pathlib import Path
+from urllib.parse import parse_qs, unquote, urlsplit
+
+# Reuse the dashboard's loaders and caches; utils is importable the same way the pages do it
+sys.path.append(str(Path(__file__).parent.parent / 'app'))
+from utils import queries
+from utils.cache import SHARED_CACHE
+from utils.data_loader import MANAGER, current_snapshot
+from utils.kpis import KPIS, kpi
+from utils.metrics import REGISTRY
+from utils.sql_backend import FILTER_COLUMNS
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1_000
+STREAM_CHUNK_ROWS = 5_000
+QUERY_WORKERS = 8
+MAX_CONNECTIONS = 1_000
+KEEPALIVE_SECONDS = 30
+# How long a refused client gets to send its request (before a 503, after a 431)
+REFUSE_READ_SECONDS = 1
+MAX_HEADER_BYTES = 16 * 1024
+
+REGISTRY.describe('dashboard_api_requests_total', 'counter', 'API requests by route and status')
+REGISTRY.describe('dashboard_api_request_seconds', 'summary', 'API time to first byte by route')
+REGISTRY.describe('dashboard_api_connections', 'gauge', 'Open API connections')
+
+
+class ApiError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class Stream:
+    """Response body produced chunk by chunk from a generator of bytes"""
+
+    def __init__(self, chunks, content_type):
+        self.chunks = chunks
+        self.content_type = content_type
+
+
+# ===================
+# Parameters
+# ===================
+class Params:
+    def __init__(self, query_string):
+        self.values = parse_qs(query_string, keep_blank_values=False)
+
+    def get(self, name, default=None):
+        values = self.values.get(name)
+        return values[-1] if values else default
+
+    def list(self, name):
+        """Comma-separated and repeated values combined, or None if absent"""
+        if name not in self.values:
+            return None
+        return tuple(v for value in self.values[name] for v in value.split(',') if v)
+
+    def int(self, name, default, low=0, high=None):
+        raw = self.get(name)
+        if raw is None:
+            return default
+        try:
+            value = int(raw)
+        except ValueError:
+            raise ApiError(400, f"{name} must be an integer") from None
+        if high is None and value < low:
+            raise ApiError(400, f"{name} must be at least {low}")
+        if high is not None and not low <= value <= high:
+            raise ApiError(400, f"{name} must be between {low} and {high}")
+        return value
+
+    def filters(self):
+        return tuple(self.list(column) for column in FILTER_COLUMNS)
+
+    def page(self):
+        return self.int('limit', DEFAULT_PAGE_SIZE, 1, MAX_PAGE_SIZE), self.int('offset', 0)
+
+    def cache_key(self):
+        return tuple(sorted((k, tuple(v)) for k, v in self.values.items()))
+
+
+def encode(obj):
+    return json.dumps(obj, default=_json_default).encode()
+
+
+def _json_default(obj):
+    # numpy scalars from aggregates and KPI values
+    if hasattr(obj, 'item'):
+        return obj.item()
+    return str(obj)
+
+
+def records(df):
+    """JSON-ready list of row dicts; NaN becomes null"""
+    return json.loads(df.to_json(orient='records', date_format='iso'))
+
+
+def page_body(snapshot, total, limit, offset, rows):
+    return {
+        'version': snapshot.version,
+        'total': int(total),
+        'limit': limit,
+        'offset': offset,
+        'next_offset': offset + limit if offset + limit < total else None,
+        'rows': records(rows),
+    }
+
+
+# ===================
+# Endpoints
+# ===================
+def health(snapshot, params):
+    return {'status': 'ok', 'version': snapshot.version, 'built_at': snapshot.built_at,
+            'backend': 'sqlite' if snapshot.db_path else 'pandas'}
+
+
+def kpis(snapshot, params):
+    names = params.list('names') or [name for name in KPIS.metrics if name != 'summary']
+    unknown = [name for name in names if name not in KPIS.metrics]
+    if unknown:
+        raise ApiError(400, f"Unknown metrics: {', '.join(unknown)}")
+    return {'version': snapshot.version, 'kpis': {name: kpi(name, snapshot) for name in names}}
+
+
+def disagreements(snapshot, params):
+    filters, search = params.filters(), params.get('q', '')
+    limit, offset = params.page()
+    total = queries.count_rows(filters, search, snapshot)
+    rows = queries.select_rows(filters, search, limit, offset, snapshot)
+    return page_body(snapshot, total, limit, offset, rows)
+
+
+def disagreement(snapshot, params, post_id):
+    row = queries.get_post(post_id, snapshot)
+    if row is None:
+        raise ApiError(404, f"No disagreement sample {post_id!r}")
+    return json.loads(row.to_json(date_format='iso'))
+
+
+def similar(snapshot, params, post_id):
+    if queries.get_post(post_id, snapshot) is None:
+        raise ApiError(404, f"No disagreement sample {post_id!r}")
+    rows = queries.similar_posts(post_id, params.int('top_k', 5, 1, 50), snapshot)
+    return {'post_id': post_id, 'similar': [] if rows is None else records(rows)}
+
+
+def annotators(snapshot, params):
+    df = snapshot.table('annotators')
+    bias = params.list('bias_category')
+    if bias is not None:
+        df = df[df['bias_category'].isin(bias)]
+    sort = params.get('sort', 'agreement_rate')
+    if sort not in df.columns:
+        raise ApiError(400, f"Cannot sort by {sort!r}")
+    ascending = params.get('order', 'desc') == 'asc'
+    df = df.sort_values(sort, ascending=ascending, kind='stable')
+    limit, offset = params.page()
+    return page_body(snapshot, len(df), limit, offset, df.iloc[offset:offset + limit])
+
+
+def annotator(snapshot, params, annotator_id):
+    df = snapshot.table('annotators')
+    match = df[df['annotator_id'].astype(str) == annotator_id]
+    if len(match) == 0:
+        raise ApiError(404, f"No annotator {annotator_id!r}")
+    body = records(match)[0]
+    result = queries.annotator_impact(0.0, snapshot)
+    if result is not None:
+        impact = result[1]
+        row = impact[impact['annotator_id'].astype(str) == annotator_id]
+        body['impact'] = records(row.drop(columns='annotator_id'))[0] if len(row) else None
+    return body
+
+
+def review_queue(snapshot, params):
+    # Posts where all three annotators picked a different label
+    filters = (('None',), params.list('majority_label'), params.list('rca_category'))
+    limit, offset = params.page()
+    total = queries.count_rows(filters, '', snapshot)
+    rows = queries.select_rows(filters, '', limit, offset, snapshot)
+    return page_body(snapshot, total, limit, offset, rows)
+
+
+def export_disagreements(snapshot, params):
+    fmt = params.get('format', 'ndjson')
+    if fmt not in ('ndjson', 'csv'):
+        raise ApiError(400, "format must be ndjson or csv")
+    frames = queries.iter_rows(params.filters(), params.get('q', ''), STREAM_CHUNK_ROWS, snapshot)
+
+    def chunks():
+        for i, frame in enumerate(frames):
+            if fmt == 'csv':
+                yield frame.to_csv(index=False, header=i == 0).encode()
+            elif len(frame):
+                lines = frame.to_json(orient='records', lines=True, date_format='iso')
+                # Older pandas versions leave off the final newline
+                yield (lines if lines.endswith('\n') else lines + '\n').encode()
+    return Stream(chunks(), 'text/csv; charset=utf-8' if fmt == 'csv' else 'application/x-ndjson')
+
+
+# (pattern, route name, handler, cacheable); path segments are URL-decoded
+ROUTES = [
+    (re.compile(r'/health'), 'health', health, False),
+    (re.compile(r'/kpis'), 'kpis', kpis, True),
+    (re.compile(r'/disagreements'), 'disagreements', disagreements, True),
+    (re.compile(r'/disagreements/([^/]+)/similar'), 'similar', similar, True),
+    (re.compile(r'/disagreements/([^/]+)'), 'disagreement', disagreement, True),
+    (re.compile(r'/annotators'), 'annotators', annotators, True),
+    (re.compile(r'/annotators/([^/]+)'), 'annotator', annotator, True),
+    (re.compile(r'/review-queue'), 'review_queue', review_queue, True),
+    (re.compile(r'/export/disagreements'), 'export', export_disagreements, False),
+]
+
+
+def route(path):
+    for pattern, name, handler, cacheable in ROUTES:
+        match = pattern.fullmatch(path.rstrip('/') or '/')
+        if match:
+            return name, handler, cacheable, [unquote(g) for g in match.groups()]
+    raise ApiError(404, f"No route for {path}")
+
+
+def respond(path, query_string):
+    """(status, body, version) for one GET; runs in the worker pool
+
+    body is JSON-encoded bytes or a Stream.
+    """
+    name, handler, cacheable, args = route(path)
+    params = Params(query_string)
+    snapshot = current_snapshot()
+    if not cacheable:
+        result = handler(snapshot, params, *args)
+        return name, result if isinstance(result, Stream) else encode(result), snapshot.version
+    key = (f'api:{name}', snapshot.version, tuple(args), params.cache_key())
+    body = SHARED_CACHE.get_or_compute(key, lambda: encode(handler(snapshot, params, *args)), 'api')
+    return name, body, snapshot.version
+
+
+# ===================
+# HTTP
+# ===================
+class Server:
+    """Minimal HTTP/1.1 server: GET only, keep-alive, chunked streaming"""
+
+    def __init__(self, workers=QUERY_WORKERS, max_connections=MAX_CONNECTIONS):
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='api-query')
+        self.connections = asyncio.Semaphore(max_connections)
+        self.open = 0
+
+    async def handle(self, reader, writer):
+        if self.connections.locked():
+            # Full: refuse now rather than leave the client waiting for a free slot. The
+            # request head is read first so closing with unread input does not reset
+            # the connection before the client sees the 503.
+            try:
+                await asyncio.wait_for(reader.readuntil(b'\r\n\r\n'), REFUSE_READ_SECONDS)
+                await self._send(writer, 503, json.dumps({'error': 'Too many connections'}).encode(), False,
+                                 extra={'Retry-After': '1'})
+            except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, asyncio.TimeoutError,
+                    ConnectionError):
+                pass
+            finally:
+                writer.close()
+            REGISTRY.inc('dashboard_api_requests_total', {'route': 'unknown', 'status': 503})
+            return
+        async with self.connections:
+            self.open += 1
+            REGISTRY.set('dashboard_api_connections', self.open)
+            try:
+                while await self._serve_one(reader, writer):
+                    pass
+            except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, asyncio.TimeoutError,
+                    ConnectionError):
+                pass
+            finally:
+                self.open -= 1
+                REGISTRY.set('dashboard_api_connections', self.open)
+                writer.close()
+
+    async def _serve_one(self, reader, writer):
+        """Read and answer one request; returns whether to keep the connection open"""
+        try:
+            head = await asyncio.wait_for(reader.readuntil(b'\r\n\r\n'), KEEPALIVE_SECONDS)
+        except asyncio.LimitOverrunError:
+            await self._send_json(writer, 431, {'error': f'Request headers exceed {MAX_HEADER_BYTES} bytes'},
+                                  keep_alive=False)
+            await self._discard_input(reader, writer)
+            return False
+        lines = head.decode('latin-1').split('\r\n')
+        try:
+            method, target, version = lines[0].split(' ', 2)
+        except ValueError:
+            await self._send_json(writer, 400, {'error': 'Malformed request line'}, keep_alive=False)
+            return False
+        headers = {}
+        for line in lines[1:]:
+            if ':' in line:
+                key, value = line.split(':', 1)
+                headers[key.strip().lower()] = value.strip()
+        try:
+            length = int(headers.get('content-length') or 0)
+        except ValueError:
+            length = -1
+        if length < 0:
+            # Without a valid length the body cannot be skipped, so the connection ends here
+            await self._send_json(writer, 400, {'error': 'Malformed Content-Length'}, keep_alive=False)
+            return False
+        if length:
+            await reader.readexactly(length)
+
+        connection = headers.get('connection', '').lower()
+        keep_alive = connection != 'close' and (version == 'HTTP/1.1' or connection == 'keep-alive')
+        if method != 'GET':
+            await self._send_json(writer, 405, {'error': 'Only GET is supported'}, keep_alive)
+            return keep_alive
+
+        start = time.perf_counter()
+        url = urlsplit(target)
+        name = 'unknown'
+        loop = asyncio.get_running_loop()
+        try:
+            name, body, data_version = await loop.run_in_executor(self.executor, respond, url.path, url.query)
+        except ApiError as exc:
+            status = exc.status
+            await self._send_json(writer, status, {'error': str(exc)}, keep_alive)
+        except Exception as exc:
+            status = 500
+            await self._send_json(writer, status, {'error': f'{type(exc).__name__}: {exc}'}, keep_alive)
+        else:
+            status = 200
+            etag = f'"{data_version}"'
+            if isinstance(body, Stream):
+                keep_alive = await self._send_stream(writer, body, keep_alive, loop)
+            elif headers.get('if-none-match') == etag:
+                status = 304
+                await self._send(writer, 304, b'', keep_alive, extra={'ETag': etag})
+            else:
+                await self._send(writer, 200, body, keep_alive, extra={'ETag': etag})
+        REGISTRY.inc('dashboard_api_requests_total', {'route': name, 'status': status})
+        REGISTRY.observe('dashboard_api_request_seconds', time.perf_counter() - start, {'route': name})
+        return keep_alive
+
+    async def _send(self, writer, status, body, keep_alive, content_type='application/json', extra=None):
+        head = [
+            f'HTTP/1.1 {status} {HTTPStatus(status).phrase}',
+            f'Content-Type: {content_type}',
+            f'Content-Length: {len(body)}',
+            f"Connection: {'keep-alive' if keep_alive else 'close'}",
+        ]
+        head.extend(f'{k}: {v}' for k, v in (extra or {}).items())
+        writer.write(('\r\n'.join(head) + '\r\n\r\n').encode('latin-1') + body)
+        await writer.drain()
+
+    async def _discard_input(self, reader, writer):
+        """Half-close and drop what the client is still sending, briefly
+
+        Closing with unread input resets the connection, which can destroy an error
+        response the client has not read yet.
+        """
+        if writer.can_write_eof():
+            writer.write_eof()
+        deadline = time.monotonic() + REFUSE_READ_SECONDS
+        try:
+            while time.monotonic() < deadline:
+                if not await asyncio.wait_for(reader.read(MAX_HEADER_BYTES), deadline - time.monotonic()):
+                    break
+        except (asyncio.TimeoutError, ConnectionError):
+            pass
+
+    async def _send_json(self, writer, status, obj, keep_alive):
+        await self._send(writer, status, json.dumps(obj).encode(), keep_alive)
+
+    async def _send_stream(self, writer, stream, keep_alive, loop):
+        head = [
+            'HTTP/1.1 200 OK',
+            f'Content-Type: {stream.content_type}',
+            'Transfer-Encoding: chunked',
+            f"Connection: {'keep-alive' if keep_alive else 'close'}",
+        ]
+        writer.write(('\r\n'.join(head) + '\r\n\r\n').encode('latin-1'))
+        try:
+            while True:
+                # Produce the next chunk off the event loop; drain() applies backpressure
+                chunk = await loop.run_in_executor(self.executor, next, stream.chunks, None)
+                if chunk is None:
+                    break
+                if chunk:
+                    writer.write(f'{len(chunk):x}\r\n'.encode() + chunk + b'\r\n')
+                    await writer.drain()
+        except Exception:
+            # Headers are already sent; dropping the connection without the
+            # final chunk tells the client the body is incomplete
+            return False
+        finally:
+            # Releases the query's cursor if the client went away mid-stream
+            stream.chunks.close()
+        writer.write(b'0\r\n\r\n')
+        await writer.drain()
+        return keep_alive
+
+
+async def serve(host, port, workers=QUERY_WORKERS):
+    server = Server(workers)
+    # Build the first snapshot in the background; early requests wait for it
+    MANAGER.start()
+    listener = await asyncio.start_server(server.handle, host, port, limit=MAX_HEADER_BYTES)
+    print(f"Serving the dashboard API on http://{host}:{port}")
+    async with listener:
+        await listener.serve_forever()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--workers', type=int, default=QUERY_WORKERS, help='threads running queries')
+    args = parser.parse_args(argv)
+    try:
+        asyncio.run(serve(args.host, args.port, args.workers))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -1,5 +1,13 @@
 # app/app.py
 import streamlit as st
+from pathlib import Path
+import sys
+
+# Make utils importable the same way the pages do
+sys.path.append(str(Path(__file__).parent))
+from utils.data_loader import MANAGER
+from utils.kpis import kpi
+from utils.metrics import start_rerun
 
 # Page config (must be first Streamlit command)
 st.set_page_config(
@@ -8,12 +16,18 @@ st.set_page_config(
     layout="wide",
     initial_sidebar_state="expanded"
 )
+with start_rerun("Home"):
+    # Start parsing data/ in the background while the welcome text renders
+    MANAGER.start()
+
+    # Main page content
+    st.title("🎯 AI Data Labeling & Quality Dashboard")
+    st.markdown("---")
 
-# Main page content
-st.title("🎯 AI Data Labeling & Quality Dashboard")
-st.markdown("---")
+    alpha = kpi('krippendorff_alpha')
+    full_agreement = kpi('full_agreement_rate')
 
-st.markdown("""
+    st.markdown(f"""
 ## Welcome!
 
 This dashboard analyzes **HateXplain dataset** to monitor data labeling quality 
@@ -27,23 +41,24 @@ and identify areas for guideline improvement.
 | **🔍 Disagreement Explorer** | Explore samples where annotators disagree |
 | **👥 Annotator Analysis** | Analyze individual annotator behavior and bias |
 | **🎯 RCA Summary** | Root Cause Analysis of disagreements |
+| **📈 Trends** | Quality KPIs across pipeline runs |
 
 ### 🔑 Key Findings:
 
-- **Krippendorff's Alpha**: 0.46 (Below acceptable threshold of 0.667)
-- **Full Agreement Rate**: 48.9% (Only half of samples have unanimous agreement)
+- **Krippendorff's Alpha**: {alpha:.2f} ({'Below' if alpha < 0.667 else 'Above'} acceptable threshold of 0.667)
+- **Full Agreement Rate**: {full_agreement:.1f}% (Share of samples with unanimous agreement)
 - **Main Confusion**: `offensive` vs `hatespeech` labels
 
 ---
 👈 **Select a page from the sidebar to begin exploring!**
 """)
 
-# Sidebar info
-# st.sidebar.success("Select a page above.")
-# st.sidebar.markdown("---")
-st.sidebar.markdown("""
+    # Sidebar info
+    # st.sidebar.success("Select a page above.")
+    # st.sidebar.markdown("---")
+    st.sidebar.markdown(f"""
 ### About
 - **Dataset**: HateXplain
-- **Samples**: 20,148
-- **Annotators**: 253
-""")
\ No newline at end of file
+- **Samples**: {kpi('total_posts'):,}
+- **Annotators**: {kpi('total_annotators'):,}
+""")
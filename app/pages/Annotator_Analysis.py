@@ -1,121 +1,129 @@
 # app/pages/3_👥_Annotator_Analysis.py
 import streamlit as st
 import pandas as pd
-import plotly.express as px
-import plotly.graph_objects as go
 from pathlib import Path
 import sys
 
 # Add parent directory to path for imports
 sys.path.append(str(Path(__file__).parent.parent))
-from utils.data_loader import load_annotators, load_summary
+from utils.data_loader import current_snapshot
+from utils.kpis import kpi
+from utils.charts import cached_figure, histogram, scatter
+from utils.fragments import fragment
+from utils.metrics import start_rerun
+from utils.queries import DRIFT_WINDOW, annotator_drift, annotator_impact, value_counts
 
 # Page config
 st.set_page_config(page_title="Annotator Analysis", page_icon="👥", layout="wide")
+with start_rerun("Annotator_Analysis"):
+    st.title("👥 Annotator Analysis")
+    st.markdown("Analyze individual annotator behavior, bias patterns, and quality metrics")
+    st.markdown("---")
 
-st.title("👥 Annotator Analysis")
-st.markdown("Analyze individual annotator behavior, bias patterns, and quality metrics")
-st.markdown("---")
-
-# Load data
-annotators = load_annotators()
-summary = load_summary()
-
-# ===================
-# ROW 1: Summary Stats
-# ===================
-col1, col2, col3, col4 = st.columns(4)
-
-with col1:
-    st.metric("Annotators (100+ labels)", f"{len(annotators)}")
-with col2:
-    st.metric("Mean Agreement Rate", f"{summary['annotator_mean_agreement']}%")
-with col3:
-    st.metric("Strict Annotators", f"{summary['strict_annotators_pct']}%")
-with col4:
-    st.metric("Lenient Annotators", f"{summary['lenient_annotators_pct']}%")
-
-st.markdown("---")
-
-# ===================
-# ROW 2: Bias Distribution
-# ===================
-st.subheader("Annotator Bias Distribution")
-
-col1, col2 = st.columns(2)
-
-with col1:
-    # Pie chart of bias categories
-    bias_counts = annotators['bias_category'].value_counts().reset_index()
-    bias_counts.columns = ['Bias Category', 'Count']
-    
-    fig1 = px.pie(
-        bias_counts,
-        values='Count',
-        names='Bias Category',
-        title='Bias Category Distribution',
-        color='Bias Category',
-        color_discrete_map={
-            'Lenient (soft)': '#2ecc71',
-            'Balanced': '#3498db',
-            'Strict (harsh)': '#e74c3c'
-        }
-    )
-    fig1.update_traces(textposition='inside', textinfo='percent+label')
-    st.plotly_chart(fig1, use_container_width=True)
+    # ===================
+    # ROW 1: Summary Stats
+    # ===================
+    # These KPIs only need the tiny summary table
+    col1, col2, col3, col4 = st.columns(4)
 
-with col2:
-    st.markdown("""
+    with col1:
+        annotator_count_slot = st.empty()
+        annotator_count_slot.metric("Annotators (100+ labels)", "...")
+    with col2:
+        st.metric("Mean Agreement Rate", f"{kpi('annotator_mean_agreement')}%")
+    with col3:
+        st.metric("Strict Annotators", f"{kpi('strict_annotators_pct')}%")
+    with col4:
+        st.metric("Lenient Annotators", f"{kpi('lenient_annotators_pct')}%")
+
+    st.markdown("---")
+
+    # Everything below needs the annotator table and Plotly, loaded after first paint
+    with st.spinner("Loading annotator data..."):
+        snapshot = current_snapshot()
+        import plotly.express as px
+        import plotly.graph_objects as go
+    annotators = snapshot.table('annotators')
+    annotator_count_slot.metric("Annotators (100+ labels)", f"{len(annotators)}")
+
+    # ===================
+    # ROW 2: Bias Distribution
+    # ===================
+    st.subheader("Annotator Bias Distribution")
+
+    col1, col2 = st.columns(2)
+
+    with col1:
+        # Pie chart of bias categories
+        bias_counts = value_counts('annotators', 'bias_category', snapshot).set_axis(['Bias Category', 'Count'], axis=1)
+
+        fig1 = px.pie(
+            bias_counts,
+            values='Count',
+            names='Bias Category',
+            title='Bias Category Distribution',
+            color='Bias Category',
+            color_discrete_map={
+                'Lenient (soft)': '#2ecc71',
+                'Balanced': '#3498db',
+                'Strict (harsh)': '#e74c3c'
+            }
+        )
+        fig1.update_traces(textposition='inside', textinfo='percent+label')
+        st.plotly_chart(fig1, use_container_width=True)
+
+    with col2:
+        st.markdown("""
     ### How I defined bias categories
-    
+
     I calculated a **strictness score** for each annotator:
-    
+
     `Strictness = % hatespeech labels - % normal labels`
-    
+
     - **Strict (score > 20)**: Labels 'hatespeech' much more than 'normal'
     - **Lenient (score < -20)**: Labels 'normal' much more than 'hatespeech'  
     - **Balanced (between -20 and 20)**: Relatively even distribution
-    
+
     The threshold of ±20 is somewhat arbitrary - I chose it because it captures 
     annotators who are clearly skewed in one direction.
     """)
 
-st.markdown("---")
-
-# ===================
-# ROW 3: Scatter Plot - Strictness vs Agreement
-# ===================
-st.subheader("Strictness vs Agreement Rate")
-
-fig2 = px.scatter(
-    annotators,
-    x='strictness_score',
-    y='agreement_rate',
-    size='total_labels',
-    color='bias_category',
-    hover_data=['annotator_id', 'total_labels', 'hatespeech_pct', 'normal_pct'],
-    title='Annotator Behavior Map',
-    labels={
-        'strictness_score': 'Strictness Score (- Lenient, + Strict)',
-        'agreement_rate': 'Agreement Rate with Majority',
-        'bias_category': 'Bias Category'
-    },
-    color_discrete_map={
-        'Lenient (soft)': '#2ecc71',
-        'Balanced': '#3498db',
-        'Strict (harsh)': '#e74c3c'
-    }
-)
-
-# Add reference lines
-fig2.add_hline(y=annotators['agreement_rate'].mean(), line_dash="dash", 
-               line_color="gray", annotation_text="Mean Agreement")
-fig2.add_vline(x=0, line_dash="dash", line_color="gray")
-
-fig2.update_layout(height=500)
-st.plotly_chart(fig2, use_container_width=True)
-
-st.markdown("""
+    st.markdown("---")
+
+    # ===================
+    # ROW 3: Scatter Plot - Strictness vs Agreement
+    # ===================
+    st.subheader("Strictness vs Agreement Rate")
+
+    fig2 = scatter(
+        annotators,
+        x='strictness_score',
+        y='agreement_rate',
+        size='total_labels',
+        color='bias_category',
+        hover_data=['annotator_id', 'total_labels', 'hatespeech_pct', 'normal_pct'],
+        title='Annotator Behavior Map',
+        labels={
+            'strictness_score': 'Strictness Score (- Lenient, + Strict)',
+            'agreement_rate': 'Agreement Rate with Majority',
+            'bias_category': 'Bias Category'
+        },
+        color_discrete_map={
+            'Lenient (soft)': '#2ecc71',
+            'Balanced': '#3498db',
+            'Strict (harsh)': '#e74c3c'
+        }
+    )
+
+    # Add reference lines
+    fig2.add_hline(y=annotators['agreement_rate'].mean(), line_dash="dash", 
+                   line_color="gray", annotation_text="Mean Agreement")
+    fig2.add_vline(x=0, line_dash="dash", line_color="gray")
+
+    fig2.update_layout(height=500)
+    st.plotly_chart(fig2, use_container_width=True)
+
+    st.markdown("""
 **How to read this chart:**
 
 The ideal annotators are at the **top** (high agreement with majority), regardless of whether 
@@ -127,107 +135,269 @@ that being too lenient correlates with lower quality more than being too strict.
 Maybe it's easier to spot obvious hate speech than to correctly identify borderline 'normal' content?
 """)
 
-st.markdown("---")
-
-# ===================
-# ROW 4: Agreement Rate Distribution
-# ===================
-st.subheader("Agreement Rate Distribution")
-
-fig3 = px.histogram(
-    annotators,
-    x='agreement_rate',
-    nbins=20,
-    title='Distribution of Annotator Agreement Rates',
-    labels={'agreement_rate': 'Agreement Rate', 'count': 'Number of Annotators'},
-    color_discrete_sequence=['#3498db']
-)
-fig3.add_vline(x=annotators['agreement_rate'].mean(), line_dash="dash", 
-               line_color="red", annotation_text=f"Mean: {annotators['agreement_rate'].mean():.1%}")
-st.plotly_chart(fig3, use_container_width=True)
-
-st.markdown("---")
-
-# ===================
-# ROW 5: Top/Bottom Annotators
-# ===================
-st.subheader("Annotator Leaderboard")
-
-col1, col2 = st.columns(2)
-
-with col1:
-    st.markdown("### Top 10 by Agreement Rate")
-    top_annotators = annotators.nlargest(10, 'agreement_rate')[
-        ['annotator_id', 'total_labels', 'agreement_rate', 'bias_category']
-    ].copy()
-    top_annotators['agreement_rate'] = top_annotators['agreement_rate'].apply(lambda x: f"{x:.1%}")
-    st.dataframe(top_annotators, use_container_width=True, hide_index=True)
-
-with col2:
-    st.markdown("### Bottom 10 by Agreement Rate")
-    bottom_annotators = annotators.nsmallest(10, 'agreement_rate')[
-        ['annotator_id', 'total_labels', 'agreement_rate', 'bias_category']
-    ].copy()
-    bottom_annotators['agreement_rate'] = bottom_annotators['agreement_rate'].apply(lambda x: f"{x:.1%}")
-    st.dataframe(bottom_annotators, use_container_width=True, hide_index=True)
-
-st.markdown("""
+    st.markdown("---")
+
+    # ===================
+    # ROW 4: Agreement Rate Distribution
+    # ===================
+    st.subheader("Agreement Rate Distribution")
+
+    fig3 = histogram(
+        annotators,
+        x='agreement_rate',
+        nbins=20,
+        title='Distribution of Annotator Agreement Rates',
+        labels={'agreement_rate': 'Agreement Rate', 'count': 'Number of Annotators'},
+        color='#3498db'
+    )
+    fig3.add_vline(x=annotators['agreement_rate'].mean(), line_dash="dash", 
+                   line_color="red", annotation_text=f"Mean: {annotators['agreement_rate'].mean():.1%}")
+    st.plotly_chart(fig3, use_container_width=True)
+
+    st.markdown("---")
+
+    # ===================
+    # ROW 5: Top/Bottom Annotators
+    # ===================
+    st.subheader("Annotator Leaderboard")
+
+    col1, col2 = st.columns(2)
+
+    with col1:
+        st.markdown("### Top 10 by Agreement Rate")
+        top_annotators = annotators.nlargest(10, 'agreement_rate')[
+            ['annotator_id', 'total_labels', 'agreement_rate', 'bias_category']
+        ].copy()
+        top_annotators['agreement_rate'] = top_annotators['agreement_rate'].apply(lambda x: f"{x:.1%}")
+        st.dataframe(top_annotators, use_container_width=True, hide_index=True)
+
+    with col2:
+        st.markdown("### Bottom 10 by Agreement Rate")
+        bottom_annotators = annotators.nsmallest(10, 'agreement_rate')[
+            ['annotator_id', 'total_labels', 'agreement_rate', 'bias_category']
+        ].copy()
+        bottom_annotators['agreement_rate'] = bottom_annotators['agreement_rate'].apply(lambda x: f"{x:.1%}")
+        st.dataframe(bottom_annotators, use_container_width=True, hide_index=True)
+
+    st.markdown("""
 Looking at the bottom 10, most have the 'Lenient' bias. These annotators might benefit from 
 reviewing the guidelines again, especially around what counts as 'offensive' vs 'normal'.
 """)
 
-st.markdown("---")
-
-# ===================
-# ROW 6: Individual Annotator Deep Dive
-# ===================
-st.subheader("Individual Annotator Deep Dive")
-
-# Select annotator
-selected_id = st.selectbox(
-    "Select Annotator ID",
-    options=annotators['annotator_id'].tolist(),
-    index=0
-)
-
-if selected_id:
-    ann = annotators[annotators['annotator_id'] == selected_id].iloc[0]
-    
-    col1, col2, col3 = st.columns(3)
-    
-    with col1:
-        st.metric("Total Labels", f"{int(ann['total_labels']):,}")
-        st.metric("Agreement Rate", f"{ann['agreement_rate']:.1%}")
-    
-    with col2:
-        st.metric("Strictness Score", f"{ann['strictness_score']:.1f}")
-        st.metric("Bias Category", ann['bias_category'])
-    
-    with col3:
-        # Mini pie chart for label distribution
-        fig4 = go.Figure(data=[go.Pie(
-            labels=['Normal', 'Offensive', 'Hatespeech'],
-            values=[ann['normal_pct'], ann['offensive_pct'], ann['hatespeech_pct']],
-            hole=0.4,
-            marker_colors=['#3498db', '#f39c12', '#e74c3c']
-        )])
-        fig4.update_layout(
-            title=f"Label Distribution",
-            height=250,
-            margin=dict(t=50, b=0, l=0, r=0)
+    st.markdown("---")
+
+    # ===================
+    # ROW 6: Counterfactual Impact
+    # ===================
+    st.subheader("What if an annotator's labels were dropped?")
+
+    st.markdown("""
+Agreement rate alone doesn't say how much an annotator actually moves the dataset. This section 
+recomputes alpha and the full agreement rate **without** each annotator (or with their labels 
+down-weighted). A positive delta means the numbers would improve without them - those are the 
+first people I'd invite to a calibration session. *Pivotal posts* are posts where their vote 
+decides the majority label.
+""")
+
+
+    def impact_figure(ranking):
+        fig = go.Figure(go.Bar(
+            x=ranking['alpha_delta'],
+            y=ranking['annotator_id'].astype(str),
+            orientation='h',
+            marker_color=['#e74c3c' if d > 0 else '#2ecc71' for d in ranking['alpha_delta']],
+            customdata=ranking[['alpha_without', 'labels']],
+            hovertemplate='Annotator %{y}<br>Alpha without: %{customdata[0]:.4f}<br>'
+                          'Delta: %{x:+.4f}<br>Labels: %{customdata[1]}<extra></extra>',
+        ))
+        fig.update_layout(
+            title='Largest alpha changes (red: alpha rises without them)',
+            xaxis_title='Change in alpha',
+            yaxis={'type': 'category', 'autorange': 'reversed'},
+            height=500,
         )
-        st.plotly_chart(fig4, use_container_width=True)
-    
-    # Interpretation - more natural language
-    if ann['bias_category'] == 'Strict (harsh)':
-        st.warning(f"""
-        This annotator labels **{ann['hatespeech_pct']:.1f}%** as hatespeech - higher than average.
-        Worth checking if they're catching things others miss, or if they're being overly aggressive.
-        """)
-    elif ann['bias_category'] == 'Lenient (soft)':
-        st.warning(f"""
-        This annotator labels **{ann['normal_pct']:.1f}%** as normal - higher than average.
-        They might be missing some borderline harmful content.
-        """)
-    else:
-        st.success(f"This annotator has a fairly balanced distribution across all three labels.")
\ No newline at end of file
+        return fig
+
+
+    # The weight slider only affects this section
+    @fragment('annotator_impact')
+    def impact_section():
+        snapshot = current_snapshot()
+        weight = st.select_slider(
+            "Weight kept on the annotator's labels",
+            options=[0.0, 0.25, 0.5, 0.75],
+            value=0.0,
+            format_func=lambda w: "Removed" if w == 0 else f"{w:.0%}",
+        )
+        result = annotator_impact(weight, snapshot)
+        if result is None:
+            st.caption("Impact analysis needs `annotations.csv` - run `python -m pipeline.ingest` to create it.")
+            return
+        baseline, impact = result
+
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            st.metric("Alpha (all annotators)", f"{baseline['alpha']:.4f}")
+        with col2:
+            st.metric("Annotators lowering alpha", f"{int((impact['alpha_delta'] > 0).sum())}")
+        with col3:
+            best = impact.iloc[0]
+            st.metric("Best single removal", f"{best['alpha_without']:.4f}",
+                      delta=f"{best['alpha_delta']:+.4f} (annotator {best['annotator_id']})")
+
+        col1, col2 = st.columns(2)
+        with col1:
+            ranking = pd.concat([impact.head(10), impact.tail(10)]).drop_duplicates('annotator_id')
+            fig = cached_figure('annotator_impact', snapshot.version, lambda: impact_figure(ranking), weight)
+            st.plotly_chart(fig, use_container_width=True)
+        with col2:
+            st.dataframe(
+                impact,
+                use_container_width=True,
+                hide_index=True,
+                height=500,
+                column_config={
+                    'annotator_id': st.column_config.NumberColumn('Annotator', format='%d'),
+                    'labels': st.column_config.NumberColumn('Labels', format='%d'),
+                    'alpha_without': st.column_config.NumberColumn('Alpha without', format='%.4f'),
+                    'alpha_delta': st.column_config.NumberColumn('Δ alpha', format='%+.4f'),
+                    'full_agreement_without': st.column_config.NumberColumn('Full agreement without', format='%.1f%%'),
+                    'full_agreement_delta': st.column_config.NumberColumn('Δ full agreement', format='%+.2f'),
+                    'pivotal_posts': st.column_config.NumberColumn('Pivotal posts', format='%d'),
+                    'pivotal_pct': st.column_config.NumberColumn('Pivotal %', format='%.1f%%'),
+                }
+            )
+
+
+    impact_section()
+
+    st.markdown("---")
+
+    # ===================
+    # ROW 7: Individual Annotator Deep Dive
+    # ===================
+    st.subheader("Individual Annotator Deep Dive")
+
+    # The selectbox only affects this section, so it runs as a fragment
+    def drift_figure(timeline, change_points, basis):
+        from plotly.subplots import make_subplots
+
+        fig = make_subplots(rows=2, cols=1, shared_xaxes=True, vertical_spacing=0.08,
+                            subplot_titles=('Strictness', 'Agreement with Majority'))
+        for row, signal in [(1, 'strictness'), (2, 'agreement')]:
+            fig.add_trace(go.Scatter(x=timeline['ts'], y=timeline[f'window_{signal}'], name=f'Last {DRIFT_WINDOW} labels',
+                                     line=dict(color='#bdc3c7'), legendgroup='window', showlegend=row == 1), row=row, col=1)
+            fig.add_trace(go.Scatter(x=timeline['ts'], y=timeline[f'ewma_{signal}'], name='Weighted average',
+                                     line=dict(color='#3498db'), legendgroup='ewma', showlegend=row == 1), row=row, col=1)
+            for cp in change_points[change_points['signal'] == signal].itertuples():
+                fig.add_vline(x=cp.ts, line_dash='dash', line_color='#e74c3c' if cp.direction == 'up' else '#2ecc71',
+                              row=row, col=1)
+        fig.update_yaxes(range=[-100, 100], row=1, col=1)
+        fig.update_yaxes(range=[0, 1], tickformat='.0%', row=2, col=1)
+        fig.update_xaxes(title_text='Annotation time' if basis == 'annotation' else 'Post date', row=2, col=1)
+        fig.update_layout(height=450, margin=dict(t=40, b=0), legend=dict(orientation='h', y=-0.1))
+        return fig
+
+
+    @fragment('annotator_deep_dive')
+    def annotator_deep_dive():
+        snapshot = current_snapshot()
+        annotators = snapshot.table('annotators')
+
+        # Select annotator
+        selected_id = st.selectbox(
+            "Select Annotator ID",
+            options=annotators['annotator_id'].tolist(),
+            index=0
+        )
+
+        if selected_id:
+            ann = annotators[annotators['annotator_id'] == selected_id].iloc[0]
+
+            col1, col2, col3 = st.columns(3)
+
+            with col1:
+                st.metric("Total Labels", f"{int(ann['total_labels']):,}")
+                st.metric("Agreement Rate", f"{ann['agreement_rate']:.1%}")
+
+            with col2:
+                st.metric("Strictness Score", f"{ann['strictness_score']:.1f}")
+                st.metric("Bias Category", ann['bias_category'])
+
+            with col3:
+                # Mini pie chart for label distribution
+                fig4 = go.Figure(data=[go.Pie(
+                    labels=['Normal', 'Offensive', 'Hatespeech'],
+                    values=[ann['normal_pct'], ann['offensive_pct'], ann['hatespeech_pct']],
+                    hole=0.4,
+                    marker_colors=['#3498db', '#f39c12', '#e74c3c']
+                )])
+                fig4.update_layout(
+                    title=f"Label Distribution",
+                    height=250,
+                    margin=dict(t=50, b=0, l=0, r=0)
+                )
+                st.plotly_chart(fig4, use_container_width=True)
+
+            # Interpretation - more natural language
+            if ann['bias_category'] == 'Strict (harsh)':
+                st.warning(f"""
+            This annotator labels **{ann['hatespeech_pct']:.1f}%** as hatespeech - higher than average.
+            Worth checking if they're catching things others miss, or if they're being overly aggressive.
+            """)
+            elif ann['bias_category'] == 'Lenient (soft)':
+                st.warning(f"""
+            This annotator labels **{ann['normal_pct']:.1f}%** as normal - higher than average.
+            They might be missing some borderline harmful content.
+            """)
+            else:
+                st.success(f"This annotator has a fairly balanced distribution across all three labels.")
+
+            result = annotator_impact(0.0, snapshot)
+            if result is not None:
+                impact = result[1].set_index('annotator_id')
+                if selected_id in impact.index:
+                    row = impact.loc[selected_id]
+                    st.markdown(
+                        f"Without this annotator, alpha would be **{row['alpha_without']:.4f}** "
+                        f"({row['alpha_delta']:+.4f}) and their vote decides the majority on "
+                        f"**{int(row['pivotal_posts'])}** posts ({row['pivotal_pct']:.1f}% of their labels)."
+                    )
+
+            # Drift timeline - the numbers above are all-time averages
+            st.markdown("#### Behavior over time")
+            drift = annotator_drift(selected_id, snapshot)
+            if drift is None:
+                st.caption("Drift tracking needs `annotations.csv` - run `python -m pipeline.ingest` to create it.")
+            elif len(drift[0]) == 0:
+                st.caption("No time-stamped annotations for this annotator.")
+            else:
+                timeline, change_points, basis = drift
+                if basis == 'post':
+                    st.caption(
+                        "Ordered by post date - the data has no annotation times, so this shows how the "
+                        "annotator labelled older versus newer posts rather than how they changed while annotating."
+                    )
+                fig5 = cached_figure('annotator_drift', snapshot.version,
+                                     lambda: drift_figure(timeline, change_points, basis), selected_id)
+                st.plotly_chart(fig5, use_container_width=True)
+
+                if len(change_points) > 0:
+                    st.markdown(f"**{len(change_points)} change point(s) detected**")
+                    st.dataframe(
+                        change_points.assign(
+                            change=change_points['before'].round(2).astype(str) + ' → ' + change_points['after'].round(2).astype(str)
+                        )[['ts', 'signal', 'direction', 'change', 'events']],
+                        use_container_width=True,
+                        hide_index=True,
+                        column_config={
+                            'ts': st.column_config.DatetimeColumn('When' if basis == 'annotation' else 'Post date'),
+                            'events': st.column_config.NumberColumn('After N labels'),
+                        }
+                    )
+                else:
+                    st.success("No change points - this annotator has been consistent "
+                               + ("over time." if basis == 'annotation' else "across post dates."))
+
+
+    annotator_deep_dive()
@@ -1,215 +1,338 @@
 # app/pages/2_🔍_Disagreement_Explorer.py
 import streamlit as st
 import pandas as pd
-import plotly.express as px
 from pathlib import Path
 import sys
 
 # Add parent directory to path for imports
 sys.path.append(str(Path(__file__).parent.parent))
-from utils.data_loader import load_posts, load_disagreements
+from utils import approx
+from utils.data_loader import current_snapshot
+from utils.charts import cached_figure
+from utils.fragments import fragment
+from utils.queries import (
+    NO_FILTERS, conflicting_duplicates, count_rows, filter_key, get_post, select_rows, similar_posts
+)
+from utils.metrics import start_rerun, record_rows
 
 # Page config
 st.set_page_config(page_title="Disagreement Explorer", page_icon="🔍", layout="wide")
+with start_rerun("Disagreement_Explorer"):
+    st.title("🔍 Disagreement Explorer")
+    st.markdown("Explore samples where annotators disagreed on labels")
+    st.markdown("---")
 
-st.title("🔍 Disagreement Explorer")
-st.markdown("Explore samples where annotators disagreed on labels")
-st.markdown("---")
+    # Load data (one snapshot for the whole rerun). Plotly is imported after the
+    # title is on screen so a cold start doesn't hold up first paint.
+    with st.spinner("Loading disagreement samples..."):
+        snapshot = current_snapshot()
+        import plotly.express as px
 
-# Load data
-posts = load_posts()
-disagreements = load_disagreements()
+    # ===================
+    # Sidebar Filters
+    # ===================
+    st.sidebar.header("Filters")
 
-# ===================
-# Sidebar Filters
-# ===================
-st.sidebar.header("Filters")
+    # Filter by agreement type
+    agreement_filter = st.sidebar.multiselect(
+        "Agreement Type",
+        options=['Partial', 'None'],
+        default=['Partial', 'None'],
+        key='explorer_agreement'
+    )
 
-# Filter by agreement type
-agreement_filter = st.sidebar.multiselect(
-    "Agreement Type",
-    options=['Partial', 'None'],
-    default=['Partial', 'None']
-)
+    # Filter by majority label
+    majority_filter = st.sidebar.multiselect(
+        "Majority Label",
+        options=['normal', 'offensive', 'hatespeech'],
+        default=['normal', 'offensive', 'hatespeech'],
+        key='explorer_majority'
+    )
 
-# Filter by majority label
-majority_filter = st.sidebar.multiselect(
-    "Majority Label",
-    options=['normal', 'offensive', 'hatespeech'],
-    default=['normal', 'offensive', 'hatespeech']
-)
+    # Filter by RCA category
+    rca_options = approx.value_counts('disagreements', 'rca_category', snapshot).value['rca_category'].tolist()
+    rca_filter = st.sidebar.multiselect(
+        "RCA Category",
+        options=rca_options,
+        default=rca_options,
+        key='explorer_rca'
+    )
 
-# Filter by RCA category
-rca_options = disagreements['rca_category'].unique().tolist()
-rca_filter = st.sidebar.multiselect(
-    "RCA Category",
-    options=rca_options,
-    default=rca_options
-)
+    # Apply filters. Only counts and aggregates come back (cached and shared across
+    # sessions); with the sqlite backend they are computed inside SQLite. On very
+    # large tables they come from the stratified sample (see utils.approx).
+    filters = filter_key(agreement_filter, majority_filter, rca_filter)
+    filtered_count = approx.count_rows(filters, snapshot).value
+    record_rows('explorer_filters', filtered_count)
 
-# Apply filters
-filtered_df = disagreements[
-    (disagreements['agreement_type'].isin(agreement_filter)) &
-    (disagreements['majority_label'].isin(majority_filter)) &
-    (disagreements['rca_category'].isin(rca_filter))
-]
-
-st.sidebar.markdown(f"**Showing: {len(filtered_df):,} samples**")
-
-# ===================
-# ROW 1: Summary Stats
-# ===================
-col1, col2, col3, col4 = st.columns(4)
-
-with col1:
-    st.metric("Total Disagreements", f"{len(disagreements):,}")
-with col2:
-    st.metric("Filtered Samples", f"{len(filtered_df):,}")
-with col3:
-    partial_count = len(filtered_df[filtered_df['agreement_type'] == 'Partial'])
-    st.metric("Partial (2/3)", f"{partial_count:,}")
-with col4:
-    none_count = len(filtered_df[filtered_df['agreement_type'] == 'None'])
-    st.metric("No Agreement (1/1/1)", f"{none_count:,}")
-
-st.markdown("---")
-
-# ===================
-# ROW 2: Visualizations
-# ===================
-col1, col2 = st.columns(2)
-
-with col1:
-    # Disagreement by Label Combination
-    label_combo = filtered_df.apply(
-        lambda x: f"{x['label_1']} vs {x['label_2']} vs {x['label_3']}", axis=1
-    )
-    combo_counts = label_combo.value_counts().head(10).reset_index()
-    combo_counts.columns = ['Label Combination', 'Count']
-    
-    fig1 = px.bar(
-        combo_counts,
-        x='Count',
-        y='Label Combination',
-        orientation='h',
-        title='Top 10 Label Disagreement Patterns',
-        color='Count',
-        color_continuous_scale='Reds'
-    )
-    fig1.update_layout(yaxis={'categoryorder': 'total ascending'})
-    st.plotly_chart(fig1, use_container_width=True)
-
-with col2:
-    # Disagreement by RCA Category
-    rca_counts = filtered_df['rca_category'].value_counts().reset_index()
-    rca_counts.columns = ['RCA Category', 'Count']
-    
-    fig2 = px.pie(
-        rca_counts,
-        values='Count',
-        names='RCA Category',
-        title='Disagreements by RCA Category',
-        hole=0.4
-    )
-    fig2.update_traces(textposition='inside', textinfo='percent+label')
-    st.plotly_chart(fig2, use_container_width=True)
+    st.sidebar.markdown(f"**Showing: {filtered_count:,} samples**")
+
+    # ===================
+    # ROW 1: Summary Stats
+    # ===================
+    col1, col2, col3, col4 = st.columns(4)
+
+    agreement_counts = approx.value_counts('disagreements', 'agreement_type', snapshot, filters).value
+    agreement_counts = dict(zip(agreement_counts['agreement_type'], agreement_counts['count']))
+
+    with col1:
+        st.metric("Total Disagreements", f"{approx.count_rows(NO_FILTERS, snapshot).value:,}")
+    with col2:
+        st.metric("Filtered Samples", f"{filtered_count:,}")
+    with col3:
+        partial_count = agreement_counts.get('Partial', 0)
+        st.metric("Partial (2/3)", f"{partial_count:,}")
+    with col4:
+        none_count = agreement_counts.get('None', 0)
+        st.metric("No Agreement (1/1/1)", f"{none_count:,}")
 
-# Add insight based on data
-top_pattern = combo_counts.iloc[0]['Label Combination'] if len(combo_counts) > 0 else "N/A"
-st.info(f"""
-**Quick observation:** The most common disagreement pattern is "{top_pattern}". 
+    st.markdown("---")
+
+    # ===================
+    # ROW 2: Visualizations
+    # ===================
+    col1, col2 = st.columns(2)
+
+    # Disagreement by Label Combination. In approximate mode this is first an
+    # estimate with 95% error bars; the refine watcher at the end of the page
+    # reruns it once the exact counts are in.
+    combos = approx.label_combo_counts(*filters, snapshot=snapshot)
+    combo_counts = combos.value
+
+
+    def build_combo_bar():
+        fig1 = px.bar(
+            combo_counts,
+            x='Count',
+            y='Label Combination',
+            orientation='h',
+            title='Top 10 Label Disagreement Patterns' if combos.exact else 'Top 10 Label Disagreement Patterns (estimated)',
+            color='Count',
+            color_continuous_scale='Reds',
+            error_x=None if combos.exact else combo_counts['high'] - combo_counts['Count'],
+            error_x_minus=None if combos.exact else combo_counts['Count'] - combo_counts['low'],
+        )
+        fig1.update_layout(yaxis={'categoryorder': 'total ascending'})
+        return fig1
+
+
+    def build_rca_pie():
+        # Disagreement by RCA Category
+        rca_counts = approx.value_counts('disagreements', 'rca_category', snapshot, filters).value
+        rca_counts = rca_counts[['rca_category', 'count']].set_axis(['RCA Category', 'Count'], axis=1)
+
+        fig2 = px.pie(
+            rca_counts,
+            values='Count',
+            names='RCA Category',
+            title='Disagreements by RCA Category',
+            hole=0.4
+        )
+        fig2.update_traces(textposition='inside', textinfo='percent+label')
+        return fig2
+
+
+    # Figures are shared by every session viewing the same filter selection
+    with col1:
+        st.plotly_chart(
+            cached_figure('explorer_combo_bar', snapshot.version, build_combo_bar, filters, combos.exact),
+            use_container_width=True
+        )
+        if combos.error is not None:
+            st.caption(f"Estimated from a stratified sample of {combos.sample_rows:,} rows "
+                       f"(bars show 95% intervals); the exact counts could not be computed.")
+        elif not combos.exact:
+            st.caption(f"Estimated from a stratified sample of {combos.sample_rows:,} rows "
+                       f"(bars show 95% intervals); exact counts are loading...")
+    with col2:
+        st.plotly_chart(cached_figure('explorer_rca_pie', snapshot.version, build_rca_pie, filters), use_container_width=True)
+
+    # Add insight based on data
+    if len(combo_counts) > 0:
+        top = combo_counts.iloc[0]
+        top_pattern = f'"{top["Label Combination"]}"'
+        if not combos.exact and filtered_count:
+            share, margin = top['Count'] / filtered_count * 100, (top['high'] - top['low']) / 2 / filtered_count * 100
+            top_pattern += f" (about {share:.1f}% ± {margin:.1f}% of the filtered samples)"
+    else:
+        top_pattern = '"N/A"'
+    st.info(f"""
+**Quick observation:** The most common disagreement pattern is {top_pattern}. 
 This confirms what we saw in the RCA analysis - the offensive/hatespeech boundary 
 is where most confusion happens.
 """)
 
-st.markdown("---")
-
-# ===================
-# ROW 3: Sample Explorer
-# ===================
-st.subheader("Sample Explorer")
-
-# Search box
-search_term = st.text_input("Search in text", placeholder="Enter keyword to search...")
-
-if search_term:
-    filtered_df = filtered_df[filtered_df['text'].str.contains(search_term, case=False, na=False)]
-    st.info(f"Found {len(filtered_df)} samples containing '{search_term}'")
-
-# Display samples
-st.markdown(f"**Showing {min(100, len(filtered_df))} of {len(filtered_df)} samples**")
-
-# Select columns to display
-display_cols = ['post_id', 'text', 'label_1', 'label_2', 'label_3', 
-                'majority_label', 'agreement_type', 'rca_category']
-
-# Paginated table
-if len(filtered_df) > 0:
-    st.dataframe(
-        filtered_df[display_cols].head(100),
-        use_container_width=True,
-        hide_index=True,
-        column_config={
-            "post_id": st.column_config.TextColumn("Post ID", width="small"),
-            "text": st.column_config.TextColumn("Text", width="large"),
-            "label_1": st.column_config.TextColumn("Label 1", width="small"),
-            "label_2": st.column_config.TextColumn("Label 2", width="small"),
-            "label_3": st.column_config.TextColumn("Label 3", width="small"),
-            "majority_label": st.column_config.TextColumn("Majority", width="small"),
-            "agreement_type": st.column_config.TextColumn("Agreement", width="small"),
-            "rca_category": st.column_config.TextColumn("RCA Category", width="medium"),
-        }
-    )
-else:
-    st.warning("No samples match the current filters.")
-
-st.markdown("---")
-
-# ===================
-# ROW 4: Detailed Sample View
-# ===================
-st.subheader("Detailed Sample View")
-
-if len(filtered_df) > 0:
-    # Select a sample to view details
-    sample_ids = filtered_df['post_id'].tolist()[:50]
-    selected_id = st.selectbox("Select a sample to view details", sample_ids)
-    
-    if selected_id:
-        sample = filtered_df[filtered_df['post_id'] == selected_id].iloc[0]
-        
-        col1, col2 = st.columns([2, 1])
-        
-        with col1:
-            st.markdown("**Text:**")
-            st.info(sample['text'])
-            
-            st.markdown("**Highlighted Words:**")
-            if pd.notna(sample['highlighted_words']) and sample['highlighted_words']:
-                st.warning(sample['highlighted_words'])
-            else:
-                st.text("No highlighted words available")
-        
-        with col2:
-            st.markdown("**Annotator Labels:**")
-            st.write(f"- Annotator 1: `{sample['label_1']}`")
-            st.write(f"- Annotator 2: `{sample['label_2']}`")
-            st.write(f"- Annotator 3: `{sample['label_3']}`")
-            
-            st.markdown("**Analysis:**")
-            st.write(f"- Majority Label: `{sample['majority_label']}`")
-            st.write(f"- Agreement Type: `{sample['agreement_type']}`")
-            st.write(f"- RCA Category: `{sample['rca_category']}`")
-            
-            st.markdown("**Target Groups:**")
-            st.write(f"`{sample['target_groups']}`")
-        
-        # Add some interpretation
-        labels = [sample['label_1'], sample['label_2'], sample['label_3']]
-        if 'hatespeech' in labels and 'offensive' in labels:
-            st.markdown("""
-            ---
-            **Why this disagreement matters:** This is a hatespeech/offensive split - exactly the kind of 
-            case where clearer guidelines would help. Looking at the highlighted words might reveal 
-            why annotators saw it differently.
-            """)
\ No newline at end of file
+    st.markdown("---")
+
+    # ===================
+    # ROW 3: Sample Explorer
+    # ===================
+    # Search and the detail view are fragments: typing a search term reruns only the
+    # sample explorer, and picking a sample reruns only the detail view. They read
+    # the filters from the sidebar widget keys and the snapshot from the loader,
+    # never from arguments (see utils.fragments).
+    @fragment('explorer_samples')
+    def sample_explorer():
+        snapshot = current_snapshot()
+        filters = filter_key(st.session_state.explorer_agreement, st.session_state.explorer_majority,
+                             st.session_state.explorer_rca)
+
+        # Search box
+        search_term = st.text_input("Search in text", placeholder="Enter keyword to search...")
+
+        match_count = count_rows(filters, search_term, snapshot=snapshot)
+        if search_term:
+            record_rows('explorer_search', match_count)
+            st.info(f"Found {match_count} samples containing '{search_term}'")
+
+        # Only the first page of rows is fetched
+        rows = select_rows(filters, search_term, limit=100, snapshot=snapshot)
+
+        # Display samples
+        st.markdown(f"**Showing {len(rows)} of {match_count} samples**")
+
+        # Select columns to display
+        display_cols = ['post_id', 'text', 'label_1', 'label_2', 'label_3', 
+                        'majority_label', 'agreement_type', 'rca_category']
+
+        # Paginated table
+        if len(rows) > 0:
+            st.dataframe(
+                rows[display_cols],
+                use_container_width=True,
+                hide_index=True,
+                column_config={
+                    "post_id": st.column_config.TextColumn("Post ID", width="small"),
+                    "text": st.column_config.TextColumn("Text", width="large"),
+                    "label_1": st.column_config.TextColumn("Label 1", width="small"),
+                    "label_2": st.column_config.TextColumn("Label 2", width="small"),
+                    "label_3": st.column_config.TextColumn("Label 3", width="small"),
+                    "majority_label": st.column_config.TextColumn("Majority", width="small"),
+                    "agreement_type": st.column_config.TextColumn("Agreement", width="small"),
+                    "rca_category": st.column_config.TextColumn("RCA Category", width="medium"),
+                }
+            )
+        else:
+            st.warning("No samples match the current filters.")
+
+        st.markdown("---")
+        st.subheader("Detailed Sample View")
+        st.session_state.explorer_sample_ids = tuple(rows['post_id'].head(50))
+        sample_detail()
+
+
+    # ===================
+    # ROW 4: Detailed Sample View
+    # ===================
+    @fragment('explorer_detail')
+    def sample_detail():
+        snapshot = current_snapshot()
+        sample_ids = st.session_state.get('explorer_sample_ids', ())
+        if sample_ids:
+            # Select a sample to view details
+            selected_id = st.selectbox("Select a sample to view details", sample_ids)
+
+            if selected_id:
+                sample = get_post(selected_id, snapshot)
+
+                col1, col2 = st.columns([2, 1])
+
+                with col1:
+                    st.markdown("**Text:**")
+                    st.info(sample['text'])
+
+                    st.markdown("**Highlighted Words:**")
+                    if pd.notna(sample['highlighted_words']) and sample['highlighted_words']:
+                        st.warning(sample['highlighted_words'])
+                    else:
+                        st.text("No highlighted words available")
+
+                with col2:
+                    st.markdown("**Annotator Labels:**")
+                    st.write(f"- Annotator 1: `{sample['label_1']}`")
+                    st.write(f"- Annotator 2: `{sample['label_2']}`")
+                    st.write(f"- Annotator 3: `{sample['label_3']}`")
+
+                    st.markdown("**Analysis:**")
+                    st.write(f"- Majority Label: `{sample['majority_label']}`")
+                    st.write(f"- Agreement Type: `{sample['agreement_type']}`")
+                    st.write(f"- RCA Category: `{sample['rca_category']}`")
+
+                    st.markdown("**Target Groups:**")
+                    st.write(f"`{sample['target_groups']}`")
+
+                # Add some interpretation
+                labels = [sample['label_1'], sample['label_2'], sample['label_3']]
+                if 'hatespeech' in labels and 'offensive' in labels:
+                    st.markdown("""
+                ---
+                **Why this disagreement matters:** This is a hatespeech/offensive split - exactly the kind of 
+                case where clearer guidelines would help. Looking at the highlighted words might reveal 
+                why annotators saw it differently.
+                """)
+
+                # Near-duplicates of this post and how they were labeled
+                st.markdown("**Similar Posts:**")
+                similar = similar_posts(selected_id, snapshot=snapshot)
+                if similar is None:
+                    st.caption("No near-duplicates of this post in the disagreement set.")
+                else:
+                    st.dataframe(
+                        similar[['similarity', 'text', 'label_1', 'label_2', 'label_3', 'majority_label']],
+                        use_container_width=True,
+                        hide_index=True,
+                        column_config={
+                            "similarity": st.column_config.ProgressColumn("Similarity", min_value=0, max_value=1, format="%.2f"),
+                            "text": st.column_config.TextColumn("Text", width="large"),
+                            "label_1": st.column_config.TextColumn("Label 1", width="small"),
+                            "label_2": st.column_config.TextColumn("Label 2", width="small"),
+                            "label_3": st.column_config.TextColumn("Label 3", width="small"),
+                            "majority_label": st.column_config.TextColumn("Majority", width="small"),
+                        }
+                    )
+
+
+    # ===================
+    # Near-duplicates labeled differently (shown above the sample explorer)
+    # ===================
+    st.subheader("Near-Duplicates Labeled Differently")
+
+    clusters, members = conflicting_duplicates(snapshot)
+    if len(clusters) > 0:
+        st.markdown(f"""
+    **{len(clusters)} groups** of near-identical posts ({len(members)} posts) got different label 
+    combinations. Same text, different labels is the clearest sign of a guideline gap.
+    """)
+        st.dataframe(
+            clusters[['posts', 'label_patterns', 'majority_labels', 'labels', 'example']].head(50),
+            use_container_width=True,
+            hide_index=True,
+            column_config={
+                "posts": st.column_config.NumberColumn("Posts", width="small"),
+                "label_patterns": st.column_config.NumberColumn("Label Patterns", width="small"),
+                "majority_labels": st.column_config.TextColumn("Majority Labels", width="medium"),
+                "labels": st.column_config.TextColumn("Label Triples", width="medium"),
+                "example": st.column_config.TextColumn("Example Text", width="large"),
+            }
+        )
+    else:
+        st.success("No near-duplicate posts with conflicting labels.")
+
+    st.markdown("---")
+
+    st.subheader("Sample Explorer")
+    sample_explorer()
+
+    # While the label patterns are an estimate, poll for the exact counts instead of
+    # holding up this run. The watcher is only called by runs that drew an estimate,
+    # so polling stops after the rerun that draws the exact chart (or the final
+    # estimate, if the exact query failed).
+    @fragment('explorer_refine', run_every=approx.POLL_SECONDS)
+    def refine_watcher():
+        if st.session_state.explorer_pending.ready():
+            st.rerun()
+
+
+    if not combos.exact and combos.error is None:
+        st.session_state.explorer_pending = combos
+        refine_watcher()
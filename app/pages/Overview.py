@@ -1,224 +1,282 @@
 # app/pages/1_📊_Overview.py
 import streamlit as st
 import pandas as pd
-import plotly.express as px
-import plotly.graph_objects as go
 from pathlib import Path
 import sys
 
 # Add parent directory to path for imports
 sys.path.append(str(Path(__file__).parent.parent))
-from utils.data_loader import load_posts, load_summary, load_annotators
+from utils import approx
+from utils.charts import cached_figure
+from utils.data_loader import current_snapshot
+from utils.kpis import kpi
+from utils.metrics import start_rerun
+from utils.queries import value_counts
 
 # Page config
 st.set_page_config(page_title="Overview", page_icon="📊", layout="wide")
+with start_rerun("Overview"):
+    st.title("📊 Overview: Quality Metrics Dashboard")
+    st.markdown("---")
 
-st.title("📊 Overview: Quality Metrics Dashboard")
-st.markdown("---")
+    # Summary metrics only need the tiny summary table, so they paint first; charts
+    # that need the full snapshot get placeholders filled in at the bottom of the script
 
-# Load data
-posts = load_posts()
-summary = load_summary()
-annotators = load_annotators()
+    # ===================
+    # ROW 1: Key KPIs
+    # ===================
+    st.subheader("Key Performance Indicators")
 
-# ===================
-# ROW 1: Key KPIs
-# ===================
-st.subheader("Key Performance Indicators")
+    col1, col2, col3, col4 = st.columns(4)
 
-col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        st.metric(
+            label="Total Samples",
+            value=f"{kpi('total_posts'):,}"
+        )
 
-with col1:
-    st.metric(
-        label="Total Samples",
-        value=f"{int(summary['total_posts']):,}"
-    )
+    with col2:
+        alpha = kpi('krippendorff_alpha')
+        st.metric(
+            label="Krippendorff's Alpha",
+            value=f"{alpha:.3f}",
+            delta=f"{'Below' if alpha < 0.667 else 'Above'} threshold",
+            delta_color="inverse" if alpha < 0.667 else "normal"
+        )
 
-with col2:
-    alpha = float(summary['krippendorff_alpha'])
-    st.metric(
-        label="Krippendorff's Alpha",
-        value=f"{alpha:.3f}",
-        delta="Below threshold",
-        delta_color="inverse"
-    )
+    with col3:
+        st.metric(
+            label="Full Agreement Rate",
+            value=f"{kpi('full_agreement_rate')}%"
+        )
 
-with col3:
-    st.metric(
-        label="Full Agreement Rate",
-        value=f"{summary['full_agreement_rate']}%"
-    )
+    with col4:
+        st.metric(
+            label="Total Annotators",
+            value=f"{kpi('total_annotators')}"
+        )
 
-with col4:
-    st.metric(
-        label="Total Annotators",
-        value=f"{int(summary['total_annotators'])}"
-    )
+    st.markdown("---")
 
-st.markdown("---")
-
-# ===================
-# ROW 2: Agreement & Label Distribution
-# ===================
-st.subheader("Distribution Analysis")
-
-col1, col2 = st.columns(2)
-
-with col1:
-    # Agreement Type Distribution
-    agreement_data = posts['agreement_type'].value_counts().reset_index()
-    agreement_data.columns = ['Agreement Type', 'Count']
-    
-    fig1 = px.pie(
-        agreement_data, 
-        values='Count', 
-        names='Agreement Type',
-        title='Annotator Agreement Distribution',
-        color='Agreement Type',
-        color_discrete_map={'Full': '#2ecc71', 'Partial': '#f39c12', 'None': '#e74c3c'}
-    )
-    fig1.update_traces(textposition='inside', textinfo='percent+label')
-    st.plotly_chart(fig1, use_container_width=True)
-
-with col2:
-    # Majority Label Distribution
-    label_data = posts['majority_label'].value_counts().reset_index()
-    label_data.columns = ['Label', 'Count']
-    
-    fig2 = px.pie(
-        label_data, 
-        values='Count', 
-        names='Label',
-        title='Majority Label Distribution',
-        color='Label',
-        color_discrete_map={'normal': '#3498db', 'hatespeech': '#e74c3c', 'offensive': '#f39c12'}
-    )
-    fig2.update_traces(textposition='inside', textinfo='percent+label')
-    st.plotly_chart(fig2, use_container_width=True)
+    # ===================
+    # ROW 2: Agreement & Label Distribution
+    # ===================
+    st.subheader("Distribution Analysis")
 
-# Analysis note
-st.info("""
-**What I found interesting:** Only about half of samples (48.9%) have full agreement among all 3 annotators. 
+    distribution_slot = st.empty()
+    distribution_slot.info("Loading distribution charts...")
+
+    # Analysis note
+    st.info(f"""
+**What I found interesting:** Only {kpi('full_agreement_rate')}% of samples have full agreement among all 3 annotators. 
 This is lower than expected for a hate speech dataset. The main issue seems to be distinguishing 
-between 'offensive' and 'hatespeech' - both make up roughly 30% each, which suggests annotators 
+between 'offensive' and 'hatespeech' - they make up {kpi('majority_offensive_pct'):.0f}% and 
+{kpi('majority_hatespeech_pct'):.0f}% of majority labels, which suggests annotators 
 are often split between these two categories.
 """)
 
-st.markdown("---")
-
-# ===================
-# ROW 3: Alpha Scale Visualization
-# ===================
-st.subheader("Krippendorff's Alpha: Quality Assessment")
-
-# Create gauge chart for Alpha
-fig3 = go.Figure(go.Indicator(
-    mode="gauge+number+delta",
-    value=alpha,
-    domain={'x': [0, 1], 'y': [0, 1]},
-    title={'text': "Inter-Annotator Agreement", 'font': {'size': 20}},
-    delta={'reference': 0.667, 'increasing': {'color': "green"}, 'decreasing': {'color': "red"}},
-    gauge={
-        'axis': {'range': [0, 1], 'tickwidth': 1, 'tickcolor': "darkblue"},
-        'bar': {'color': "#3498db"},
-        'bgcolor': "white",
-        'borderwidth': 2,
-        'bordercolor': "gray",
-        'steps': [
-            {'range': [0, 0.667], 'color': '#ffcccc'},
-            {'range': [0.667, 0.8], 'color': '#fff3cd'},
-            {'range': [0.8, 1], 'color': '#d4edda'}
-        ],
-        'threshold': {
-            'line': {'color': "red", 'width': 4},
-            'thickness': 0.75,
-            'value': 0.667
-        }
-    }
-))
-
-fig3.update_layout(height=300)
-st.plotly_chart(fig3, use_container_width=True)
-
-# Interpretation - more conversational
-col1, col2, col3 = st.columns(3)
-with col1:
-    st.error("**< 0.667**: Poor")
-with col2:
-    st.warning("**0.667 - 0.8**: Acceptable")
-with col3:
-    st.success("**≥ 0.8**: Reliable")
-
-st.markdown("""
-Our alpha of **0.46** falls in the 'Poor' range. According to Krippendorff's guidelines (2004), 
-this means the data isn't reliable enough for drawing strong conclusions. However, this is 
+    st.markdown("---")
+
+    # ===================
+    # ROW 3: Alpha Scale Visualization
+    # ===================
+    st.subheader("Krippendorff's Alpha: Quality Assessment")
+
+    # Plotly is imported here, after the KPI row is already on screen
+    import plotly.graph_objects as go
+
+    # Create gauge chart for Alpha. It is cached under the snapshot version like the
+    # other figures, so it is drawn with them at the bottom of the script.
+    alpha_slot = st.empty()
+    alpha_slot.info("Loading alpha gauge...")
+
+    def build_alpha_gauge(alpha):
+        fig = go.Figure(go.Indicator(
+            mode="gauge+number+delta",
+            value=alpha,
+            domain={'x': [0, 1], 'y': [0, 1]},
+            title={'text': "Inter-Annotator Agreement", 'font': {'size': 20}},
+            delta={'reference': 0.667, 'increasing': {'color': "green"}, 'decreasing': {'color': "red"}},
+            gauge={
+                'axis': {'range': [0, 1], 'tickwidth': 1, 'tickcolor': "darkblue"},
+                'bar': {'color': "#3498db"},
+                'bgcolor': "white",
+                'borderwidth': 2,
+                'bordercolor': "gray",
+                'steps': [
+                    {'range': [0, 0.667], 'color': '#ffcccc'},
+                    {'range': [0.667, 0.8], 'color': '#fff3cd'},
+                    {'range': [0.8, 1], 'color': '#d4edda'}
+                ],
+                'threshold': {
+                    'line': {'color': "red", 'width': 4},
+                    'thickness': 0.75,
+                    'value': 0.667
+                }
+            }
+        ))
+
+        fig.update_layout(height=300)
+        return fig
+
+
+    # Interpretation - more conversational
+    alpha_band = 'Poor' if alpha < 0.667 else 'Acceptable' if alpha < 0.8 else 'Reliable'
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.error("**< 0.667**: Poor")
+    with col2:
+        st.warning("**0.667 - 0.8**: Acceptable")
+    with col3:
+        st.success("**≥ 0.8**: Reliable")
+
+    alpha_meaning = {
+        'Poor': """this means the data isn't reliable enough for drawing strong conclusions. However, this is 
 actually common for subjective tasks like hate speech detection - the boundary between 
-'offensive' and 'hatespeech' is genuinely ambiguous in many cases.
+'offensive' and 'hatespeech' is genuinely ambiguous in many cases.""",
+        'Acceptable': """this is enough for tentative conclusions, but not yet for strong ones - the 
+'offensive' vs 'hatespeech' boundary is still where most of the remaining disagreement sits.""",
+        'Reliable': """the labels are consistent enough to draw conclusions from with confidence.""",
+    }[alpha_band]
+    st.markdown(f"""
+Our alpha of **{alpha:.2f}** falls in the '{alpha_band}' range. According to Krippendorff's guidelines (2004), 
+{alpha_meaning}
 """)
 
-st.markdown("---")
-
-# ===================
-# ROW 4: Annotator Bias Distribution
-# ===================
-st.subheader("Annotator Bias Overview")
-
-col1, col2 = st.columns(2)
-
-with col1:
-    # Bias category distribution
-    bias_data = annotators['bias_category'].value_counts().reset_index()
-    bias_data.columns = ['Bias Category', 'Count']
-    
-    fig4 = px.bar(
-        bias_data,
-        x='Bias Category',
-        y='Count',
-        title='Annotator Bias Distribution',
-        color='Bias Category',
-        color_discrete_map={
-            'Lenient (soft)': '#2ecc71',
-            'Balanced': '#3498db',
-            'Strict (harsh)': '#e74c3c'
-        }
-    )
-    st.plotly_chart(fig4, use_container_width=True)
+    st.markdown("---")
 
-with col2:
-    st.markdown("### Bias Summary")
-    st.markdown(f"""
+    # ===================
+    # ROW 4: Annotator Bias Distribution
+    # ===================
+    st.subheader("Annotator Bias Overview")
+
+    col1, col2 = st.columns(2)
+
+    with col1:
+        bias_slot = st.empty()
+        bias_slot.info("Loading annotator data...")
+
+    with col2:
+        st.markdown("### Bias Summary")
+        st.markdown(f"""
     | Category | Percentage |
     |----------|------------|
-    | Lenient (soft) | {summary['lenient_annotators_pct']}% |
-    | Balanced | {summary['balanced_annotators_pct']}% |
-    | Strict (harsh) | {summary['strict_annotators_pct']}% |
+    | Lenient (soft) | {kpi('lenient_annotators_pct')}% |
+    | Balanced | {kpi('balanced_annotators_pct')}% |
+    | Strict (harsh) | {kpi('strict_annotators_pct')}% |
     """)
-    
-    st.markdown("""
-    There's a noticeable skew toward lenient annotators - about 43% tend to label content as 'normal' 
+
+        st.markdown(f"""
+    There's a noticeable skew toward lenient annotators - about {kpi('lenient_annotators_pct'):.0f}% tend to label content as 'normal' 
     more often than average. This could be a problem if we're trying to catch harmful content, 
     since these annotators might be missing some borderline cases.
-    
-    On the flip side, only 18% are strict. So the dataset as a whole probably under-labels hate speech 
+
+    On the flip side, only {kpi('strict_annotators_pct'):.0f}% are strict. So the dataset as a whole probably under-labels hate speech 
     rather than over-labels it.
     """)
 
-st.markdown("---")
-
-# ===================
-# ROW 5: Quick Stats Table
-# ===================
-st.subheader("All Metrics Summary")
-
-metrics_df = pd.DataFrame([
-    {"Metric": "Total Posts", "Value": f"{int(summary['total_posts']):,}"},
-    {"Metric": "Total Annotations", "Value": f"{int(summary['total_annotations']):,}"},
-    {"Metric": "Krippendorff's Alpha", "Value": f"{summary['krippendorff_alpha']}"},
-    {"Metric": "Full Agreement Rate", "Value": f"{summary['full_agreement_rate']}%"},
-    {"Metric": "Partial Agreement Rate", "Value": f"{summary['partial_agreement_rate']}%"},
-    {"Metric": "No Agreement Rate", "Value": f"{summary['no_agreement_rate']}%"},
-    {"Metric": "Samples with Rationales", "Value": f"{summary['samples_with_rationales_pct']}%"},
-    {"Metric": "Top RCA Category", "Value": summary['top_rca_category']},
-])
-
-st.dataframe(metrics_df, use_container_width=True, hide_index=True)
\ No newline at end of file
+    st.markdown("---")
+
+    # ===================
+    # ROW 5: Quick Stats Table
+    # ===================
+    st.subheader("All Metrics Summary")
+
+    # Top RCA category is computed from the disagreement table, so the table waits for the snapshot
+    metrics_slot = st.empty()
+    metrics_slot.info("Loading metrics...")
+
+    # ===================
+    # Deferred sections (need the full snapshot)
+    # ===================
+    def render_distribution(snapshot):
+        col1, col2 = st.columns(2)
+
+        def build_agreement_pie():
+            # Agreement Type Distribution
+            agreement_data = approx.value_counts('posts', 'agreement_type', snapshot).value[['agreement_type', 'count']]
+            agreement_data = agreement_data.set_axis(['Agreement Type', 'Count'], axis=1)
+
+            fig1 = px.pie(
+                agreement_data, 
+                values='Count', 
+                names='Agreement Type',
+                title='Annotator Agreement Distribution',
+                color='Agreement Type',
+                color_discrete_map={'Full': '#2ecc71', 'Partial': '#f39c12', 'None': '#e74c3c'}
+            )
+            fig1.update_traces(textposition='inside', textinfo='percent+label')
+            return fig1
+
+        def build_label_pie():
+            # Majority Label Distribution
+            label_data = approx.value_counts('posts', 'majority_label', snapshot).value[['majority_label', 'count']]
+            label_data = label_data.set_axis(['Label', 'Count'], axis=1)
+
+            fig2 = px.pie(
+                label_data, 
+                values='Count', 
+                names='Label',
+                title='Majority Label Distribution',
+                color='Label',
+                color_discrete_map={'normal': '#3498db', 'hatespeech': '#e74c3c', 'offensive': '#f39c12'}
+            )
+            fig2.update_traces(textposition='inside', textinfo='percent+label')
+            return fig2
+
+        with col1:
+            st.plotly_chart(cached_figure('overview_agreement_pie', snapshot.version, build_agreement_pie), use_container_width=True)
+        with col2:
+            st.plotly_chart(cached_figure('overview_label_pie', snapshot.version, build_label_pie), use_container_width=True)
+
+
+    def render_metrics_table(snapshot):
+        metrics_df = pd.DataFrame([
+            {"Metric": "Total Posts", "Value": f"{kpi('total_posts', snapshot):,}"},
+            {"Metric": "Total Annotations", "Value": f"{kpi('total_annotations', snapshot):,}"},
+            {"Metric": "Krippendorff's Alpha", "Value": f"{kpi('krippendorff_alpha', snapshot)}"},
+            {"Metric": "Full Agreement Rate", "Value": f"{kpi('full_agreement_rate', snapshot)}%"},
+            {"Metric": "Partial Agreement Rate", "Value": f"{kpi('partial_agreement_rate', snapshot)}%"},
+            {"Metric": "No Agreement Rate", "Value": f"{kpi('no_agreement_rate', snapshot)}%"},
+            {"Metric": "Samples with Rationales", "Value": f"{kpi('samples_with_rationales_pct', snapshot)}%"},
+            {"Metric": "Most Frequent RCA Category (excl. Other)", "Value": kpi('most_frequent_rca_category', snapshot)},
+        ])
+
+        st.dataframe(metrics_df, use_container_width=True, hide_index=True)
+
+
+    def render_bias_chart(snapshot):
+        def build_bias_bar():
+            # Bias category distribution
+            bias_data = value_counts('annotators', 'bias_category', snapshot).set_axis(['Bias Category', 'Count'], axis=1)
+
+            return px.bar(
+                bias_data,
+                x='Bias Category',
+                y='Count',
+                title='Annotator Bias Distribution',
+                color='Bias Category',
+                color_discrete_map={
+                    'Lenient (soft)': '#2ecc71',
+                    'Balanced': '#3498db',
+                    'Strict (harsh)': '#e74c3c'
+                }
+            )
+
+        st.plotly_chart(cached_figure('overview_bias_bar', snapshot.version, build_bias_bar), use_container_width=True)
+
+
+    snapshot = current_snapshot()
+    import plotly.express as px
+
+    snapshot_alpha = kpi('krippendorff_alpha', snapshot)
+    alpha_slot.plotly_chart(
+        cached_figure('overview_alpha_gauge', snapshot.version, lambda: build_alpha_gauge(snapshot_alpha)),
+        use_container_width=True
+    )
+    with distribution_slot.container():
+        render_distribution(snapshot)
+    with bias_slot.container():
+        render_bias_chart(snapshot)
+    with metrics_slot.container():
+        render_metrics_table(snapshot)
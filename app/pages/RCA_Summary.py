@@ -1,155 +1,63 @@
 # app/pages/4_🎯_RCA_Summary.py
 import streamlit as st
 import pandas as pd
-import plotly.express as px
-import plotly.graph_objects as go
 from pathlib import Path
 import sys
 
 # Add parent directory to path for imports
 sys.path.append(str(Path(__file__).parent.parent))
-from utils.data_loader import load_disagreements, load_summary
+from utils import approx
+from utils.data_loader import current_snapshot
+from utils.metrics import start_rerun, record_rows
+from utils.charts import cached_figure
+from utils.fragments import fragment
+from utils.kpis import kpi
+from utils.queries import select_rows, table_csv
 
 # Page config
 st.set_page_config(page_title="RCA Summary", page_icon="🎯", layout="wide")
+with start_rerun("RCA_Summary"):
+    st.title("🎯 Root Cause Analysis (RCA) Summary")
+    st.markdown("Understanding why annotators disagree")
+    st.markdown("---")
 
-st.title("🎯 Root Cause Analysis (RCA) Summary")
-st.markdown("Understanding why annotators disagree")
-st.markdown("---")
-
-# Load data
-disagreements = load_disagreements()
-summary = load_summary()
-
-# ===================
-# ROW 1: RCA Overview
-# ===================
-st.subheader("RCA Category Overview")
-
-# Calculate RCA stats
-rca_counts = disagreements['rca_category'].value_counts().reset_index()
-rca_counts.columns = ['RCA Category', 'Count']
-rca_counts['Percentage'] = (rca_counts['Count'] / rca_counts['Count'].sum() * 100).round(1)
-
-col1, col2 = st.columns([2, 1])
-
-with col1:
-    # Bar chart
-    fig1 = px.bar(
-        rca_counts,
-        x='Count',
-        y='RCA Category',
-        orientation='h',
-        title='Disagreement Samples by RCA Category',
-        color='Count',
-        color_continuous_scale='Reds',
-        text='Count'
-    )
-    fig1.update_layout(yaxis={'categoryorder': 'total ascending'}, height=400)
-    fig1.update_traces(textposition='outside')
-    st.plotly_chart(fig1, use_container_width=True)
-
-with col2:
-    st.markdown("### Category Breakdown")
-    st.dataframe(
-        rca_counts,
-        use_container_width=True,
-        hide_index=True,
-        column_config={
-            "RCA Category": st.column_config.TextColumn("Category"),
-            "Count": st.column_config.NumberColumn("Count", format="%d"),
-            "Percentage": st.column_config.NumberColumn("Percentage", format="%.1f%%")
-        }
-    )
-
-st.markdown("---")
-
-# ===================
-# ROW 2: Main Findings (more conversational)
-# ===================
-st.subheader("What's causing the disagreements?")
-
-st.markdown("""
-After looking at thousands of disagreement cases, a few patterns stand out:
-
-**1. The 'Other/Unclear' problem (57%)**
-
-More than half of disagreements don't fit neatly into any category. This isn't surprising - 
-hate speech is genuinely ambiguous. A lot of these are cases where context matters a lot, 
-or where the post is using sarcasm/irony that some annotators catch and others don't.
-
-**2. Group references without clear hate (6.4%)**
-
-Words like "white", "black", "immigrants" appear a lot in disagreements. The issue is that 
-these words aren't inherently hateful - it depends entirely on context. "White people" in 
-"I love white people's cooking" vs "White people are ruining everything" are completely different.
-
-**3. The offensive vs hatespeech line (multiple categories)**
-
-This is really the core problem. Across Racial Slurs, Gender/Sexuality, and Religious Terms 
-categories, the disagreement is usually between "offensive" and "hatespeech" - not between 
-"normal" and the others. Annotators seem to agree something is wrong, but not *how* wrong.
-""")
+    # ===================
+    # ROW 1: RCA Overview
+    # ===================
+    st.subheader("RCA Category Overview")
 
-st.markdown("---")
+    # Filled in once the snapshot is loaded; the static sections below paint first
+    rca_overview_slot = st.empty()
+    rca_overview_slot.info("Loading RCA breakdown...")
 
-# ===================
-# ROW 3: Specific Category Analysis
-# ===================
-st.subheader("Category Deep Dive")
+    st.markdown("---")
 
-# Only show the most important categories with real insights
-tab1, tab2, tab3 = st.tabs(["Group References", "Slurs & Identity", "Profanity"])
+    # ===================
+    # ROW 2: Main Findings (more conversational)
+    # ===================
+    st.subheader("What's causing the disagreements?")
 
-with tab1:
-    st.markdown("""
-    ### Group References (663 samples)
-    
-    **The problem:** Mentioning a demographic group isn't hate by itself.
-    
-    **Examples from the data:**
-    - "white people be like..." - Is this stereotyping or just casual observation?
-    - "immigrants are..." - Depends entirely on what comes next
-    
-    **My suggestion:** Create a rule that group mention alone = normal. 
-    Only escalate if there's a negative generalization or threat attached.
-    """)
+    findings_slot = st.empty()
+    findings_slot.info("Loading findings...")
 
-with tab2:
-    st.markdown("""
-    ### Slurs & Identity Terms (Racial, Gender, Religious combined ~25%)
-    
-    **The problem:** Even obvious slurs cause disagreement between offensive/hatespeech.
-    
-    **What I noticed:** When slurs are directed at a specific group with intent to demean, 
-    it's almost always hatespeech. But slurs used casually (like in rap lyrics or 
-    reclaimed usage) are harder to categorize.
-    
-    **My suggestion:** Default to hatespeech for slurs targeting protected groups, 
-    unless there's clear evidence of reclaimed/quoted usage.
-    """)
+    st.markdown("---")
 
-with tab3:
-    st.markdown("""
-    ### Profanity (243 samples)
-    
-    **The problem:** "Fuck" by itself isn't hate speech. "Fuck [group]" might be.
-    
-    **What I noticed:** Pure profanity without a target usually gets labeled offensive, 
-    but some annotators mark it normal. The bigger issue is profanity + group mention.
-    
-    **My suggestion:** General profanity = offensive (not normal, not hate). 
-    Profanity directed at protected group = needs careful evaluation.
-    """)
+    # ===================
+    # ROW 3: Specific Category Analysis
+    # ===================
+    st.subheader("Category Deep Dive")
+
+    deep_dive_slot = st.empty()
+    deep_dive_slot.info("Loading category breakdown...")
 
-st.markdown("---")
+    st.markdown("---")
 
-# ===================
-# ROW 4: Proposed Guidelines
-# ===================
-st.subheader("Proposed Guideline Updates")
+    # ===================
+    # ROW 4: Proposed Guidelines
+    # ===================
+    st.subheader("Proposed Guideline Updates")
 
-st.markdown("""
+    st.markdown("""
 Based on this analysis, here's what I think should change in the labeling guidelines:
 
 | Issue | Current Problem | Proposed Change |
@@ -163,127 +71,289 @@ Based on this analysis, here's what I think should change in the labeling guidel
 would need discussion with the annotation team and possibly legal review for edge cases.
 """)
 
-st.markdown("---")
-
-# ===================
-# ROW 5: Impact Estimate
-# ===================
-st.subheader("What improvement could we expect?")
-
-col1, col2 = st.columns(2)
-
-with col1:
-    # Current vs Target metrics
-    metrics_comparison = pd.DataFrame({
-        'Metric': ['Krippendorff\'s Alpha', 'Full Agreement Rate'],
-        'Current': [0.46, 48.9],
-        'Estimated After': [0.60, 65.0]
-    })
-    
-    fig2 = go.Figure()
-    fig2.add_trace(go.Bar(
-        name='Current',
-        x=metrics_comparison['Metric'],
-        y=metrics_comparison['Current'],
-        marker_color='#e74c3c'
-    ))
-    fig2.add_trace(go.Bar(
-        name='Estimated After',
-        x=metrics_comparison['Metric'],
-        y=metrics_comparison['Estimated After'],
-        marker_color='#2ecc71'
-    ))
-    fig2.update_layout(
-        title='Current vs Estimated Metrics',
-        barmode='group',
-        yaxis_title='Value'
-    )
-    st.plotly_chart(fig2, use_container_width=True)
-
-with col2:
-    st.markdown("""
+    st.markdown("---")
+
+    # Data and Plotly are loaded here, after the static findings are on screen
+    with st.spinner("Loading disagreement samples..."):
+        snapshot = current_snapshot()
+        import plotly.express as px
+        import plotly.graph_objects as go
+
+    # Shared with the export fragment, which recomputes them from the current snapshot
+    def rca_table(snapshot):
+        rca_counts = approx.value_counts('disagreements', 'rca_category', snapshot).value[['rca_category', 'count']]
+        rca_counts = rca_counts.set_axis(['RCA Category', 'Count'], axis=1)
+        rca_counts['Percentage'] = (rca_counts['Count'] / rca_counts['Count'].sum() * 100).round(1)
+        return rca_counts
+
+
+    def review_queue(snapshot):
+        # No agreement cases: one vote each
+        return select_rows((('None',), None, None), limit=20, snapshot=snapshot)
+
+
+    with rca_overview_slot.container():
+        # Calculate RCA stats
+        rca_counts = rca_table(snapshot)
+
+        col1, col2 = st.columns([2, 1])
+
+        def build_rca_bar():
+            # Bar chart
+            fig1 = px.bar(
+                rca_counts,
+                x='Count',
+                y='RCA Category',
+                orientation='h',
+                title='Disagreement Samples by RCA Category',
+                color='Count',
+                color_continuous_scale='Reds',
+                text='Count'
+            )
+            fig1.update_layout(yaxis={'categoryorder': 'total ascending'}, height=400)
+            fig1.update_traces(textposition='outside')
+            return fig1
+
+        with col1:
+            st.plotly_chart(cached_figure('rca_category_bar', snapshot.version, build_rca_bar), use_container_width=True)
+
+        with col2:
+            st.markdown("### Category Breakdown")
+            st.dataframe(
+                rca_counts,
+                use_container_width=True,
+                hide_index=True,
+                column_config={
+                    "RCA Category": st.column_config.TextColumn("Category"),
+                    "Count": st.column_config.NumberColumn("Count", format="%d"),
+                    "Percentage": st.column_config.NumberColumn("Percentage", format="%.1f%%")
+                }
+            )
+
+    # ===================
+    # Findings and category tabs (numbers come from the snapshot)
+    # ===================
+    def render_findings(snapshot):
+        unclear_share = 'More than half' if kpi('unclear_rca_pct', snapshot) > 50 else 'A large share'
+        st.markdown(f"""
+    After looking at thousands of disagreement cases, a few patterns stand out:
+
+    **1. The 'Other/Unclear' problem ({kpi('unclear_rca_pct', snapshot):.0f}%)**
+
+    {unclear_share} of disagreements don't fit neatly into any category. This isn't surprising - 
+    hate speech is genuinely ambiguous. A lot of these are cases where context matters a lot, 
+    or where the post is using sarcasm/irony that some annotators catch and others don't.
+
+    **2. Group references without clear hate ({kpi('group_reference_pct', snapshot):.1f}%)**
+
+    Words like "white", "black", "immigrants" appear a lot in disagreements. The issue is that 
+    these words aren't inherently hateful - it depends entirely on context. "White people" in 
+    "I love white people's cooking" vs "White people are ruining everything" are completely different.
+
+    **3. The offensive vs hatespeech line (multiple categories)**
+
+    This is really the core problem. Across Racial Slurs, Gender/Sexuality, and Religious Terms 
+    categories, the disagreement is usually between "offensive" and "hatespeech" - not between 
+    "normal" and the others. Annotators seem to agree something is wrong, but not *how* wrong.
+    """)
+
+
+    def render_deep_dive(snapshot):
+        # Only show the most important categories with real insights
+        tab1, tab2, tab3 = st.tabs(["Group References", "Slurs & Identity", "Profanity"])
+
+        with tab1:
+            st.markdown(f"""
+        ### Group References ({kpi('group_reference_samples', snapshot):,} samples)
+
+        **The problem:** Mentioning a demographic group isn't hate by itself.
+
+        **Examples from the data:**
+        - "white people be like..." - Is this stereotyping or just casual observation?
+        - "immigrants are..." - Depends entirely on what comes next
+
+        **My suggestion:** Create a rule that group mention alone = normal. 
+        Only escalate if there's a negative generalization or threat attached.
+        """)
+
+        with tab2:
+            st.markdown(f"""
+        ### Slurs & Identity Terms (Racial, Gender, Religious combined ~{kpi('slur_identity_pct', snapshot):.0f}%)
+
+        **The problem:** Even obvious slurs cause disagreement between offensive/hatespeech.
+
+        **What I noticed:** When slurs are directed at a specific group with intent to demean, 
+        it's almost always hatespeech. But slurs used casually (like in rap lyrics or 
+        reclaimed usage) are harder to categorize.
+
+        **My suggestion:** Default to hatespeech for slurs targeting protected groups, 
+        unless there's clear evidence of reclaimed/quoted usage.
+        """)
+
+        with tab3:
+            st.markdown(f"""
+        ### Profanity ({kpi('profanity_samples', snapshot):,} samples)
+
+        **The problem:** "Fuck" by itself isn't hate speech. "Fuck [group]" might be.
+
+        **What I noticed:** Pure profanity without a target usually gets labeled offensive, 
+        but some annotators mark it normal. The bigger issue is profanity + group mention.
+
+        **My suggestion:** General profanity = offensive (not normal, not hate). 
+        Profanity directed at protected group = needs careful evaluation.
+        """)
+
+
+    with findings_slot.container():
+        render_findings(snapshot)
+    with deep_dive_slot.container():
+        render_deep_dive(snapshot)
+
+    # ===================
+    # ROW 5: Impact Estimate
+    # ===================
+    st.subheader("What improvement could we expect?")
+
+    col1, col2 = st.columns(2)
+
+    # Expected effect of the guideline changes below; these are estimates, not data
+    ESTIMATED_ALPHA = 0.60
+    ESTIMATED_FULL_AGREEMENT = 65.0
+    alpha = kpi('krippendorff_alpha', snapshot)
+
+    def build_metrics_comparison():
+        # Current vs Target metrics
+        metrics_comparison = pd.DataFrame({
+            'Metric': ['Krippendorff\'s Alpha', 'Full Agreement Rate'],
+            'Current': [alpha, kpi('full_agreement_rate', snapshot)],
+            'Estimated After': [ESTIMATED_ALPHA, ESTIMATED_FULL_AGREEMENT]
+        })
+
+        fig2 = go.Figure()
+        fig2.add_trace(go.Bar(
+            name='Current',
+            x=metrics_comparison['Metric'],
+            y=metrics_comparison['Current'],
+            marker_color='#e74c3c'
+        ))
+        fig2.add_trace(go.Bar(
+            name='Estimated After',
+            x=metrics_comparison['Metric'],
+            y=metrics_comparison['Estimated After'],
+            marker_color='#2ecc71'
+        ))
+        fig2.update_layout(
+            title='Current vs Estimated Metrics',
+            barmode='group',
+            yaxis_title='Value'
+        )
+        return fig2
+
+
+    with col1:
+        st.plotly_chart(cached_figure('rca_metrics_comparison', snapshot.version, build_metrics_comparison), use_container_width=True)
+
+    with col2:
+        st.markdown(f"""
     ### Realistic expectations
-    
-    I'm estimating we could get alpha from **0.46 → ~0.60** with better guidelines.
-    
+
+    I'm estimating we could get alpha from **{alpha:.2f} → ~{ESTIMATED_ALPHA:.2f}** with better guidelines.
+
     **Why not higher?**
     - Some disagreement is inherent to subjective tasks
     - Sarcasm/context will always cause some splits
     - Different cultural backgrounds affect interpretation
-    
+
     **To get above 0.67** (acceptable threshold), we'd probably also need:
     - Annotator calibration sessions
     - More detailed examples in guidelines
     - Maybe reduce to 2 categories instead of 3
-    
+
     That last point is worth considering - the offensive/hatespeech distinction 
     might be too fine-grained for reliable annotation.
     """)
 
-st.markdown("---")
+    st.markdown("---")
 
-# ===================
-# ROW 6: Review Queue
-# ===================
-st.subheader("High-Priority Review Queue")
+    # ===================
+    # ROW 6: Review Queue
+    # ===================
+    st.subheader("High-Priority Review Queue")
 
-st.markdown("""
+    st.markdown("""
 These are samples where **all 3 annotators disagreed** (1 vote each for normal, offensive, hatespeech). 
 These edge cases could help refine the guidelines.
 """)
 
-# Filter high-priority samples (no agreement cases)
-no_agreement = disagreements[disagreements['agreement_type'] == 'None'].head(20)
-
-if len(no_agreement) > 0:
-    st.dataframe(
-        no_agreement[['post_id', 'text', 'label_1', 'label_2', 'label_3', 'rca_category']],
-        use_container_width=True,
-        hide_index=True,
-        column_config={
-            "post_id": st.column_config.TextColumn("ID", width="small"),
-            "text": st.column_config.TextColumn("Text", width="large"),
-            "label_1": st.column_config.TextColumn("L1", width="small"),
-            "label_2": st.column_config.TextColumn("L2", width="small"),
-            "label_3": st.column_config.TextColumn("L3", width="small"),
-            "rca_category": st.column_config.TextColumn("RCA", width="medium"),
-        }
-    )
-else:
-    st.info("No samples with complete disagreement found.")
-
-st.markdown("---")
-
-# ===================
-# ROW 7: Export Options
-# ===================
-st.subheader("Export Data")
-
-col1, col2, col3 = st.columns(3)
-
-with col1:
-    csv_rca = rca_counts.to_csv(index=False)
-    st.download_button(
-        label="Download RCA Summary",
-        data=csv_rca,
-        file_name="rca_summary.csv",
-        mime="text/csv"
-    )
-
-with col2:
-    csv_review = no_agreement.to_csv(index=False)
-    st.download_button(
-        label="Download Review Queue",
-        data=csv_review,
-        file_name="review_queue.csv",
-        mime="text/csv"
-    )
-
-with col3:
-    csv_all = disagreements.to_csv(index=False)
-    st.download_button(
-        label="Download All Disagreements",
-        data=csv_all,
-        file_name="all_disagreements.csv",
-        mime="text/csv"
-    )
\ No newline at end of file
+    # Filter high-priority samples (no agreement cases)
+    no_agreement = review_queue(snapshot)
+    record_rows('rca_review_queue', len(no_agreement))
+
+    if len(no_agreement) > 0:
+        st.dataframe(
+            no_agreement[['post_id', 'text', 'label_1', 'label_2', 'label_3', 'rca_category']],
+            use_container_width=True,
+            hide_index=True,
+            column_config={
+                "post_id": st.column_config.TextColumn("ID", width="small"),
+                "text": st.column_config.TextColumn("Text", width="large"),
+                "label_1": st.column_config.TextColumn("L1", width="small"),
+                "label_2": st.column_config.TextColumn("L2", width="small"),
+                "label_3": st.column_config.TextColumn("L3", width="small"),
+                "rca_category": st.column_config.TextColumn("RCA", width="medium"),
+            }
+        )
+    else:
+        st.info("No samples with complete disagreement found.")
+
+    st.markdown("---")
+
+    # ===================
+    # ROW 7: Export Options
+    # ===================
+    st.subheader("Export Data")
+
+    # Download clicks rerun only this section
+    @fragment('rca_export')
+    def export_section():
+        snapshot = current_snapshot()
+        col1, col2, col3 = st.columns(3)
+
+        with col1:
+            csv_rca = rca_table(snapshot).to_csv(index=False)
+            st.download_button(
+                label="Download RCA Summary",
+                data=csv_rca,
+                file_name="rca_summary.csv",
+                mime="text/csv"
+            )
+
+        with col2:
+            csv_review = review_queue(snapshot).to_csv(index=False)
+            st.download_button(
+                label="Download Review Queue",
+                data=csv_review,
+                file_name="review_queue.csv",
+                mime="text/csv"
+            )
+
+        with col3:
+            # The full table is only serialized on request, once per data version;
+            # the JSON API streams it instead of building it in memory
+            if st.button("Prepare All Disagreements", key='rca_export_prepare'):
+                with st.spinner("Building the export..."):
+                    st.session_state.rca_export = (snapshot.version, table_csv('disagreements', snapshot))
+            export = st.session_state.get('rca_export')
+            if export and export[0] == snapshot.version:
+                st.download_button(
+                    label="Download All Disagreements",
+                    data=export[1],
+                    file_name="all_disagreements.csv",
+                    mime="text/csv"
+                )
+            else:
+                st.session_state.pop('rca_export', None)
+            st.caption("Or stream it from the JSON API: `/export/disagreements?format=csv`")
+
+
+    export_section()
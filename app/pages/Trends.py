@@ -0,0 +1,175 @@
+# app/pages/5_📈_Trends.py
+import streamlit as st
+import pandas as pd
+from datetime import datetime, time, timezone
+from pathlib import Path
+import sys
+
+# Add parent directory to path for imports
+sys.path.append(str(Path(__file__).parent.parent))
+from utils.charts import cached_figure
+from utils.data_loader import history_version, load_history, load_history_runs, load_history_series
+from utils.metrics import start_rerun
+
+# Page config
+st.set_page_config(page_title="Quality Trends", page_icon="📈", layout="wide")
+with start_rerun("Trends"):
+    st.title("📈 Quality Trends")
+    st.markdown("How the quality KPIs move from one pipeline run to the next")
+    st.markdown("---")
+
+    runs = load_history_runs()
+    if len(runs) == 0:
+        st.info("""
+    No history recorded yet. Every `python -m pipeline.ingest` run appends its KPIs
+    automatically; to record the CSVs currently in `data/`, run:
+
+    `python -m pipeline.history record`
+    """)
+        st.stop()
+
+    import plotly.express as px
+
+    # ===================
+    # Sidebar: range and resolution
+    # ===================
+    st.sidebar.header("Range")
+
+    first_day = runs['ts'].iloc[0].date()
+    last_day = runs['ts'].iloc[-1].date()
+    date_range = st.sidebar.date_input(
+        "Runs between",
+        value=(first_day, last_day),
+        min_value=first_day,
+        max_value=last_day
+    )
+    if not isinstance(date_range, (tuple, list)):
+        date_range = (date_range,)
+    # While the second date is being picked only one is set
+    start_day = date_range[0]
+    end_day = date_range[1] if len(date_range) > 1 else date_range[0]
+    start = int(datetime.combine(start_day, time.min, timezone.utc).timestamp())
+    end = int(datetime.combine(end_day, time.max, timezone.utc).timestamp())
+
+    max_points = st.sidebar.select_slider(
+        "Points per line",
+        options=[50, 100, 200, 500],
+        value=200,
+        help="Longer ranges are averaged into this many time buckets"
+    )
+
+    in_range = runs[(runs['ts'] >= pd.Timestamp(start, unit='s', tz='UTC')) &
+                    (runs['ts'] <= pd.Timestamp(end, unit='s', tz='UTC'))]
+    st.sidebar.markdown(f"**{len(in_range):,} runs in range** ({len(runs):,} recorded)")
+
+    version = history_version()
+
+
+    def line_chart(chart_id, df, title, labels=None, threshold=None, **kwargs):
+        def build():
+            fig = px.line(df, x='ts', markers=len(df) <= 60, title=title, labels=labels, **kwargs)
+            fig.update_layout(xaxis_title=None, legend_title=None, hovermode='x unified')
+            if threshold is not None:
+                fig.add_hline(y=threshold[0], line_dash="dash", line_color="red", annotation_text=threshold[1])
+            return fig
+        return cached_figure(chart_id, version, build, start, end, max_points)
+
+
+    # ===================
+    # ROW 1: Latest run vs previous
+    # ===================
+    kpis = load_history('kpi', ['krippendorff_alpha', 'full_agreement_rate', 'annotator_mean_agreement',
+                                'strict_annotators_pct'], start=start, end=end, max_points=max_points)
+
+    col1, col2, col3, col4 = st.columns(4)
+    for col, metric, label, fmt in [
+        (col1, 'krippendorff_alpha', "Krippendorff's Alpha", '{:.3f}'),
+        (col2, 'full_agreement_rate', "Full Agreement Rate", '{:.1f}%'),
+        (col3, 'annotator_mean_agreement', "Mean Annotator Agreement", '{:.1f}%'),
+        (col4, 'strict_annotators_pct', "Strict Annotators", '{:.1f}%'),
+    ]:
+        values = kpis.loc[kpis['metric'] == metric, 'value']
+        with col:
+            if len(values) == 0:
+                st.metric(label, "n/a")
+                continue
+            delta = values.iloc[-1] - values.iloc[-2] if len(values) > 1 else None
+            st.metric(label, fmt.format(values.iloc[-1]),
+                      delta=fmt.format(delta) if delta is not None else None)
+
+    st.caption("Deltas compare the last two points in the selected range.")
+    st.markdown("---")
+
+    # ===================
+    # ROW 2: Agreement over time
+    # ===================
+    st.subheader("Agreement over time")
+
+    col1, col2 = st.columns(2)
+
+    with col1:
+        alpha = load_history('kpi', ['krippendorff_alpha'], start=start, end=end, max_points=max_points)
+        fig = line_chart('trend_alpha', alpha, "Krippendorff's Alpha", labels={'value': 'Alpha'},
+                         threshold=(0.667, "Acceptable (0.667)"), y='value')
+        st.plotly_chart(fig, use_container_width=True)
+
+    with col2:
+        rates = load_history('kpi', ['full_agreement_rate', 'partial_agreement_rate', 'no_agreement_rate'],
+                             start=start, end=end, max_points=max_points)
+        fig = line_chart('trend_agreement_rates', rates, 'Agreement Rates', labels={'value': '% of posts'},
+                         y='value', color='metric')
+        st.plotly_chart(fig, use_container_width=True)
+
+    st.markdown("---")
+
+    # ===================
+    # ROW 3: Bias mix and root causes
+    # ===================
+    st.subheader("Annotator bias mix and root causes")
+
+    col1, col2 = st.columns(2)
+
+    with col1:
+        bias = load_history('kpi', ['strict_annotators_pct', 'balanced_annotators_pct', 'lenient_annotators_pct'],
+                            start=start, end=end, max_points=max_points)
+        fig = line_chart('trend_bias_mix', bias, 'Annotator Bias Mix', labels={'value': '% of annotators'},
+                         y='value', color='metric')
+        st.plotly_chart(fig, use_container_width=True)
+
+    with col2:
+        rca = load_history('rca', ['pct'], start=start, end=end, max_points=max_points)
+        fig = line_chart('trend_rca_share', rca, 'Disagreements by RCA Category', labels={'value': '% of disagreements'},
+                         y='value', color='entity')
+        st.plotly_chart(fig, use_container_width=True)
+
+    st.markdown("---")
+
+    # ===================
+    # ROW 4: Individual annotators
+    # ===================
+    st.subheader("Individual annotators")
+
+    annotator_series = load_history_series('annotator')
+    annotator_ids = sorted(annotator_series['entity'].unique(), key=lambda x: (len(x), x))
+    metric_labels = {
+        'agreement_rate': 'Agreement Rate',
+        'strictness_score': 'Strictness Score',
+        'total_labels': 'Total Labels',
+        'hatespeech_pct': 'Hatespeech %',
+        'offensive_pct': 'Offensive %',
+        'normal_pct': 'Normal %',
+    }
+
+    col1, col2 = st.columns([2, 1])
+    with col1:
+        selected = st.multiselect("Annotators", options=annotator_ids, default=annotator_ids[:3])
+    with col2:
+        metric = st.selectbox("Metric", options=list(metric_labels), format_func=metric_labels.get)
+
+    if selected:
+        points = load_history('annotator', [metric], entities=selected, start=start, end=end, max_points=max_points)
+        fig = line_chart(f'trend_annotator_{metric}_{"_".join(selected)}', points, metric_labels[metric],
+                         labels={'value': metric_labels[metric], 'entity': 'Annotator'}, y='value', color='entity')
+        st.plotly_chart(fig, use_container_width=True)
+    else:
+        st.caption("Pick one or more annotators to compare.")
@@ -0,0 +1,311 @@
+import logging
+import os
+import threading
+import zlib
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from utils import queries, sql_backend
+from utils.cache import SHARED_CACHE, derived
+from utils.data_loader import MANAGER, current_snapshot
+from utils.metrics import REGISTRY
+from utils.queries import NO_FILTERS, filter_key
+
+# Approximate mode for very large tables. Each table gets one stratified sample
+# per data version, stratified by the three filter columns, so every sidebar
+# selection is a union of whole strata:
+#
+# - counts over the filter columns (and row counts) are exact, read from the
+#   per-stratum row counts
+# - anything else (label patterns, ...) is estimated from the sampled rows
+#   with a 95% confidence interval
+#
+# The exact answer is computed on a background pool at the same time. Pages
+# render the estimate and poll every POLL_SECONDS (a timed fragment, never a
+# blocking wait); once the exact result is cached the page reruns and every
+# later run gets it straight from the cache.
+#
+# DASHBOARD_APPROX: 'auto' (tables with at least DASHBOARD_APPROX_ROWS rows),
+# 'on' or 'off'.
+APPROX_MODE = os.environ.get('DASHBOARD_APPROX', 'auto')
+APPROX_MIN_ROWS = int(os.environ.get('DASHBOARD_APPROX_ROWS', '1000000'))
+STRATA = sql_backend.FILTER_COLUMNS
+SAMPLE_ROWS = 20_000
+MIN_PER_STRATUM = 50
+Z_95 = 1.96
+REFINE_WORKERS = 2
+# Finished refinements kept beside the cache, for results it did not keep
+FINISHED_KEEP = 256
+POLL_SECONDS = 1
+
+logger = logging.getLogger(__name__)
+
+REGISTRY.describe('dashboard_approx_answers_total', 'counter', 'Approximate-mode answers by query and kind (estimate/exact)')
+
+
+# ===================
+# Stratified sample
+# ===================
+class StratifiedSample:
+    """Bernoulli sample of every stratum plus the exact row count of each stratum
+
+    strata has the STRATA columns, N (rows in the stratum) and n (rows sampled);
+    rows holds the sampled rows with a _stratum column pointing into strata.
+    """
+
+    def __init__(self, strata, rows):
+        self.strata = strata.reset_index(drop=True)
+        self.rows = rows
+
+    @property
+    def nbytes(self):
+        return int(self.rows.memory_usage(deep=True).sum() + self.strata.memory_usage(deep=True).sum())
+
+    def domain(self, filters):
+        """Boolean mask over strata for a filter selection"""
+        mask = np.ones(len(self.strata), dtype=bool)
+        for column, values in zip(STRATA, filters):
+            if values is not None:
+                mask &= self.strata[column].isin(values).to_numpy()
+        return mask
+
+    def total(self, filters=NO_FILTERS):
+        return int(self.strata.loc[self.domain(filters), 'N'].sum())
+
+    def stratum_counts(self, column, filters=NO_FILTERS):
+        """Exact value counts of one STRATA column"""
+        strata = self.strata[self.domain(filters)]
+        counts = strata.groupby(column, dropna=False)['N'].sum().sort_values(ascending=False, kind='stable')
+        return counts.rename_axis(column).reset_index(name='count')
+
+    def estimate_counts(self, values, filters=NO_FILTERS):
+        """Estimated count and 95% interval per value, for a Series aligned with rows
+
+        Per stratum h with N_h rows, n_h sampled and n_hc sampled rows of value c:
+        count_c = sum N_h n_hc / n_h, with the usual stratified variance
+        sum N_h^2 (1 - n_h / N_h) p_hc (1 - p_hc) / (n_h - 1).
+        """
+        in_domain = self.domain(filters)[self.rows['_stratum'].to_numpy()]
+        table = pd.crosstab(self.rows['_stratum'][in_domain], values[in_domain])
+        if table.empty:
+            return pd.DataFrame(columns=['value', 'count', 'low', 'high'])
+        strata = self.strata.loc[table.index]
+        N, n = strata['N'].to_numpy(float), strata['n'].to_numpy(float)
+        share = table.to_numpy(float) / n[:, None]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            weight = np.where(n > 1, N ** 2 * (1 - n / N) / (n - 1), 0.0)
+        count = (share * N[:, None]).sum(axis=0)
+        margin = Z_95 * np.sqrt((share * (1 - share) * weight[:, None]).sum(axis=0))
+        upper = self.total(filters)
+        result = pd.DataFrame({
+            'value': table.columns,
+            'count': count,
+            'low': np.clip(count - margin, 0, upper),
+            'high': np.clip(count + margin, 0, upper),
+        })
+        return result.sort_values('count', ascending=False, kind='stable').reset_index(drop=True)
+
+
+def _seed(version, table):
+    return zlib.crc32(f'{version}:{table}'.encode())
+
+
+def sample_rates(N):
+    """Per-stratum sampling rate: proportional to size, at least MIN_PER_STRATUM rows"""
+    N = np.asarray(N, dtype=float)
+    target = np.maximum(SAMPLE_ROWS * N / N.sum(), MIN_PER_STRATUM) if N.sum() else N
+    return np.minimum(1.0, np.divide(target, N, out=np.ones_like(N), where=N > 0))
+
+
+@derived('stratified_sample')
+def _sample(snapshot, table):
+    if snapshot.db_path and table in sql_backend.SQL_TABLES:
+        strata = sql_backend.strata_counts(snapshot.db_path, table, STRATA).rename(columns={'rows': 'N'})
+        rates = sample_rates(strata['N'])
+        rows = sql_backend.sample_strata(snapshot.db_path, table, STRATA,
+                                         strata[list(STRATA)].itertuples(index=False, name=None), rates)
+    else:
+        df = snapshot.table(table)
+        codes, strata = pd.MultiIndex.from_frame(df[list(STRATA)]).factorize()
+        strata = strata.to_frame(index=False, name=list(STRATA))
+        strata['N'] = np.bincount(codes, minlength=len(strata))
+        rates = sample_rates(strata['N'])
+        keep = np.random.default_rng(_seed(snapshot.version, table)).random(len(df)) < rates[codes]
+        rows = df[keep].assign(_stratum=codes[keep])
+    strata['n'] = np.bincount(rows['_stratum'], minlength=len(strata)) if len(rows) else 0
+    return StratifiedSample(strata, rows.reset_index(drop=True))
+
+
+@derived('approx_table_rows')
+def _table_rows(snapshot, table):
+    if snapshot.db_path and table in sql_backend.SQL_TABLES:
+        return sql_backend.count_rows(snapshot.db_path, table)
+    return len(snapshot.table(table))
+
+
+def active(table, snapshot=None):
+    """Whether queries on this table are answered from the stratified sample"""
+    if APPROX_MODE == 'off':
+        return False
+    if APPROX_MODE == 'on':
+        return True
+    return _table_rows(snapshot or current_snapshot(), table) >= APPROX_MIN_ROWS
+
+
+# ===================
+# Progressive answers
+# ===================
+class Answer:
+    """A query result that is either exact or a sample estimate still being refined
+
+    value has low/high columns with the 95% interval (equal to the value when exact).
+    error is set when the exact computation failed; the estimate is then final.
+    """
+
+    __slots__ = ('value', 'exact', 'sample_rows', 'error', '_version', '_future')
+
+    def __init__(self, value, exact, sample_rows=0, error=None, version=None, future=None):
+        self.value = value
+        self.exact = exact
+        self.sample_rows = sample_rows
+        self.error = error
+        self._version = version
+        self._future = future
+
+    def ready(self):
+        """Whether a rerun would now get a better answer: the exact one, or a newer snapshot's"""
+        if self.exact or self.error is not None:
+            return False
+        return self._future.done() or current_snapshot().version != self._version
+
+
+_refiner = ThreadPoolExecutor(max_workers=REFINE_WORKERS, thread_name_prefix='approx-refine')
+_pending = {}
+# Done futures by key: the exact value when the cache skipped or evicted it, or the
+# exception, so a failed query is not resubmitted on every rerun
+_finished = OrderedDict()
+# Reentrant: a future that is already done runs its callback inside _refine
+_pending_lock = threading.RLock()
+_MISSING = object()
+
+
+def _refine(key, compute):
+    with _pending_lock:
+        future = _pending.get(key) or _finished.get(key)
+        if future is None:
+            future = _pending[key] = _refiner.submit(lambda: SHARED_CACHE.put(key, compute()))
+            future.add_done_callback(lambda done: _settle(key, done))
+        return future
+
+
+def _settle(key, future):
+    if future.exception() is not None:
+        logger.warning("Exact %s failed; keeping the estimate: %s", key[0], future.exception())
+    with _pending_lock:
+        _pending.pop(key, None)
+        _finished[key] = future
+        _finished.move_to_end(key)
+        while len(_finished) > FINISHED_KEEP:
+            _finished.popitem(last=False)
+
+
+def _finished_value(key):
+    with _pending_lock:
+        future = _finished.get(key)
+    if future is None or future.exception() is not None:
+        return _MISSING
+    return future.result()
+
+
+def _answer(name, snapshot, table, exact, estimate, *args):
+    if not active(table, snapshot):
+        return Answer(exact(), True)
+    key = (f'approx_exact:{name}', snapshot.version) + args
+    done = SHARED_CACHE.get(key, _MISSING)
+    if done is _MISSING:
+        done = _finished_value(key)
+    if done is not _MISSING:
+        REGISTRY.inc('dashboard_approx_answers_total', {'query': name, 'kind': 'exact'})
+        return Answer(done, True)
+    sample = _sample(snapshot, table)
+    value = estimate(sample)
+    if value is None:
+        # Exact from the stratum counts alone; nothing to refine
+        REGISTRY.inc('dashboard_approx_answers_total', {'query': name, 'kind': 'exact'})
+        return Answer(exact_from_strata(name, sample, args), True)
+    REGISTRY.inc('dashboard_approx_answers_total', {'query': name, 'kind': 'estimate'})
+    future = _refine(key, exact)
+    error = future.exception() if future.done() else None
+    if future.done() and error is None:
+        # Finished since the cache lookup, or finished but not kept by the cache
+        REGISTRY.inc('dashboard_approx_answers_total', {'query': name, 'kind': 'exact'})
+        return Answer(future.result(), True)
+    return Answer(value, False, len(sample.rows), error, snapshot.version, future)
+
+
+def exact_from_strata(name, sample, args):
+    if name == 'count_rows':
+        return sample.total(args[0])
+    table, column, filters = args
+    counts = sample.stratum_counts(column, filters)
+    return counts.assign(low=counts['count'], high=counts['count'])
+
+
+def _with_interval(df, count='count'):
+    return df.assign(low=df[count], high=df[count])
+
+
+# ===================
+# Queries
+# ===================
+def count_rows(filters=NO_FILTERS, snapshot=None):
+    """Number of disagreement rows matching the filters (exact in both modes)"""
+    snapshot = snapshot or current_snapshot()
+    filters = filter_key(*filters)
+    return _answer('count_rows', snapshot, 'disagreements',
+                   lambda: queries.count_rows(filters, snapshot=snapshot), lambda sample: None, filters)
+
+
+def value_counts(table, column, snapshot=None, filters=NO_FILTERS):
+    """value_counts() with count/low/high columns; filters apply to disagreements only"""
+    snapshot = snapshot or current_snapshot()
+    filters = filter_key(*filters) if table == 'disagreements' else NO_FILTERS
+
+    def exact():
+        return _with_interval(queries.value_counts(table, column, snapshot, filters))
+
+    def estimate(sample):
+        if column in STRATA:
+            return None
+        counts = sample.estimate_counts(sample.rows[column], filters)
+        return counts.rename(columns={'value': column})
+    return _answer('value_counts', snapshot, table, exact, estimate, table, column, filters)
+
+
+def label_combo_counts(agreement_types, majority_labels, rca_categories, top_n=10, snapshot=None):
+    """Most frequent label patterns among the filtered rows, with 95% intervals"""
+    snapshot = snapshot or current_snapshot()
+    filters = filter_key(agreement_types, majority_labels, rca_categories)
+
+    def exact():
+        return _with_interval(queries.label_combo_counts(*filters, top_n=top_n, snapshot=snapshot), 'Count')
+
+    def estimate(sample):
+        rows = sample.rows
+        combos = rows['label_1'] + ' vs ' + rows['label_2'] + ' vs ' + rows['label_3']
+        counts = sample.estimate_counts(combos, filters).head(top_n)
+        return counts.rename(columns={'value': 'Label Combination', 'count': 'Count'})
+    return _answer('label_combos', snapshot, 'disagreements', exact, estimate, filters, top_n)
+
+
+def warm(snapshot):
+    """Build the samples off the request path when approximate mode applies"""
+    for table in ('posts', 'disagreements'):
+        if snapshot.has_table(table) and active(table, snapshot):
+            _sample(snapshot, table)
+
+
+MANAGER.warmers.append(warm)
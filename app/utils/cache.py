@@ -0,0 +1,173 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import CancelledError, Future
+from functools import wraps
+from pathlib import Path
+
+from utils.metrics import REGISTRY, object_size
+
+DATA_DIR = Path(__file__).parent.parent.parent / "data"
+
+# Memory budget for derived results shared by every session in the process
+DEFAULT_BUDGET_MB = int(os.environ.get('DASHBOARD_CACHE_MB', '256'))
+
+REGISTRY.describe('dashboard_derived_cache_requests_total', 'counter', 'Derived-result lookups by namespace and result (hit/miss/wait)')
+REGISTRY.describe('dashboard_derived_cache_evictions_total', 'counter', 'Derived results evicted to stay within budget')
+REGISTRY.describe('dashboard_derived_cache_bytes', 'gauge', 'Estimated bytes held in the derived-result cache')
+REGISTRY.describe('dashboard_derived_cache_entries', 'gauge', 'Entries held in the derived-result cache')
+
+
+# ===================
+# Data versions
+# ===================
+def file_version(path):
+    """Cheap change token for one file: (mtime_ns, size), or None if missing"""
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+def data_version(data_dir=DATA_DIR):
+    """Short token that changes whenever any CSV in the data directory changes"""
+    digest = hashlib.sha1()
+    for path in sorted(Path(data_dir).glob('*.csv')):
+        digest.update(f"{path.name}:{file_version(path)}".encode())
+    return digest.hexdigest()[:12]
+
+
+# ===================
+# LRU cache with a memory budget
+# ===================
+_MISSING = object()
+
+
+class LRUCache:
+    """Least-recently-used cache bounded by estimated bytes and entry count"""
+
+    def __init__(self, max_bytes, max_entries=10_000, name='derived'):
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.name = name
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._bytes = 0
+        # key -> Future of the computation running for it in get_or_compute
+        self._inflight = {}
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key not in self._entries:
+                return default
+            self._entries.move_to_end(key)
+            return self._entries[key][0]
+
+    def put(self, key, value):
+        size = object_size(value)
+        if size > self.max_bytes:
+            # Too big to keep; caller still gets the value it computed
+            return value
+        with self._lock:
+            if key in self._entries:
+                self._bytes -= self._entries.pop(key)[1]
+            self._entries[key] = (value, size)
+            self._bytes += size
+            self._evict()
+            self._publish()
+        return value
+
+    def get_or_compute(self, key, compute, namespace='default'):
+        """Cached value for key, computing it once even when several threads miss together
+
+        The first caller to miss computes; later callers wait for its result (or
+        its exception) instead of running the same derivation again.
+        """
+        hit, running, future = _MISSING, None, None
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                hit = self._entries[key][0]
+            elif key in self._inflight:
+                running = self._inflight[key]
+            else:
+                future = self._inflight[key] = Future()
+        if hit is not _MISSING:
+            REGISTRY.inc('dashboard_derived_cache_requests_total', {'namespace': namespace, 'result': 'hit'})
+            return hit
+        if running is not None:
+            REGISTRY.inc('dashboard_derived_cache_requests_total', {'namespace': namespace, 'result': 'wait'})
+            try:
+                return running.result()
+            except CancelledError:
+                # The computing thread was interrupted (not failed); try again
+                return self.get_or_compute(key, compute, namespace)
+
+        REGISTRY.inc('dashboard_derived_cache_requests_total', {'namespace': namespace, 'result': 'miss'})
+        try:
+            value = self.put(key, compute())
+        except Exception as exc:
+            future.set_exception(exc)
+            raise
+        except BaseException:
+            future.cancel()
+            raise
+        else:
+            future.set_result(value)
+            return value
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    def drop_versions_except(self, version, keep_prefixes=('history:',)):
+        """Eagerly release every entry built from an older data version
+
+        Namespaces in keep_prefixes are keyed on their own change token (the
+        metric history file), not the data version, so they are left alone.
+        """
+        with self._lock:
+            stale = [k for k in self._entries if k[1] != version and not str(k[0]).startswith(keep_prefixes)]
+            for key in stale:
+                self._bytes -= self._entries.pop(key)[1]
+            self._publish()
+        return len(stale)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+            self._publish()
+
+    def stats(self):
+        with self._lock:
+            return {'entries': len(self._entries), 'bytes': self._bytes, 'max_bytes': self.max_bytes}
+
+    def _evict(self):
+        while self._entries and (self._bytes > self.max_bytes or len(self._entries) > self.max_entries):
+            _, (_, size) = self._entries.popitem(last=False)
+            self._bytes -= size
+            REGISTRY.inc('dashboard_derived_cache_evictions_total', {'cache': self.name})
+
+    def _publish(self):
+        REGISTRY.set('dashboard_derived_cache_bytes', self._bytes, {'cache': self.name})
+        REGISTRY.set('dashboard_derived_cache_entries', len(self._entries), {'cache': self.name})
+
+
+SHARED_CACHE = LRUCache(DEFAULT_BUDGET_MB * 1024 * 1024)
+
+
+def derived(namespace):
+    """Memoize fn(snapshot, *args) in SHARED_CACHE keyed on (namespace, snapshot.version, args)
+
+    The remaining arguments must be hashable (use tuples for filter selections).
+    Only the version string is kept in the key, never the snapshot itself.
+    """
+    def decorate(fn):
+        @wraps(fn)
+        def wrapper(snapshot, *args):
+            key = (namespace, snapshot.version) + args
+            return SHARED_CACHE.get_or_compute(key, lambda: fn(snapshot, *args), namespace)
+        return wrapper
+    return decorate
@@ -0,0 +1,146 @@
+import numpy as np
+
+from utils.cache import SHARED_CACHE
+from utils.metrics import REGISTRY
+
+# Above this many points scatters switch from SVG to WebGL (scattergl) traces
+WEBGL_THRESHOLD = 1_000
+# Above this many points a scatter is shipped as a binned density grid instead
+DENSITY_THRESHOLD = 50_000
+DENSITY_BINS = 80
+
+REGISTRY.describe('dashboard_chart_points', 'summary', 'Points or bins shipped to the browser per chart')
+
+
+# ===================
+# Scatter
+# ===================
+def scatter(df, x, y, title=None, labels=None, hover_data=None, **kwargs):
+    """px.scatter that stays fast as the row count grows
+
+    Small frames render as usual. Larger ones use WebGL, and very large ones are
+    reduced on the server to a 2D grid, so the payload no longer depends on the
+    row count. The grid keeps color and size (see density()); hover_data and
+    other px options only apply to real points.
+    """
+    import plotly.express as px
+
+    if len(df) > DENSITY_THRESHOLD:
+        return density(df, x, y, title=title, labels=labels, color=kwargs.get('color'),
+                       size=kwargs.get('size'), color_discrete_map=kwargs.get('color_discrete_map'))
+
+    render_mode = 'webgl' if len(df) > WEBGL_THRESHOLD else 'svg'
+    REGISTRY.observe('dashboard_chart_points', len(df), {'chart': title or 'scatter', 'mode': render_mode})
+    return px.scatter(
+        df, x=x, y=y, title=title, labels=labels, hover_data=hover_data,
+        render_mode=render_mode, **kwargs
+    )
+
+
+def density(df, x, y, bins=DENSITY_BINS, title=None, labels=None, color=None, size=None, color_discrete_map=None):
+    """Points binned on a bins x bins grid with numpy
+
+    Without color, a heatmap of point counts (or of summed size when given). A
+    numeric color becomes a heatmap of its mean per cell. A categorical color
+    gives one marker per category and cell, at the cell centre, sized by the
+    cell's count (or summed size) and colored as in the scatter it replaces.
+    """
+    import plotly.graph_objects as go
+
+    labels = labels or {}
+    color_discrete_map = color_discrete_map or {}
+    values = df[[c for c in dict.fromkeys([x, y, color, size]) if c is not None]].dropna()
+    x_edges = np.histogram_bin_edges(values[x], bins)
+    y_edges = np.histogram_bin_edges(values[y], bins)
+    x_mid = (x_edges[:-1] + x_edges[1:]) / 2
+    y_mid = (y_edges[:-1] + y_edges[1:]) / 2
+    weights = values[size].to_numpy(float) if size else None
+
+    def grid(rows, w=None):
+        # histogram2d puts x on the first axis; plotly expects rows = y
+        counts, _, _ = np.histogram2d(values[x][rows], values[y][rows], bins=[x_edges, y_edges], weights=w)
+        return counts.T
+
+    everything = np.ones(len(values), dtype=bool)
+    counts = grid(everything)
+    amount = grid(everything, weights) if size else counts
+    amount_label = f"Total {labels.get(size, size)}" if size else 'Count'
+
+    if color is not None and values[color].dtype.kind not in 'biuf':
+        fig = go.Figure()
+        scale = 30 / np.sqrt(amount.max()) if amount.max() > 0 else 0
+        cells = 0
+        for category in sorted(values[color].unique(), key=str):
+            rows = (values[color] == category).to_numpy()
+            z = grid(rows, weights[rows] if size else None)
+            yi, xi = np.nonzero(z)
+            cells += len(xi)
+            fig.add_trace(go.Scattergl(
+                x=x_mid[xi], y=y_mid[yi], mode='markers', name=str(category),
+                marker={'size': np.maximum(np.sqrt(z[yi, xi]) * scale, 3), 'color': color_discrete_map.get(category),
+                        'opacity': 0.7},
+                customdata=z[yi, xi],
+                hovertemplate=f'%{{x:.3g}}, %{{y:.3g}}<br>{amount_label}: %{{customdata:.4g}}<extra>{category}</extra>',
+            ))
+        fig.update_layout(legend_title_text=labels.get(color, color))
+        REGISTRY.observe('dashboard_chart_points', cells, {'chart': title or 'density', 'mode': 'density'})
+    else:
+        if color is not None:
+            with np.errstate(invalid='ignore', divide='ignore'):
+                z = grid(everything, values[color].to_numpy(float)) / counts
+            z_label = f"Mean {labels.get(color, color)}"
+        else:
+            z, z_label = amount, amount_label
+        REGISTRY.observe('dashboard_chart_points', counts.size, {'chart': title or 'density', 'mode': 'density'})
+        fig = go.Figure(go.Heatmap(
+            x=x_mid,
+            y=y_mid,
+            z=np.where(counts > 0, z, np.nan),
+            colorscale='Blues',
+            colorbar={'title': z_label},
+            hovertemplate=f'%{{x:.3g}}, %{{y:.3g}}<br>{z_label}: %{{z:.4g}}<extra></extra>',
+        ))
+    fig.update_layout(title=title, xaxis_title=labels.get(x, x), yaxis_title=labels.get(y, y))
+    return fig
+
+
+# ===================
+# Histogram
+# ===================
+def histogram(df, x, nbins=20, title=None, labels=None, color=None):
+    """Histogram binned on the server; only bin edges and counts are sent"""
+    import plotly.graph_objects as go
+
+    labels = labels or {}
+    values = df[x].dropna().to_numpy()
+    counts, edges = np.histogram(values, bins=nbins)
+    REGISTRY.observe('dashboard_chart_points', len(counts), {'chart': title or 'histogram', 'mode': 'binned'})
+
+    fig = go.Figure(go.Bar(
+        x=(edges[:-1] + edges[1:]) / 2,
+        y=counts,
+        width=np.diff(edges),
+        customdata=np.stack([edges[:-1], edges[1:]], axis=-1),
+        hovertemplate='%{customdata[0]:.3g} – %{customdata[1]:.3g}<br>Count: %{y}<extra></extra>',
+        marker_color=color,
+    ))
+    fig.update_layout(
+        title=title,
+        xaxis_title=labels.get(x, x),
+        yaxis_title=labels.get('count', 'count'),
+        bargap=0,
+    )
+    return fig
+
+
+# ===================
+# Figure cache
+# ===================
+def cached_figure(chart_id, version, build, *key):
+    """Figure returned by build(), memoized per (chart_id, data version, key)
+
+    Entries live in the shared LRU cache, so they count against its memory budget
+    and are dropped when a new snapshot is swapped in. The figure is shared by
+    every session and must not be modified after it is returned.
+    """
+    return SHARED_CACHE.get_or_compute((f'figure:{chart_id}', version) + key, build, 'figure')
@@ -1,29 +1,71 @@
-import pandas as pd
-import streamlit as st
+import os
+import sys
 from pathlib import Path
 
-@st.cache_data
+from utils.cache import DATA_DIR, SHARED_CACHE, file_version
+from utils.metrics import REGISTRY
+from utils.snapshot import TABLE_FILES, SnapshotManager, read_table, summary_dict
+
+# pipeline/ sits next to app/ and owns the metric history store
+sys.path.append(str(Path(__file__).parent.parent.parent))
+from pipeline import history
+
+# One snapshot manager per process. It watches data/ and swaps in rebuilt
+# snapshots in the background, so no rerun waits on a CSV parse after startup.
+MANAGER = SnapshotManager(poll_seconds=float(os.environ.get('DASHBOARD_RELOAD_SECONDS', '5')))
+
+def current_snapshot():
+    """Snapshot to use for the whole rerun"""
+    ready = MANAGER.ready
+    snapshot = MANAGER.start().current()
+    REGISTRY.inc('dashboard_cache_requests_total', {'loader': 'snapshot', 'result': 'hit' if ready else 'miss'})
+    return snapshot
+
 def load_posts():
     """Load posts analysis data"""
-    path = Path(__file__).parent.parent.parent / "data" / "posts_analysis.csv"
-    return pd.read_csv(path)
+    return current_snapshot().table('posts')
 
-@st.cache_data
 def load_annotators():
     """Load annotators analysis data"""
-    path = Path(__file__).parent.parent.parent / "data" / "annotators_analysis.csv"
-    return pd.read_csv(path)
+    return current_snapshot().table('annotators')
 
-@st.cache_data
 def load_summary():
-    """Load summary metrics data"""
-    path = Path(__file__).parent.parent.parent / "data" / "summary_metrics.csv"
-    df = pd.read_csv(path)
-    # Convert to dictionary for easy access
-    return dict(zip(df['metric'], df['value']))
+    """Load summary metrics data
+
+    Served straight from the small CSV while the first snapshot is still being
+    built, so KPI rows can paint without waiting for the large tables.
+    """
+    if MANAGER.ready:
+        return current_snapshot().summary
+    MANAGER.start()
+    return summary_dict(read_table(DATA_DIR / TABLE_FILES['summary']))
 
-@st.cache_data
 def load_disagreements():
     """Load disagreement samples data"""
-    path = Path(__file__).parent.parent.parent / "data" / "disagreement_samples.csv"
-    return pd.read_csv(path)
\ No newline at end of file
+    return current_snapshot().table('disagreements')
+
+def history_version():
+    """Change token for the metric history file; a new run shows up on the next rerun"""
+    return file_version(history.HISTORY_PATH)
+
+def _history_cached(name, compute, *args):
+    key = (f'history:{name}', history_version()) + args
+    return SHARED_CACHE.get_or_compute(key, compute, 'history')
+
+def load_history_runs():
+    """Recorded pipeline runs, oldest first"""
+    return _history_cached('runs', history.runs)
+
+def load_history_series(scope):
+    """(entity, metric) pairs recorded for one scope"""
+    return _history_cached('series', lambda: history.list_series(scope), scope)
+
+def load_history(scope, metrics, entities=None, start=None, end=None, max_points=history.DEFAULT_MAX_POINTS):
+    """Downsampled history points for a set of series"""
+    metrics = tuple(metrics)
+    entities = tuple(entities) if entities is not None else None
+    return _history_cached(
+        'points',
+        lambda: history.query(scope, metrics, entities, start, end, max_points),
+        scope, metrics, entities, start, end, max_points
+    )
@@ -0,0 +1,39 @@
+import time
+from functools import wraps
+
+import streamlit as st
+
+from utils.metrics import REGISTRY, publish
+
+REGISTRY.describe('dashboard_fragment_seconds', 'summary', 'Wall time of one page section run (full or fragment-only rerun)')
+
+# st.fragment (1.37+) or st.experimental_fragment (1.33-1.36); older versions
+# simply run the section as part of the full page
+_st_fragment = getattr(st, 'fragment', None) or getattr(st, 'experimental_fragment', None)
+
+
+def fragment(name, run_every=None):
+    """Run a page section as a Streamlit fragment
+
+    Widgets inside the section only rerun that section, not the whole page.
+    Streamlit stores a fragment once per session, so a fragment-only rerun replays
+    the arguments of the session's first call, not the last full run's. Sections
+    therefore take no data arguments: they call current_snapshot() themselves and
+    read page state (filters, selections) from widget keys in st.session_state.
+
+    run_every (seconds) also reruns the section on a timer, for as long as full
+    runs of the page keep calling it.
+    """
+    def decorate(fn):
+        @wraps(fn)
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                REGISTRY.observe('dashboard_fragment_seconds', time.perf_counter() - start, {'fragment': name})
+                publish()
+        if not _st_fragment:
+            return timed
+        return _st_fragment(timed, run_every=run_every) if run_every else _st_fragment(timed)
+    return decorate
@@ -0,0 +1,197 @@
+from utils.cache import DATA_DIR, SHARED_CACHE, data_version
+from utils.data_loader import MANAGER, current_snapshot
+from utils import approx
+from utils.snapshot import TABLE_FILES, read_table, summary_dict
+from pipeline.ingest import most_frequent_rca_category
+
+# Every number a page shows is a named metric declared here, with the base tables
+# and other metrics it is computed from. Values are computed only when a page asks
+# for them, each one once per data version, and cached under that version, so a
+# data refresh can never leave a stale figure on screen.
+SLUR_CATEGORIES = ('Racial Slurs', 'Gender/Sexuality', 'Religious Terms')
+
+
+# ===================
+# Dependency graph
+# ===================
+class Metric:
+    __slots__ = ('name', 'fn', 'deps', 'tables', 'doc')
+
+    def __init__(self, name, fn, deps, tables, doc):
+        self.name = name
+        self.fn = fn
+        self.deps = deps
+        self.tables = tables
+        self.doc = doc
+
+
+class MetricGraph:
+    """Metrics as nodes computed from base tables and other metrics
+
+    fn(source, *dep_values) computes a node, where source is a Snapshot. A metric
+    can only depend on metrics declared before it, so the graph has no cycles.
+    """
+
+    def __init__(self):
+        self.metrics = {}
+
+    def add(self, name, fn, deps=(), tables=(), doc=''):
+        if name in self.metrics:
+            raise ValueError(f"Metric {name!r} is already declared")
+        missing = [dep for dep in deps if dep not in self.metrics]
+        if missing:
+            raise ValueError(f"Metric {name!r} depends on undeclared metrics: {', '.join(missing)}")
+        # Base tables the metric needs, directly or through its dependencies
+        needed = set(tables)
+        for dep in deps:
+            needed |= self.metrics[dep].tables
+        self.metrics[name] = Metric(name, fn, tuple(deps), frozenset(needed), doc or fn.__doc__ or '')
+        return fn
+
+    def metric(self, name, deps=(), tables=()):
+        """Decorator form of add()"""
+        def decorate(fn):
+            return self.add(name, fn, deps, tables)
+        return decorate
+
+    def tables(self, name):
+        return self._get(name).tables
+
+    def evaluate(self, name, source):
+        """Value of one metric, computing missing dependencies first"""
+        metric = self._get(name)
+
+        def compute():
+            return metric.fn(source, *(self.evaluate(dep, source) for dep in metric.deps))
+        return SHARED_CACHE.get_or_compute((f'kpi:{name}', source.version), compute, 'kpi')
+
+    def _get(self, name):
+        try:
+            return self.metrics[name]
+        except KeyError:
+            raise KeyError(f"Unknown metric {name!r}") from None
+
+
+KPIS = MetricGraph()
+
+
+class SummarySource:
+    """Snapshot stand-in holding only summary_metrics.csv
+
+    Lets metrics that only need the summary table render before the first full
+    snapshot is built. Its version matches the snapshot built from the same files,
+    so those values stay cached once the snapshot is swapped in.
+    """
+
+    db_path = None
+
+    def __init__(self, data_dir=DATA_DIR):
+        self.version = data_version(data_dir)
+        self.path = data_dir / TABLE_FILES['summary']
+
+    def has_table(self, name):
+        return name == 'summary' and self.path.exists()
+
+    def table(self, name):
+        if name != 'summary':
+            raise FileNotFoundError(f"{TABLE_FILES[name]} is not loaded yet")
+        return read_table(self.path)
+
+
+def _source(name, snapshot):
+    if snapshot is not None:
+        return snapshot
+    if MANAGER.ready or not KPIS.tables(name) <= {'summary'}:
+        return current_snapshot()
+    MANAGER.start()
+    return SummarySource()
+
+
+def kpi(name, snapshot=None):
+    """Value of one metric for the snapshot (the current one by default)"""
+    return KPIS.evaluate(name, _source(name, snapshot))
+
+
+# ===================
+# Summary table
+# ===================
+@KPIS.metric('summary', tables=('summary',))
+def _summary(source):
+    return summary_dict(source.table('summary'))
+
+
+SUMMARY_METRICS = {
+    'total_posts': int,
+    'total_annotators': int,
+    'total_annotations': int,
+    'krippendorff_alpha': float,
+    'full_agreement_rate': float,
+    'partial_agreement_rate': float,
+    'no_agreement_rate': float,
+    'majority_normal_pct': float,
+    'majority_offensive_pct': float,
+    'majority_hatespeech_pct': float,
+    'annotator_mean_agreement': float,
+    'strict_annotators_pct': float,
+    'lenient_annotators_pct': float,
+    'balanced_annotators_pct': float,
+    'samples_with_rationales_pct': float,
+}
+
+for _name, _cast in SUMMARY_METRICS.items():
+    # Values are read as text because the value column mixes numbers and labels
+    KPIS.add(_name, lambda source, summary, name=_name, cast=_cast: cast(float(summary[name])),
+             deps=('summary',), doc=f"{_name} from summary_metrics.csv")
+
+
+# ===================
+# Root causes
+# ===================
+@KPIS.metric('rca_counts', tables=('disagreements',))
+def _rca_counts(source):
+    """Disagreement samples per RCA category, largest first"""
+    counts = approx.value_counts('disagreements', 'rca_category', source).value
+    return dict(zip(counts['rca_category'], counts['count'].astype(int)))
+
+
+@KPIS.metric('disagreement_samples', deps=('rca_counts',))
+def _disagreement_samples(source, rca_counts):
+    return sum(rca_counts.values())
+
+
+@KPIS.metric('rca_share', deps=('rca_counts', 'disagreement_samples'))
+def _rca_share(source, rca_counts, total):
+    """% of disagreement samples per RCA category"""
+    return {category: count / total * 100 if total else 0.0 for category, count in rca_counts.items()}
+
+
+@KPIS.metric('most_frequent_rca_category', deps=('rca_counts',))
+def _most_frequent_rca_category(source, rca_counts):
+    """Most frequent RCA category among disagreement samples, excluding Other/Unclear"""
+    return most_frequent_rca_category(rca_counts)
+
+
+@KPIS.metric('unclear_rca_pct', deps=('rca_share',))
+def _unclear_rca_pct(source, rca_share):
+    return rca_share.get('Other/Unclear', 0.0)
+
+
+@KPIS.metric('group_reference_samples', deps=('rca_counts',))
+def _group_reference_samples(source, rca_counts):
+    return rca_counts.get('Group References', 0)
+
+
+@KPIS.metric('group_reference_pct', deps=('rca_share',))
+def _group_reference_pct(source, rca_share):
+    return rca_share.get('Group References', 0.0)
+
+
+@KPIS.metric('slur_identity_pct', deps=('rca_share',))
+def _slur_identity_pct(source, rca_share):
+    """Combined share of the racial, gender/sexuality and religious categories"""
+    return sum(rca_share.get(category, 0.0) for category in SLUR_CATEGORIES)
+
+
+@KPIS.metric('profanity_samples', deps=('rca_counts',))
+def _profanity_samples(source, rca_counts):
+    return rca_counts.get('Profanity', 0)
@@ -0,0 +1,262 @@
+import logging
+import os
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# How many recent observations each summary keeps for quantiles
+SAMPLE_WINDOW = 1024
+QUANTILES = (0.5, 0.95, 0.99)
+
+# A session counts as active if it reran within this many seconds
+SESSION_IDLE_SECONDS = 300
+
+logger = logging.getLogger(__name__)
+
+
+class MetricsRegistry:
+    """Thread-safe in-process store for counters, gauges and summaries"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._gauges = {}
+        self._summaries = {}
+        self._help = {}
+        self._sessions = {}
+
+    def describe(self, name, kind, text):
+        self._help[name] = (kind, text)
+
+    def inc(self, name, labels=None, value=1):
+        key = (name, _label_key(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def set(self, name, value, labels=None):
+        with self._lock:
+            self._gauges[(name, _label_key(labels))] = value
+
+    def observe(self, name, value, labels=None):
+        key = (name, _label_key(labels))
+        with self._lock:
+            summary = self._summaries.get(key)
+            if summary is None:
+                summary = self._summaries[key] = {
+                    'samples': deque(maxlen=SAMPLE_WINDOW), 'count': 0, 'sum': 0.0
+                }
+            summary['samples'].append(value)
+            summary['count'] += 1
+            summary['sum'] += value
+
+    def touch_session(self, session_id):
+        now = time.time()
+        with self._lock:
+            self._sessions[session_id] = now
+            cutoff = now - SESSION_IDLE_SECONDS
+            for sid in [s for s, seen in self._sessions.items() if seen < cutoff]:
+                del self._sessions[sid]
+            self._gauges[('dashboard_active_sessions', ())] = len(self._sessions)
+
+    def render(self):
+        """Render every metric in Prometheus text exposition format"""
+        with self._lock:
+            counters = dict(self._counters)
+            gauges = dict(self._gauges)
+            summaries = {
+                key: (sorted(s['samples']), s['count'], s['sum'])
+                for key, s in self._summaries.items()
+            }
+
+        lines = []
+        seen = set()
+
+        def header(name, kind):
+            if name in seen:
+                return
+            seen.add(name)
+            text = self._help.get(name, (kind, name))[1]
+            lines.append(f"# HELP {name} {text}")
+            lines.append(f"# TYPE {name} {kind}")
+
+        for (name, labels), value in sorted(counters.items()):
+            header(name, 'counter')
+            lines.append(f"{name}{_format_labels(labels)} {value}")
+
+        for (name, labels), value in sorted(gauges.items()):
+            header(name, 'gauge')
+            lines.append(f"{name}{_format_labels(labels)} {value}")
+
+        for (name, labels), (samples, count, total) in sorted(summaries.items()):
+            header(name, 'summary')
+            for q in QUANTILES:
+                q_labels = labels + (('quantile', str(q)),)
+                lines.append(f"{name}{_format_labels(q_labels)} {_quantile(samples, q)}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {total}")
+            lines.append(f"{name}_count{_format_labels(labels)} {count}")
+
+        return "\n".join(lines) + "\n"
+
+
+def _label_key(labels):
+    return tuple(sorted((labels or {}).items()))
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    parts = []
+    for k, v in labels:
+        v = str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        parts.append(f'{k}="{v}"')
+    return "{" + ",".join(parts) + "}"
+
+
+def _quantile(sorted_samples, q):
+    if not sorted_samples:
+        return float('nan')
+    idx = min(len(sorted_samples) - 1, int(q * len(sorted_samples)))
+    return sorted_samples[idx]
+
+
+# Single registry shared by every page in the Streamlit process
+REGISTRY = MetricsRegistry()
+REGISTRY.describe('dashboard_cache_requests_total', 'counter', 'Loader calls by result (hit = snapshot ready, miss = built inline)')
+REGISTRY.describe('dashboard_cache_load_seconds', 'summary', 'Time spent parsing one table during a snapshot build')
+REGISTRY.describe('dashboard_cache_object_bytes', 'gauge', 'In-memory size of each table in the latest snapshot')
+REGISTRY.describe('dashboard_rerun_seconds', 'summary', 'Wall time of a full page script rerun')
+REGISTRY.describe('dashboard_rows_filtered', 'summary', 'Rows returned by a filter query')
+REGISTRY.describe('dashboard_active_sessions', 'gauge', 'Sessions that reran recently')
+
+
+# ===================
+# Instrumentation helpers
+# ===================
+def object_size(obj):
+    """Best-effort in-memory size of a cached object in bytes"""
+    if hasattr(obj, 'memory_usage'):
+        usage = obj.memory_usage(deep=True)
+        return int(usage.sum() if hasattr(usage, 'sum') else usage)
+    if hasattr(obj, 'nbytes'):
+        return int(obj.nbytes)
+    if hasattr(obj, 'to_plotly_json'):
+        # Plotly figures: str() renders the repr, which is neither cheap nor the payload size
+        return len(obj.to_json())
+    if isinstance(obj, (tuple, list)):
+        return sum(object_size(item) for item in obj)
+    if isinstance(obj, dict):
+        return sum(len(str(k)) + len(str(v)) for k, v in obj.items())
+    return len(str(obj))
+
+
+class RerunTimer:
+    """Times one page script run; wrap the page body in `with start_rerun(page):`
+
+    The run is recorded on the way out of the block, so runs that end in an
+    exception or st.stop() are counted too.
+    """
+
+    def __init__(self, page):
+        self.page = page
+        self.finished = False
+        session_id = _session_id()
+        if session_id:
+            REGISTRY.touch_session(session_id)
+        self.start = time.perf_counter()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.finish()
+        return False
+
+    def finish(self):
+        if self.finished:
+            return
+        self.finished = True
+        REGISTRY.observe('dashboard_rerun_seconds', time.perf_counter() - self.start, {'page': self.page})
+        publish()
+
+
+def start_rerun(page):
+    return RerunTimer(page)
+
+
+def record_rows(query, rows):
+    REGISTRY.observe('dashboard_rows_filtered', rows, {'query': query})
+
+
+def _session_id():
+    try:
+        from streamlit.runtime.scriptrunner import get_script_run_ctx
+        ctx = get_script_run_ctx()
+        return ctx.session_id if ctx else None
+    except ImportError:
+        return None
+
+
+# ===================
+# Exporters
+# ===================
+# DASHBOARD_METRICS_FILE: path rewritten with the Prometheus text after every rerun
+# DASHBOARD_METRICS_PORT: serve /metrics on 127.0.0.1:<port> from a daemon thread,
+# started when this module is first imported
+_server_lock = threading.Lock()
+_server = None
+_server_failed = False
+
+
+def publish():
+    path = os.environ.get('DASHBOARD_METRICS_FILE')
+    if path:
+        write_metrics(path)
+
+
+def write_metrics(path):
+    """Atomically write the current metrics to a textfile-collector style file"""
+    tmp = f"{path}.tmp"
+    with open(tmp, 'w') as f:
+        f.write(REGISTRY.render())
+    os.replace(tmp, path)
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split('?')[0] != '/metrics':
+            self.send_error(404)
+            return
+        body = REGISTRY.render().encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_metrics_server(port, host='127.0.0.1'):
+    """Start the /metrics endpoint once per process; later calls are no-ops
+
+    If the port is already taken (for example by another process sharing the
+    same environment) the error is logged once and the endpoint stays off.
+    Returns the server, or None when it could not start.
+    """
+    global _server, _server_failed
+    with _server_lock:
+        if _server is None and not _server_failed:
+            try:
+                _server = ThreadingHTTPServer((host, port), _MetricsHandler)
+            except OSError as e:
+                _server_failed = True
+                logger.warning("Metrics endpoint disabled: cannot listen on %s:%s (%s)", host, port, e)
+                return None
+            threading.Thread(target=_server.serve_forever, daemon=True).start()
+    return _server
+
+
+if os.environ.get('DASHBOARD_METRICS_PORT'):
+    start_metrics_server(int(os.environ['DASHBOARD_METRICS_PORT']))
@@ -0,0 +1,206 @@
+import re
+
+import numpy as np
+
+# Character shingles of normalized text, MinHash signatures and LSH banding.
+# With 8 bands of 8 rows, pairs above ~0.77 Jaccard similarity almost always
+# share a band; candidates are then checked against their signatures.
+SHINGLE_CHARS = 5
+NUM_PERM = 64
+BANDS = 8
+ROWS = NUM_PERM // BANDS
+SIMILARITY_THRESHOLD = 0.7
+BATCH_SIZE = 2_000
+SEED = 1
+
+_MAX_HASH = np.uint32(0xFFFFFFFF)
+_rng = np.random.RandomState(SEED)
+# Multiply-shift hashing: (a * x + b) >> 32 over 64-bit words, with odd a
+_A = _rng.randint(1, 2**62, size=NUM_PERM, dtype=np.int64).astype(np.uint64) * np.uint64(2) + np.uint64(1)
+_B = _rng.randint(0, 2**62, size=NUM_PERM, dtype=np.int64).astype(np.uint64)
+
+# Mentions, links and the dataset's <user>/<url> placeholders differ between
+# otherwise identical retweets, so they are dropped before shingling
+_NOISE = re.compile(r'<[^>\s]+>|@\w+|https?://\S+')
+_SPACES = re.compile(r'\s+')
+
+
+def normalize(text):
+    text = _NOISE.sub(' ', str(text).lower())
+    return _SPACES.sub(' ', text).strip()
+
+
+# ===================
+# Signatures
+# ===================
+def _fmix(h):
+    # 64-bit finalizer (MurmurHash3) so similar shingles get unrelated hashes
+    h ^= h >> np.uint64(33)
+    h *= np.uint64(0xFF51AFD7ED558CCD)
+    h ^= h >> np.uint64(33)
+    h *= np.uint64(0xC4CEB9FE1A85EC53)
+    h ^= h >> np.uint64(33)
+    return h
+
+
+def shingle_hashes(texts, k=SHINGLE_CHARS):
+    """32-bit hashes of every k-byte shingle in a batch, plus shingles per text
+
+    Texts shorter than k contribute one shingle (the whole text); empty texts
+    contribute none. All texts are hashed together in one pass over the bytes.
+    """
+    encoded = [normalize(t).encode('utf-8') for t in texts]
+    lengths = np.fromiter((len(b) for b in encoded), dtype=np.int64, count=len(encoded))
+    buf = np.frombuffer(b''.join(encoded) + b'\0' * k, dtype=np.uint8).astype(np.uint64)
+    starts = np.cumsum(lengths) - lengths
+
+    counts = np.where(lengths >= k, lengths - k + 1, (lengths > 0).astype(np.int64))
+    total = int(counts.sum())
+    offsets = np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts)
+    positions = np.repeat(starts, counts) + offsets
+    widths = np.repeat(np.minimum(lengths, k), counts)
+
+    h = np.zeros(total, dtype=np.uint64)
+    for j in range(k):
+        byte = np.where(widths > j, buf[positions + j], np.uint64(0))
+        h = h * np.uint64(1_000_003) + byte
+    return _fmix(h) >> np.uint64(32), counts
+
+
+def minhash(texts):
+    """(len(texts), NUM_PERM) uint32 MinHash signatures; empty texts get all-max rows"""
+    hashes, counts = shingle_hashes(texts)
+    signatures = np.full((len(texts), NUM_PERM), _MAX_HASH, dtype=np.uint32)
+    nonempty = counts > 0
+    if not nonempty.any():
+        return signatures
+    segment_starts = (np.cumsum(counts) - counts)[nonempty]
+    rows = np.flatnonzero(nonempty)
+    for p in range(NUM_PERM):
+        # One contiguous pass per permutation is faster than 2D blocks here
+        permuted = (hashes * _A[p] + _B[p]) >> np.uint64(32)
+        signatures[rows, p] = np.minimum.reduceat(permuted, segment_starts)
+    return signatures
+
+
+def band_keys(signatures):
+    """(n, BANDS) uint64 hash of each band of ROWS signature values"""
+    keys = np.zeros((len(signatures), BANDS), dtype=np.uint64)
+    for band in range(BANDS):
+        h = np.full(len(signatures), np.uint64(band), dtype=np.uint64)
+        for col in signatures[:, band * ROWS:(band + 1) * ROWS].T:
+            h = _fmix(h * np.uint64(0x100000001B3) + col.astype(np.uint64))
+        keys[:, band] = h
+    return keys
+
+
+# ===================
+# Index
+# ===================
+class NearDuplicateIndex:
+    """MinHash/LSH index over one corpus with precomputed near-duplicate clusters
+
+    Building is linear in the corpus: signatures are computed in batches, each
+    LSH band is sorted once, and every bucket links its members to the bucket's
+    first post instead of comparing all pairs.
+    """
+
+    def __init__(self, post_ids, signatures):
+        self.post_ids = np.asarray(post_ids, dtype=object)
+        self.signatures = signatures
+        self.positions = {post_id: i for i, post_id in enumerate(self.post_ids)}
+        self.valid = (signatures != _MAX_HASH).any(axis=1)
+        keys = band_keys(signatures)
+        # Per band: post positions sorted by bucket key, and the sorted keys
+        self.band_order = []
+        self.band_sorted = []
+        for band in range(BANDS):
+            order = np.flatnonzero(self.valid)
+            order = order[np.argsort(keys[order, band], kind='stable')]
+            self.band_order.append(order)
+            self.band_sorted.append(keys[order, band])
+        self.cluster = self._cluster()
+
+    @classmethod
+    def build(cls, batches):
+        """Index from an iterable of (post_ids, texts) batches"""
+        ids, signatures = [], []
+        for post_ids, texts in batches:
+            ids.extend(post_ids)
+            signatures.append(minhash(list(texts)))
+        if not signatures:
+            return cls([], np.zeros((0, NUM_PERM), dtype=np.uint32))
+        return cls(ids, np.vstack(signatures))
+
+    @property
+    def nbytes(self):
+        return (self.signatures.nbytes + self.cluster.nbytes
+                + sum(o.nbytes + k.nbytes for o, k in zip(self.band_order, self.band_sorted))
+                + 100 * len(self.post_ids))
+
+    def similarity(self, i, others):
+        """Estimated Jaccard similarity between post i and an array of positions"""
+        return (self.signatures[others] == self.signatures[i]).mean(axis=1)
+
+    def _candidate_pairs(self):
+        left, right = [], []
+        for order, keys in zip(self.band_order, self.band_sorted):
+            if len(keys) < 2:
+                continue
+            same = keys[1:] == keys[:-1]
+            # Position (in sorted order) of the first member of each element's bucket
+            run_start = np.maximum.accumulate(np.where(np.r_[True, ~same], np.arange(len(keys)), 0))
+            members = np.flatnonzero(np.r_[False, same])
+            left.append(order[run_start[members]])
+            right.append(order[members])
+        if not left:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+        n = len(self.post_ids)
+        pairs = np.unique(np.concatenate(left) * n + np.concatenate(right))
+        return pairs // n, pairs % n
+
+    def _cluster(self):
+        """Connected components of the verified candidate pairs, labelled by lowest position"""
+        labels = np.arange(len(self.post_ids))
+        left, right = self._candidate_pairs()
+        if len(left):
+            similar = (self.signatures[left] == self.signatures[right]).mean(axis=1) >= SIMILARITY_THRESHOLD
+            left, right = left[similar], right[similar]
+        # Vectorized label propagation with pointer jumping instead of a Python
+        # union-find loop; converges in a few passes for bucket-star edges
+        while len(left):
+            low = np.minimum(labels[left], labels[right])
+            updated = labels.copy()
+            np.minimum.at(updated, left, low)
+            np.minimum.at(updated, right, low)
+            updated = updated[updated]
+            if np.array_equal(updated, labels):
+                break
+            labels = updated
+        return labels
+
+    def similar(self, post_id, top_k=5, min_similarity=0.5):
+        """[(post_id, similarity)] for posts sharing an LSH bucket with post_id"""
+        i = self.positions.get(post_id)
+        if i is None or not self.valid[i]:
+            return []
+        candidates = set()
+        key_row = band_keys(self.signatures[i:i + 1])[0]
+        for band, (order, keys) in enumerate(zip(self.band_order, self.band_sorted)):
+            lo, hi = np.searchsorted(keys, key_row[band], 'left'), np.searchsorted(keys, key_row[band], 'right')
+            candidates.update(order[lo:hi].tolist())
+        candidates.discard(i)
+        if not candidates:
+            return []
+        others = np.fromiter(candidates, dtype=np.int64)
+        scores = self.similarity(i, others)
+        keep = scores >= min_similarity
+        others, scores = others[keep], scores[keep]
+        best = np.argsort(-scores, kind='stable')[:top_k]
+        return [(self.post_ids[j], float(s)) for j, s in zip(others[best], scores[best])]
+
+    def clusters(self, min_size=2):
+        """(post_id, cluster) for every post in a cluster of at least min_size"""
+        sizes = np.bincount(self.cluster, minlength=len(self.cluster))
+        members = np.flatnonzero(sizes[self.cluster] >= min_size)
+        return self.post_ids[members], self.cluster[members]
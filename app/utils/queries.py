@@ -0,0 +1,286 @@
+import numpy as np
+import pandas as pd
+
+from utils import sql_backend
+from utils.cache import DATA_DIR, derived
+from utils.data_loader import MANAGER, current_snapshot
+from utils.near_duplicates import BATCH_SIZE, NearDuplicateIndex
+from pipeline import drift, impact
+
+ANNOTATIONS_FILE = DATA_DIR / 'annotations.csv'
+DRIFT_WINDOW = drift.WINDOW
+
+# Derived results shared across pages and sessions. Each one is computed from a
+# single snapshot and cached under that snapshot's version; filter selections are
+# passed as tuples so they can be part of the cache key.
+#
+# Filters are (agreement_types, majority_labels, rca_categories); None in any
+# position leaves that column unconstrained. With the sqlite backend every query
+# below is pushed down to SQLite and only result-sized frames come back.
+DEFAULT_AGREEMENT = ('None', 'Partial')
+DEFAULT_LABELS = ('hatespeech', 'normal', 'offensive')
+NO_FILTERS = (None, None, None)
+
+
+def filter_key(*selections):
+    """Order-independent cache key for a set of multiselect values"""
+    return tuple(None if values is None else tuple(sorted(values)) for values in selections)
+
+
+@derived('filter_mask')
+def _filter_positions(snapshot, filters):
+    df = snapshot.table('disagreements')
+    mask = np.ones(len(df), dtype=bool)
+    for column, values in zip(sql_backend.FILTER_COLUMNS, filters):
+        if values is not None:
+            mask &= df[column].isin(values).to_numpy()
+    return np.flatnonzero(mask)
+
+
+@derived('search')
+def _search_positions(snapshot, filters, search_term):
+    positions = _filter_positions(snapshot, filters)
+    if not search_term:
+        return positions
+    text = snapshot.table('disagreements')['text'].iloc[positions]
+    hits = text.str.contains(search_term, case=False, na=False, regex=False).to_numpy()
+    return positions[hits]
+
+
+@derived('count')
+def _count_rows(snapshot, filters, search_term):
+    if snapshot.db_path:
+        return sql_backend.count_rows(snapshot.db_path, 'disagreements', filters, search_term)
+    return len(_search_positions(snapshot, filters, search_term))
+
+
+def count_rows(filters=NO_FILTERS, search_term='', snapshot=None):
+    """Number of disagreement rows matching the filters and text search"""
+    return _count_rows(snapshot or current_snapshot(), filter_key(*filters), search_term)
+
+
+@derived('rows')
+def _select_rows(snapshot, filters, search_term, limit, offset):
+    if snapshot.db_path:
+        return sql_backend.select_rows(snapshot.db_path, 'disagreements', filters, search_term, limit, offset)
+    positions = _search_positions(snapshot, filters, search_term)[offset:offset + limit]
+    return snapshot.table('disagreements').iloc[positions]
+
+
+def select_rows(filters=NO_FILTERS, search_term='', limit=100, offset=0, snapshot=None):
+    """One page of disagreement rows, in file order"""
+    return _select_rows(snapshot or current_snapshot(), filter_key(*filters), search_term, limit, offset)
+
+
+def iter_rows(filters=NO_FILTERS, search_term='', chunk_rows=sql_backend.CSV_CHUNK_ROWS, snapshot=None):
+    """Every matching disagreement row, as frames of chunk_rows rows in file order
+
+    For exports and streaming; unlike select_rows the pages are not cached.
+    """
+    snapshot = snapshot or current_snapshot()
+    filters = filter_key(*filters)
+    if snapshot.db_path:
+        yield from sql_backend.iter_rows(snapshot.db_path, 'disagreements', filters, search_term, chunk_rows)
+        return
+    positions = _search_positions(snapshot, filters, search_term)
+    df = snapshot.table('disagreements')
+    for start in range(0, len(positions), chunk_rows):
+        yield df.iloc[positions[start:start + chunk_rows]]
+
+
+def get_post(post_id, snapshot=None):
+    """Single disagreement row by post_id, or None"""
+    snapshot = snapshot or current_snapshot()
+    if snapshot.db_path:
+        return sql_backend.get_row(snapshot.db_path, 'disagreements', post_id)
+    position = snapshot.post_positions.get(post_id)
+    return None if position is None else snapshot.table('disagreements').iloc[position]
+
+
+def get_posts(post_ids, snapshot=None):
+    """Disagreement rows for several post_ids, in the order given"""
+    snapshot = snapshot or current_snapshot()
+    post_ids = list(post_ids)
+    if snapshot.db_path:
+        rows = sql_backend.get_rows(snapshot.db_path, 'disagreements', post_ids)
+        if len(rows) == 0:
+            return rows
+        return rows.set_index('post_id').reindex(post_ids).dropna(how='all').reset_index()
+    positions = snapshot.post_positions.reindex(post_ids).dropna().astype(int)
+    return snapshot.table('disagreements').iloc[positions.to_numpy()].reset_index(drop=True)
+
+
+@derived('value_counts')
+def _value_counts(snapshot, table, column, filters, search_term):
+    if snapshot.db_path and table in sql_backend.SQL_TABLES:
+        return sql_backend.value_counts(snapshot.db_path, table, column, filters, search_term)
+    if filters == NO_FILTERS and not search_term:
+        values = snapshot.table(table)[column]
+    else:
+        values = snapshot.table(table)[column].iloc[_search_positions(snapshot, filters, search_term)]
+    counts = values.value_counts().reset_index()
+    counts.columns = [column, 'count']
+    return counts
+
+
+def value_counts(table, column, snapshot=None, filters=NO_FILTERS, search_term=''):
+    """value_counts() of one column as a two-column frame, cached per data version
+
+    filters and search_term apply to the disagreements table only.
+    """
+    return _value_counts(snapshot or current_snapshot(), table, column, filter_key(*filters), search_term)
+
+
+@derived('label_combos')
+def _label_combo_counts(snapshot, filters, top_n):
+    if snapshot.db_path:
+        return sql_backend.label_combo_counts(snapshot.db_path, filters, top_n)
+    df = snapshot.table('disagreements').iloc[_filter_positions(snapshot, filters)]
+    combos = df['label_1'] + ' vs ' + df['label_2'] + ' vs ' + df['label_3']
+    counts = combos.value_counts().head(top_n).reset_index()
+    counts.columns = ['Label Combination', 'Count']
+    return counts
+
+
+def label_combo_counts(agreement_types, majority_labels, rca_categories, top_n=10, snapshot=None):
+    """Most frequent 'l1 vs l2 vs l3' label patterns among the filtered rows"""
+    key = filter_key(agreement_types, majority_labels, rca_categories)
+    return _label_combo_counts(snapshot or current_snapshot(), key, top_n)
+
+
+def table_csv(table, snapshot=None):
+    """Full table serialized as CSV for download buttons
+
+    Not cached: it is as large as the table, so pages build it only on request.
+    """
+    snapshot = snapshot or current_snapshot()
+    if snapshot.db_path and table in sql_backend.SQL_TABLES:
+        return sql_backend.table_csv(snapshot.db_path, table)
+    return snapshot.table(table).to_csv(index=False)
+
+
+@derived('drift')
+def _drift(snapshot):
+    # annotations.csv is part of the data version, so a new file means a new snapshot
+    if not ANNOTATIONS_FILE.exists():
+        return None
+    annotations = pd.read_csv(ANNOTATIONS_FILE)
+    return drift.detect(annotations) + (drift.time_basis(annotations),)
+
+
+@derived('drift_annotator')
+def _annotator_drift(snapshot, annotator_id):
+    result = _drift(snapshot)
+    if result is None:
+        return None
+    timeline, change_points, basis = result
+    return (timeline[timeline['annotator_id'] == annotator_id].reset_index(drop=True),
+            change_points[change_points['annotator_id'] == annotator_id].reset_index(drop=True),
+            basis)
+
+
+def annotator_drift(annotator_id, snapshot=None):
+    """(timeline, change_points, time basis) for one annotator, or None without annotations.csv
+
+    The time basis is 'annotation' or 'post', see pipeline.drift.time_basis.
+    """
+    return _annotator_drift(snapshot or current_snapshot(), annotator_id)
+
+
+@derived('annotator_impact')
+def _annotator_impact(snapshot, weight):
+    if not ANNOTATIONS_FILE.exists():
+        return None
+    annotations = pd.read_csv(ANNOTATIONS_FILE, usecols=['post_id', 'annotator_id', 'label'])
+    return impact.leave_one_out(annotations, weight)
+
+
+def annotator_impact(weight=0.0, snapshot=None):
+    """(baseline, impact) of removing or down-weighting each annotator, or None without annotations.csv
+
+    weight is the share of each annotator's labels that is kept; see pipeline.impact.
+    """
+    return _annotator_impact(snapshot or current_snapshot(), float(weight))
+
+
+def _text_batches(snapshot):
+    if snapshot.db_path:
+        for chunk in sql_backend.iter_columns(snapshot.db_path, 'disagreements', ['post_id', 'text'], BATCH_SIZE):
+            yield chunk['post_id'].tolist(), chunk['text']
+        return
+    df = snapshot.table('disagreements')
+    for start in range(0, len(df), BATCH_SIZE):
+        batch = df.iloc[start:start + BATCH_SIZE]
+        yield batch['post_id'].tolist(), batch['text']
+
+
+@derived('near_duplicate_index')
+def _near_duplicate_index(snapshot):
+    return NearDuplicateIndex.build(_text_batches(snapshot))
+
+
+def similar_posts(post_id, top_k=5, snapshot=None):
+    """Near-duplicate disagreement rows for post_id, most similar first"""
+    snapshot = snapshot or current_snapshot()
+    matches = _near_duplicate_index(snapshot).similar(post_id, top_k)
+    if not matches:
+        return None
+    rows = get_posts([post_id for post_id, _ in matches], snapshot)
+    similarity = dict(matches)
+    return rows.assign(similarity=rows['post_id'].map(similarity))
+
+
+@derived('conflicting_duplicates')
+def _conflicting_duplicates(snapshot):
+    post_ids, clusters = _near_duplicate_index(snapshot).clusters()
+    columns = ['post_id', 'text', 'label_1', 'label_2', 'label_3', 'majority_label']
+    members = get_posts(post_ids, snapshot)[columns].assign(cluster=clusters)
+    # Order-free label triple, e.g. 'hatespeech/normal/offensive'
+    members['labels'] = ['/'.join(sorted(t)) for t in zip(members['label_1'], members['label_2'], members['label_3'])]
+    summary = members.groupby('cluster').agg(
+        posts=('post_id', 'size'),
+        label_patterns=('labels', 'nunique'),
+        labels=('labels', lambda s: ' | '.join(sorted(set(s)))),
+        majority_labels=('majority_label', lambda s: ', '.join(sorted(set(s)))),
+        example=('text', 'first'),
+    )
+    conflicts = summary[summary['label_patterns'] > 1].sort_values(
+        ['posts', 'label_patterns'], ascending=False, kind='stable'
+    ).reset_index()
+    return conflicts, members[members['cluster'].isin(conflicts['cluster'])].reset_index(drop=True)
+
+
+def conflicting_duplicates(snapshot=None):
+    """Near-duplicate clusters whose posts got different label triples
+
+    Returns (clusters, members): one summary row per cluster, and its posts.
+    """
+    return _conflicting_duplicates(snapshot or current_snapshot())
+
+
+def warm(snapshot):
+    """Precompute what every first page view needs before a snapshot is swapped in"""
+    # approx imports this module, so it is only imported once both are loaded
+    from utils import approx
+
+    for table, column in [('posts', 'agreement_type'), ('posts', 'majority_label'),
+                          ('annotators', 'bias_category'), ('disagreements', 'rca_category')]:
+        if not snapshot.has_table(table):
+            continue
+        if column in approx.STRATA and approx.active(table, snapshot):
+            # Pages read these from the stratum counts built by approx.warm
+            continue
+        _value_counts(snapshot, table, column, NO_FILTERS, '')
+    # Replaying the annotation stream and indexing texts are the slowest derived
+    # results; build them off the request path
+    _drift(snapshot)
+    _annotator_impact(snapshot, 0.0)
+    if snapshot.has_table('disagreements'):
+        _conflicting_duplicates(snapshot)
+    if not snapshot.has_table('disagreements'):
+        return
+    rca_options = approx.value_counts('disagreements', 'rca_category', snapshot).value['rca_category']
+    _label_combo_counts(snapshot, filter_key(DEFAULT_AGREEMENT, DEFAULT_LABELS, rca_options), 10)
+
+
+MANAGER.warmers.append(warm)
@@ -0,0 +1,198 @@
+import os
+import threading
+import time
+import weakref
+from pathlib import Path
+
+import pandas as pd
+
+from utils.cache import DATA_DIR, SHARED_CACHE, data_version
+from utils.metrics import REGISTRY, object_size
+from utils import sql_backend
+
+TABLE_FILES = {
+    'posts': 'posts_analysis.csv',
+    'annotators': 'annotators_analysis.csv',
+    'summary': 'summary_metrics.csv',
+    'disagreements': 'disagreement_samples.csv',
+}
+
+# 'pandas' keeps every table in memory; 'sqlite' keeps posts and disagreements in
+# an on-disk SQLite file and pushes filters, search and aggregates down to it
+QUERY_BACKEND = os.environ.get('DASHBOARD_QUERY_BACKEND', 'pandas')
+
+REGISTRY.describe('dashboard_snapshot_builds_total', 'counter', 'Snapshot builds by outcome')
+REGISTRY.describe('dashboard_snapshot_build_seconds', 'summary', 'Time to parse and index a full snapshot')
+REGISTRY.describe('dashboard_snapshot_built_timestamp', 'gauge', 'Unix time the served snapshot was built')
+
+
+def read_table(path):
+    # 'None' (agreement_type, target_groups) and 'N/A' (rca_category) are real
+    # values in these files, not missing data
+    return pd.read_csv(path, keep_default_na=False, na_values=[''])
+
+
+def summary_dict(df):
+    # Convert to dictionary for easy access
+    return dict(zip(df['metric'], df['value']))
+
+
+class Snapshot:
+    """Immutable set of tables and indexes built from one data version
+
+    Pages grab one snapshot per rerun and read everything from it, so a swap
+    mid-rerun never mixes tables from two versions.
+    """
+
+    def __init__(self, version, tables, built_at, db_path=None):
+        self.version = version
+        self.tables = tables
+        self.built_at = built_at
+        # SQLite file holding the large tables when the sqlite backend is on. It
+        # stays on disk while this snapshot is alive; the finalizer lets it be
+        # pruned once the snapshot is swapped out and no rerun still reads it.
+        self.db_path = db_path
+        if db_path:
+            sql_backend.acquire_database(db_path)
+            weakref.finalize(self, sql_backend.release_database, db_path)
+        disagreements = tables.get('disagreements')
+        # post_id -> row position for single-sample lookups
+        self.post_positions = (
+            pd.Series(range(len(disagreements)), index=disagreements['post_id'])
+            if disagreements is not None else None
+        )
+
+    def has_table(self, name):
+        if name in self.tables:
+            return True
+        return bool(self.db_path) and sql_backend.has_table(self.db_path, name)
+
+    def table(self, name):
+        if name not in self.tables:
+            raise FileNotFoundError(f"{TABLE_FILES[name]} is not available in {DATA_DIR}")
+        return self.tables[name]
+
+    @property
+    def summary(self):
+        return summary_dict(self.table('summary'))
+
+
+def build_snapshot(data_dir=DATA_DIR, backend=None):
+    """Parse every table in data_dir; missing files are skipped"""
+    backend = backend or QUERY_BACKEND
+    version = data_version(data_dir)
+    tables = {}
+    for name, filename in TABLE_FILES.items():
+        path = Path(data_dir) / filename
+        if not path.exists() or (backend == 'sqlite' and name in sql_backend.SQL_TABLES):
+            continue
+        start = time.perf_counter()
+        tables[name] = read_table(path)
+        REGISTRY.observe('dashboard_cache_load_seconds', time.perf_counter() - start, {'loader': f'load_{name}'})
+        REGISTRY.set('dashboard_cache_object_bytes', object_size(tables[name]), {'loader': f'load_{name}'})
+    db_path = sql_backend.build_database(data_dir, version) if backend == 'sqlite' else None
+    return Snapshot(version, tables, time.time(), db_path)
+
+
+class SnapshotManager:
+    """Serves the current Snapshot and rebuilds it in the background on data changes
+
+    A watcher thread polls the data directory. When the version changes and stays
+    stable for one poll (so half-written files are not picked up), a new snapshot
+    is built and warmed off the request path, then swapped in with a single
+    reference assignment. Readers holding the old snapshot keep using it until
+    their rerun ends; once nothing references it, it is garbage collected.
+
+    The first snapshot has nothing to replace, so it is served as soon as it is
+    parsed and the watcher thread warms it afterwards; until then pages compute
+    what they need lazily.
+    """
+
+    def __init__(self, data_dir=DATA_DIR, poll_seconds=5.0):
+        self.data_dir = data_dir
+        self.poll_seconds = poll_seconds
+        self.warmers = []
+        self._current = None
+        self._lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def ready(self):
+        return self._current is not None
+
+    def current(self):
+        snapshot = self._current
+        if snapshot is not None:
+            return snapshot
+        # Nothing to serve yet: the very first caller builds synchronously,
+        # without the warmers
+        with self._lock:
+            if self._current is None:
+                self._swap(self._build(warm=False))
+            return self._current
+
+    def start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._watch, name='snapshot-watcher', daemon=True)
+                self._thread.start()
+        return self
+
+    def refresh(self):
+        """Build and swap in a new snapshot now; returns the new version"""
+        snapshot = self._build()
+        with self._lock:
+            self._swap(snapshot)
+        return snapshot.version
+
+    def _build(self, warm=True):
+        start = time.perf_counter()
+        try:
+            snapshot = build_snapshot(self.data_dir)
+            if warm:
+                self._warm(snapshot)
+        except Exception:
+            REGISTRY.inc('dashboard_snapshot_builds_total', {'result': 'error'})
+            raise
+        REGISTRY.inc('dashboard_snapshot_builds_total', {'result': 'ok'})
+        REGISTRY.observe('dashboard_snapshot_build_seconds', time.perf_counter() - start)
+        return snapshot
+
+    def _warm(self, snapshot):
+        for warm in self.warmers:
+            warm(snapshot)
+
+    def _swap(self, snapshot):
+        self._current = snapshot
+        REGISTRY.set('dashboard_snapshot_built_timestamp', snapshot.built_at)
+        SHARED_CACHE.drop_versions_except(snapshot.version)
+
+    def _watch(self):
+        try:
+            # Initial build happens here, so the landing page never waits on it.
+            # It is served unwarmed (see current()); warm it now, off the request path.
+            self._warm(self.current())
+        except Exception:
+            pass
+        pending = None
+        while True:
+            time.sleep(self.poll_seconds)
+            try:
+                version = data_version(self.data_dir)
+                current = self._current
+                if current is None or version == current.version:
+                    pending = None
+                    continue
+                if version != pending:
+                    # Wait one more poll in case files are still being written
+                    pending = version
+                    continue
+                snapshot = self._build()
+                if snapshot.version != data_version(self.data_dir):
+                    continue
+                with self._lock:
+                    self._swap(snapshot)
+                pending = None
+            except Exception:
+                # Keep serving the old snapshot; try again on the next poll
+                pending = None
@@ -0,0 +1,257 @@
+import os
+import sqlite3
+import threading
+import uuid
+from collections import Counter
+from contextlib import closing
+from pathlib import Path
+
+import pandas as pd
+
+# Tables that live in SQLite instead of memory when the sqlite backend is on.
+# The small annotator and summary tables always stay in the snapshot.
+SQL_TABLES = {
+    'posts': 'posts_analysis.csv',
+    'disagreements': 'disagreement_samples.csv',
+}
+FILTER_COLUMNS = ('agreement_type', 'majority_label', 'rca_category')
+CSV_CHUNK_ROWS = 50_000
+# Newest database files always kept, so another process (the API server, a
+# second dashboard) that is one data version behind can still open its file
+KEEP_DATABASES = 2
+
+
+# ===================
+# Build
+# ===================
+def build_database(data_dir, version):
+    """Load the large CSVs into data/.cache/dashboard-<version>.sqlite
+
+    Rows are streamed in chunks, so building never holds a whole table in memory.
+    The file is written under a name unique to this build and renamed when
+    complete. Older databases are not touched here: snapshots still being served
+    open a connection per query, so files are only removed by release_database()
+    once no snapshot uses them.
+    """
+    cache_dir = Path(data_dir) / '.cache'
+    cache_dir.mkdir(exist_ok=True)
+    db_path = cache_dir / f'dashboard-{version}.sqlite'
+    if db_path.exists():
+        return db_path
+
+    # Unique per build, so two processes building the same version never share it
+    tmp_path = cache_dir / f'dashboard-{version}.{os.getpid()}-{uuid.uuid4().hex[:8]}.building'
+    with closing(sqlite3.connect(tmp_path)) as conn:
+        for table, filename in SQL_TABLES.items():
+            path = Path(data_dir) / filename
+            if not path.exists():
+                continue
+            chunks = pd.read_csv(path, keep_default_na=False, na_values=[''], chunksize=CSV_CHUNK_ROWS)
+            for chunk in chunks:
+                chunk.to_sql(table, conn, if_exists='append', index=False)
+            for column in FILTER_COLUMNS:
+                conn.execute(f'CREATE INDEX idx_{table}_{column} ON {table} ({column})')
+            conn.execute(f'CREATE INDEX idx_{table}_filters ON {table} ({", ".join(FILTER_COLUMNS)})')
+            conn.execute(f'CREATE INDEX idx_{table}_post_id ON {table} (post_id)')
+            if _has_trigram(conn):
+                conn.execute(f"CREATE VIRTUAL TABLE {table}_fts USING fts5("
+                             f"text, content='{table}', content_rowid='rowid', tokenize='trigram')")
+                conn.execute(f"INSERT INTO {table}_fts({table}_fts) VALUES ('rebuild')")
+        conn.commit()
+    if db_path.exists():
+        # Another process finished the same version first
+        tmp_path.unlink()
+    else:
+        os.replace(tmp_path, db_path)
+    return db_path
+
+
+_db_lock = threading.Lock()
+_db_users = Counter()
+
+
+def acquire_database(db_path):
+    """Mark a database file as used by one more snapshot of this process"""
+    with _db_lock:
+        _db_users[Path(db_path)] += 1
+
+
+def release_database(db_path):
+    """Drop one snapshot's claim on a database file and prune unused old files
+
+    Called when a Snapshot is garbage collected, i.e. after it was swapped out
+    and the last rerun reading it has finished.
+    """
+    db_path = Path(db_path)
+    with _db_lock:
+        _db_users[db_path] -= 1
+        if _db_users[db_path] <= 0:
+            del _db_users[db_path]
+        prune_databases(db_path.parent)
+
+
+def prune_databases(cache_dir):
+    """Remove database files no snapshot of this process uses, except the newest KEEP_DATABASES"""
+    def mtime(path):
+        try:
+            return path.stat().st_mtime
+        except OSError:
+            return 0.0
+
+    files = sorted(Path(cache_dir).glob('dashboard-*.sqlite'), key=mtime, reverse=True)
+    for old in files[KEEP_DATABASES:]:
+        if _db_users.get(old):
+            continue
+        try:
+            old.unlink()
+        except OSError:
+            # Already gone, or still open elsewhere (Windows); retried on the next release
+            pass
+
+
+def _has_trigram(conn):
+    try:
+        conn.execute("CREATE VIRTUAL TABLE temp._probe USING fts5(x, tokenize='trigram')")
+        conn.execute("DROP TABLE temp._probe")
+        return True
+    except sqlite3.OperationalError:
+        return False
+
+
+# ===================
+# Queries
+# ===================
+def connect(db_path):
+    return sqlite3.connect(f'file:{db_path}?mode=ro', uri=True, check_same_thread=False)
+
+
+def where_clause(table, filters, search_term, conn):
+    """WHERE clause and parameters for sidebar filters plus a text search
+
+    filters holds one tuple of allowed values per FILTER_COLUMNS entry, or None
+    to leave that column unconstrained.
+    """
+    clauses, params = [], []
+    for column, values in zip(FILTER_COLUMNS, filters or ()):
+        if values is None:
+            continue
+        if not values:
+            clauses.append('0')
+            continue
+        clauses.append(f"{column} IN ({', '.join('?' * len(values))})")
+        params.extend(values)
+    if search_term:
+        if len(search_term) >= 3 and _table_exists(conn, f'{table}_fts'):
+            clauses.append(f'rowid IN (SELECT rowid FROM {table}_fts WHERE {table}_fts MATCH ?)')
+            params.append('"' + search_term.replace('"', '""') + '"')
+        else:
+            clauses.append("text LIKE ? ESCAPE '\\'")
+            escaped = search_term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+            params.append(f'%{escaped}%')
+    sql = ' WHERE ' + ' AND '.join(clauses) if clauses else ''
+    return sql, params
+
+
+def has_table(db_path, name):
+    with closing(connect(db_path)) as conn:
+        return _table_exists(conn, name)
+
+
+def _table_exists(conn, name):
+    row = conn.execute("SELECT 1 FROM sqlite_master WHERE name = ?", (name,)).fetchone()
+    return row is not None
+
+
+def count_rows(db_path, table, filters=None, search_term=''):
+    with closing(connect(db_path)) as conn:
+        where, params = where_clause(table, filters, search_term, conn)
+        return conn.execute(f'SELECT COUNT(*) FROM {table}{where}', params).fetchone()[0]
+
+
+def value_counts(db_path, table, column, filters=None, search_term=''):
+    with closing(connect(db_path)) as conn:
+        where, params = where_clause(table, filters, search_term, conn)
+        sql = (f'SELECT {column}, COUNT(*) AS count FROM {table}{where} '
+               f'GROUP BY {column} ORDER BY count DESC')
+        return pd.read_sql_query(sql, conn, params=params)
+
+
+def label_combo_counts(db_path, filters, top_n):
+    with closing(connect(db_path)) as conn:
+        where, params = where_clause('disagreements', filters, '', conn)
+        sql = ("SELECT label_1 || ' vs ' || label_2 || ' vs ' || label_3 AS \"Label Combination\", "
+               f'COUNT(*) AS "Count" FROM disagreements{where} '
+               'GROUP BY 1 ORDER BY 2 DESC LIMIT ?')
+        return pd.read_sql_query(sql, conn, params=params + [top_n])
+
+
+def strata_counts(db_path, table, columns):
+    """Row count per combination of columns (uses the covering filter index)"""
+    with closing(connect(db_path)) as conn:
+        sql = f"SELECT {', '.join(columns)}, COUNT(*) AS rows FROM {table} GROUP BY {', '.join(columns)}"
+        return pd.read_sql_query(sql, conn)
+
+
+def sample_strata(db_path, table, columns, strata, rates):
+    """Bernoulli sample of each stratum: rows of strata[i] kept with probability rates[i]
+
+    strata holds one tuple of column values per stratum. Returns the sampled rows
+    with a _stratum column holding the stratum's position.
+    """
+    frames = []
+    # IS rather than = so a NULL stratum value still matches its rows
+    where = ' AND '.join(f'{column} IS ?' for column in columns)
+    with closing(connect(db_path)) as conn:
+        for i, (values, rate) in enumerate(zip(strata, rates)):
+            sql, params = f'SELECT * FROM {table} WHERE {where}', list(values)
+            if rate < 1:
+                sql += ' AND abs(random() % 1000000) < ?'
+                params.append(int(rate * 1_000_000))
+            frames.append(pd.read_sql_query(sql, conn, params=params).assign(_stratum=i))
+    return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+
+
+def select_rows(db_path, table, filters=None, search_term='', limit=100, offset=0):
+    with closing(connect(db_path)) as conn:
+        where, params = where_clause(table, filters, search_term, conn)
+        sql = f'SELECT * FROM {table}{where} ORDER BY rowid LIMIT ? OFFSET ?'
+        return pd.read_sql_query(sql, conn, params=params + [limit, offset])
+
+
+def iter_rows(db_path, table, filters=None, search_term='', chunk_rows=CSV_CHUNK_ROWS):
+    """Yield every matching row in table order as frames of chunk_rows rows"""
+    with closing(connect(db_path)) as conn:
+        where, params = where_clause(table, filters, search_term, conn)
+        sql = f'SELECT * FROM {table}{where} ORDER BY rowid'
+        yield from pd.read_sql_query(sql, conn, params=params, chunksize=chunk_rows)
+
+
+def get_rows(db_path, table, post_ids, chunk=900):
+    post_ids = list(post_ids)
+    frames = []
+    with closing(connect(db_path)) as conn:
+        # Stay under SQLite's bound-parameter limit
+        for start in range(0, len(post_ids), chunk):
+            ids = post_ids[start:start + chunk]
+            sql = f"SELECT * FROM {table} WHERE post_id IN ({', '.join('?' * len(ids))})"
+            frames.append(pd.read_sql_query(sql, conn, params=ids))
+    return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+
+
+def iter_columns(db_path, table, columns, chunk_rows=CSV_CHUNK_ROWS):
+    """Yield frames of the given columns in table order, chunk_rows at a time"""
+    with closing(connect(db_path)) as conn:
+        sql = f"SELECT {', '.join(columns)} FROM {table} ORDER BY rowid"
+        yield from pd.read_sql_query(sql, conn, chunksize=chunk_rows)
+
+
+def get_row(db_path, table, post_id):
+    with closing(connect(db_path)) as conn:
+        df = pd.read_sql_query(f'SELECT * FROM {table} WHERE post_id = ? LIMIT 1', conn, params=[post_id])
+    return df.iloc[0] if len(df) else None
+
+
+def table_csv(db_path, table):
+    with closing(connect(db_path)) as conn:
+        chunks = pd.read_sql_query(f'SELECT * FROM {table} ORDER BY rowid', conn, chunksize=CSV_CHUNK_ROWS)
+        return ''.join(chunk.to_csv(index=False, header=i == 0) for i, chunk in enumerate(chunks))
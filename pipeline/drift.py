@@ -0,0 +1,267 @@
+"""Online per-annotator drift detection over a time-ordered annotation stream.
+
+annotators_analysis.csv holds all-time averages, so an annotator who turned
+harsh last week looks the same as one who has always been balanced. The
+DriftEngine keeps per-annotator state and updates it in O(1) per annotation:
+
+- exponentially weighted label mix, strictness and agreement with the majority
+- the same statistics over a fixed window of the annotator's last labels,
+  kept as running sums over a ring buffer
+- two-sided Page-Hinkley change detectors on strictness and on agreement
+
+Strictness per label is +100 for hatespeech, -100 for normal and 0 for
+offensive, so its average equals strictness_score (% hatespeech - % normal).
+
+Events are (ts, annotator_id, label, majority_label) in time order. For
+annotations.csv the time is the `annotated_at` column when a feed supplies it,
+otherwise the post time encoded in Twitter post ids. Gab ids carry no time, so
+those rows are left out of the ordered stream. time_basis() says which one was
+used: with post times the stream shows how an annotator labelled older versus
+newer posts, not how their behaviour changed while annotating.
+
+Usage:
+    python -m pipeline.drift data/annotations.csv
+"""
+import argparse
+from collections import deque
+from pathlib import Path
+
+import pandas as pd
+
+STRICTNESS = {'normal': -100.0, 'offensive': 0.0, 'hatespeech': 100.0}
+
+EWMA_ALPHA = 0.05
+WINDOW = 50
+# Page-Hinkley: tolerated drift per event, alarm threshold, events before alarms
+# (tuned on simulated streams: ~1 false alarm per 80k stable events, a 25-point
+# shift in label mix or agreement is flagged within ~100 of the annotator's labels)
+PH_DELTA = {'strictness': 15.0, 'agreement': 0.07}
+PH_THRESHOLD = {'strictness': 2500.0, 'agreement': 12.0}
+MIN_EVENTS = 30
+# Keep one timeline point per annotator every this many events; once an
+# annotator has more than TIMELINE_POINTS points, every other one is dropped and
+# the spacing doubles, so the timeline stays bounded however long the stream is
+RECORD_EVERY = 5
+TIMELINE_POINTS = 500
+
+TWITTER_EPOCH_MS = 1288834974657
+
+
+# ===================
+# Event time
+# ===================
+def twitter_time(post_id):
+    """Post time from a Twitter snowflake id ('<id>_twitter'), else None"""
+    raw, _, source = str(post_id).partition('_')
+    if source != 'twitter' or not raw.isdigit():
+        return None
+    ms = (int(raw) >> 22) + TWITTER_EPOCH_MS
+    return pd.Timestamp(ms, unit='ms', tz='UTC')
+
+
+def time_basis(annotations):
+    """'annotation' when the frame has real annotation times, else 'post'"""
+    return 'annotation' if 'annotated_at' in annotations.columns else 'post'
+
+
+def ordered_events(annotations):
+    """annotations frame -> time-ordered frame with a ts column; untimed rows dropped"""
+    if time_basis(annotations) == 'annotation':
+        ts = pd.to_datetime(annotations['annotated_at'], utc=True, errors='coerce')
+    else:
+        ts = annotations['post_id'].map(twitter_time)
+        ts = pd.to_datetime(ts, utc=True)
+    events = annotations.assign(ts=ts).dropna(subset=['ts'])
+    return events.sort_values('ts', kind='stable').reset_index(drop=True)
+
+
+# ===================
+# Detectors
+# ===================
+class PageHinkley:
+    """Two-sided Page-Hinkley test on a stream of values"""
+
+    __slots__ = ('delta', 'threshold', 'n', 'mean', 'up', 'up_min', 'down', 'down_max')
+
+    def __init__(self, delta, threshold):
+        self.delta = delta
+        self.threshold = threshold
+        self.reset()
+
+    def reset(self):
+        self.n = 0
+        self.mean = 0.0
+        self.up = self.up_min = 0.0
+        self.down = self.down_max = 0.0
+
+    def update(self, x):
+        """Add one value; returns 'up', 'down' or None"""
+        self.n += 1
+        self.mean += (x - self.mean) / self.n
+        self.up += x - self.mean - self.delta
+        self.up_min = min(self.up_min, self.up)
+        self.down += x - self.mean + self.delta
+        self.down_max = max(self.down_max, self.down)
+        if self.n < MIN_EVENTS:
+            return None
+        if self.up - self.up_min > self.threshold:
+            return 'up'
+        if self.down_max - self.down > self.threshold:
+            return 'down'
+        return None
+
+
+class AnnotatorState:
+    """Running statistics for one annotator"""
+
+    __slots__ = ('events', 'ewma', 'window', 'window_sums', 'detectors', 'timeline', 'stride')
+
+    def __init__(self, stride=None):
+        self.events = 0
+        # Label shares (normal, offensive, hatespeech), strictness, agreement
+        self.ewma = None
+        self.window = deque()
+        self.window_sums = [0.0] * 5
+        self.detectors = {
+            name: PageHinkley(PH_DELTA[name], PH_THRESHOLD[name]) for name in ('strictness', 'agreement')
+        }
+        self.timeline = []
+        self.stride = stride
+
+    def update(self, label, agrees):
+        values = (
+            float(label == 'normal'), float(label == 'offensive'), float(label == 'hatespeech'),
+            STRICTNESS[label], float(agrees),
+        )
+        self.events += 1
+        if self.ewma is None:
+            self.ewma = list(values)
+        else:
+            self.ewma = [old + EWMA_ALPHA * (new - old) for old, new in zip(self.ewma, values)]
+
+        self.window.append(values)
+        for i, value in enumerate(values):
+            self.window_sums[i] += value
+        if len(self.window) > WINDOW:
+            for i, value in enumerate(self.window.popleft()):
+                self.window_sums[i] -= value
+        return values
+
+    def window_means(self):
+        n = len(self.window)
+        return [s / n for s in self.window_sums]
+
+
+# ===================
+# Engine
+# ===================
+class DriftEngine:
+    """Consumes annotation events in time order and flags per-annotator change points
+
+    Each annotator's timeline gets one row every record_every events (plus every
+    change point) and is thinned to at most max_points rows by doubling that
+    spacing. Pass record_every=None for long-running feeds that only need the alarms.
+    """
+
+    def __init__(self, record_every=RECORD_EVERY, max_points=TIMELINE_POINTS):
+        self.record_every = record_every
+        self.max_points = max_points
+        self.states = {}
+        self.change_points = []
+
+    def update(self, ts, annotator_id, label, majority_label):
+        """Process one annotation; returns the change points it triggered"""
+        state = self.states.get(annotator_id)
+        if state is None:
+            state = self.states[annotator_id] = AnnotatorState(self.record_every)
+        values = state.update(label, label == majority_label)
+
+        alarms = []
+        for name, value in (('strictness', values[3]), ('agreement', values[4])):
+            detector = state.detectors[name]
+            before = detector.mean
+            direction = detector.update(value)
+            if direction:
+                index = 3 if name == 'strictness' else 4
+                alarms.append({
+                    'ts': ts, 'annotator_id': annotator_id, 'signal': name, 'direction': direction,
+                    'before': before, 'after': state.window_means()[index], 'events': state.events,
+                })
+                detector.reset()
+        self.change_points.extend(alarms)
+
+        if alarms or (state.stride and state.events % state.stride == 0):
+            state.timeline.append(self._row(ts, annotator_id, state))
+            if state.stride and len(state.timeline) > self.max_points:
+                state.stride *= 2
+                state.timeline = [row for row in state.timeline if row['events'] % state.stride == 0]
+        return alarms
+
+    def run(self, events):
+        """Feed a frame from ordered_events() through the engine"""
+        for row in events[['ts', 'annotator_id', 'label', 'majority_label']].itertuples(index=False):
+            self.update(*row)
+        return self
+
+    def current(self):
+        """Latest statistics for every annotator seen so far"""
+        return pd.DataFrame(
+            [self._row(None, annotator_id, state) for annotator_id, state in self.states.items()]
+        ).drop(columns='ts')
+
+    def timeline_frame(self):
+        rows = [row for state in self.states.values() for row in state.timeline]
+        timeline = pd.DataFrame(rows, columns=TIMELINE_COLUMNS)
+        return timeline.sort_values('ts', kind='stable').reset_index(drop=True)
+
+    def change_point_frame(self):
+        return pd.DataFrame(self.change_points, columns=CHANGE_POINT_COLUMNS)
+
+    @staticmethod
+    def _row(ts, annotator_id, state):
+        window = state.window_means()
+        return {
+            'ts': ts,
+            'annotator_id': annotator_id,
+            'events': state.events,
+            'ewma_normal_pct': state.ewma[0] * 100,
+            'ewma_offensive_pct': state.ewma[1] * 100,
+            'ewma_hatespeech_pct': state.ewma[2] * 100,
+            'ewma_strictness': state.ewma[3],
+            'ewma_agreement': state.ewma[4],
+            'window_strictness': window[3],
+            'window_agreement': window[4],
+        }
+
+
+TIMELINE_COLUMNS = [
+    'ts', 'annotator_id', 'events', 'ewma_normal_pct', 'ewma_offensive_pct', 'ewma_hatespeech_pct',
+    'ewma_strictness', 'ewma_agreement', 'window_strictness', 'window_agreement',
+]
+CHANGE_POINT_COLUMNS = ['ts', 'annotator_id', 'signal', 'direction', 'before', 'after', 'events']
+
+
+def detect(annotations, record_every=RECORD_EVERY):
+    """Run the engine over an annotations frame; returns (timeline, change_points)"""
+    engine = DriftEngine(record_every).run(ordered_events(annotations))
+    return engine.timeline_frame(), engine.change_point_frame()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('annotations', help='annotations.csv written by pipeline.ingest')
+    args = parser.parse_args(argv)
+
+    annotations = pd.read_csv(Path(args.annotations))
+    events = ordered_events(annotations)
+    engine = DriftEngine(record_every=None)
+    for row in events[['ts', 'annotator_id', 'label', 'majority_label']].itertuples(index=False):
+        for alarm in engine.update(*row):
+            print(f"{alarm['ts']:%Y-%m-%d %H:%M} annotator {alarm['annotator_id']}: {alarm['signal']} "
+                  f"{alarm['direction']} ({alarm['before']:.2f} -> {alarm['after']:.2f})")
+    print(f"{len(events):,} annotations, {len(engine.change_points):,} change points "
+          f"across {len(engine.states):,} annotators")
+
+
+if __name__ == '__main__':
+    main()
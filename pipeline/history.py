@@ -0,0 +1,229 @@
+"""Append-only history of quality KPIs across pipeline runs.
+
+summary_metrics.csv only describes the latest data. Every ingest run (or an
+explicit `record`) also appends one point per series to a small SQLite file:
+
+- kpi/<metric>: every numeric value in summary_metrics.csv
+- rca/<category>: disagreement count and share per RCA category
+- annotator/<id>: label volume, agreement rate, strictness and label mix
+
+Series names are stored once; points are (series_id, ts, value) rows in a
+WITHOUT ROWID table clustered on (series_id, ts), so a range query for one
+series is a single index seek and the file stays compact. Reads are bucketed
+inside SQLite, so plotting months of daily runs returns at most max_points
+rows per series.
+
+Usage:
+    python -m pipeline.history record --data data
+    python -m pipeline.history show krippendorff_alpha
+"""
+import argparse
+import math
+import sqlite3
+import time
+from contextlib import closing
+from datetime import datetime, timezone
+from pathlib import Path
+
+import pandas as pd
+
+DATA_DIR = Path(__file__).parent.parent / 'data'
+HISTORY_PATH = DATA_DIR / 'history.sqlite'
+
+ANNOTATOR_METRICS = ('total_labels', 'agreement_rate', 'strictness_score',
+                     'hatespeech_pct', 'offensive_pct', 'normal_pct')
+DEFAULT_MAX_POINTS = 500
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    ts INTEGER PRIMARY KEY,
+    source TEXT NOT NULL DEFAULT ''
+);
+CREATE TABLE IF NOT EXISTS series (
+    series_id INTEGER PRIMARY KEY,
+    scope TEXT NOT NULL,
+    entity TEXT NOT NULL,
+    metric TEXT NOT NULL,
+    UNIQUE (scope, metric, entity)
+);
+CREATE TABLE IF NOT EXISTS points (
+    series_id INTEGER NOT NULL,
+    ts INTEGER NOT NULL,
+    value REAL NOT NULL,
+    PRIMARY KEY (series_id, ts)
+) WITHOUT ROWID;
+"""
+
+
+# ===================
+# Collect
+# ===================
+def collect_points(summary, annotators, rca_counts):
+    """(scope, entity, metric, value) tuples for one run
+
+    summary is the metric -> value dict from summary_metrics.csv, annotators the
+    annotators_analysis frame and rca_counts a category -> disagreement count map.
+    """
+    points = []
+    for metric, value in summary.items():
+        try:
+            points.append(('kpi', '', metric, float(value)))
+        except (TypeError, ValueError):
+            # Text values such as most_frequent_rca_category
+            continue
+
+    total = sum(rca_counts.values())
+    for category, count in rca_counts.items():
+        points.append(('rca', category, 'count', float(count)))
+        points.append(('rca', category, 'pct', round(count / total * 100, 2) if total else 0.0))
+
+    for row in annotators.itertuples(index=False):
+        for metric in ANNOTATOR_METRICS:
+            points.append(('annotator', str(row.annotator_id), metric, float(getattr(row, metric))))
+    return points
+
+
+def points_from_csvs(data_dir=DATA_DIR):
+    """collect_points() for the CSVs currently in data_dir"""
+    data_dir = Path(data_dir)
+    summary_df = pd.read_csv(data_dir / 'summary_metrics.csv', keep_default_na=False)
+    annotators = pd.read_csv(data_dir / 'annotators_analysis.csv')
+    rca_counts = {}
+    samples = data_dir / 'disagreement_samples.csv'
+    if samples.exists():
+        # Only one column is needed, so read it in chunks
+        chunks = pd.read_csv(samples, usecols=['rca_category'], keep_default_na=False, chunksize=100_000)
+        for chunk in chunks:
+            for category, count in chunk['rca_category'].value_counts().items():
+                rca_counts[category] = rca_counts.get(category, 0) + int(count)
+    return collect_points(dict(zip(summary_df['metric'], summary_df['value'])), annotators, rca_counts)
+
+
+# ===================
+# Store
+# ===================
+def connect(path=HISTORY_PATH, write=False):
+    """Open the store; only the write path creates the file and applies the schema"""
+    path = Path(path)
+    if not write:
+        return sqlite3.connect(f'file:{path}?mode=ro', uri=True)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(path)
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def append_run(points, path=HISTORY_PATH, ts=None, source=''):
+    """Append one run's points; returns the run timestamp (unix seconds)
+
+    Points are never updated. Re-recording the same second is a no-op.
+    """
+    ts = int(ts if ts is not None else time.time())
+    with closing(connect(path, write=True)) as conn, conn:
+        conn.execute('INSERT OR IGNORE INTO runs (ts, source) VALUES (?, ?)', (ts, source))
+        conn.executemany(
+            'INSERT OR IGNORE INTO series (scope, entity, metric) VALUES (?, ?, ?)',
+            {(scope, entity, metric) for scope, entity, metric, _ in points}
+        )
+        ids = {
+            (scope, entity, metric): series_id
+            for series_id, scope, entity, metric in conn.execute('SELECT series_id, scope, entity, metric FROM series')
+        }
+        conn.executemany(
+            'INSERT OR IGNORE INTO points (series_id, ts, value) VALUES (?, ?, ?)',
+            [(ids[(scope, entity, metric)], ts, value) for scope, entity, metric, value in points]
+        )
+    return ts
+
+
+# ===================
+# Read
+# ===================
+def runs(path=HISTORY_PATH):
+    """Every recorded run as a frame of (ts, source), oldest first"""
+    if not Path(path).exists():
+        return pd.DataFrame(columns=['ts', 'source'])
+    with closing(connect(path)) as conn:
+        df = pd.read_sql_query('SELECT ts, source FROM runs ORDER BY ts', conn)
+    df['ts'] = pd.to_datetime(df['ts'], unit='s', utc=True)
+    return df
+
+
+def list_series(scope, path=HISTORY_PATH):
+    """(entity, metric) pairs recorded for a scope"""
+    if not Path(path).exists():
+        return pd.DataFrame(columns=['entity', 'metric'])
+    with closing(connect(path)) as conn:
+        return pd.read_sql_query(
+            'SELECT entity, metric FROM series WHERE scope = ? ORDER BY metric, entity', conn, params=[scope]
+        )
+
+
+def query(scope, metrics, entities=None, start=None, end=None,
+          max_points=DEFAULT_MAX_POINTS, path=HISTORY_PATH):
+    """Points for the given series between start and end (unix seconds, inclusive)
+
+    When the range holds more than max_points runs, points are averaged into
+    max_points equal-width time buckets inside SQLite; each bucket is reported at
+    the time of its last run. Returns columns ts, entity, metric, value.
+    """
+    columns = ['ts', 'entity', 'metric', 'value']
+    if not Path(path).exists() or not metrics:
+        return pd.DataFrame(columns=columns)
+
+    with closing(connect(path)) as conn:
+        bounds = conn.execute('SELECT MIN(ts), MAX(ts) FROM runs').fetchone()
+        if bounds[0] is None:
+            return pd.DataFrame(columns=columns)
+        start = int(start if start is not None else bounds[0])
+        end = int(end if end is not None else bounds[1])
+        width = max(1, math.ceil((end - start + 1) / max_points))
+
+        where = [f"s.scope = ?", f"s.metric IN ({', '.join('?' * len(metrics))})"]
+        params = [scope, *metrics]
+        if entities is not None:
+            where.append(f"s.entity IN ({', '.join('?' * len(entities))})")
+            params.extend(entities)
+        sql = (
+            'SELECT MAX(p.ts) AS ts, s.entity, s.metric, AVG(p.value) AS value '
+            'FROM series s JOIN points p ON p.series_id = s.series_id '
+            f"WHERE {' AND '.join(where)} AND p.ts BETWEEN ? AND ? "
+            'GROUP BY s.series_id, (p.ts - ?) / ? ORDER BY s.series_id, ts'
+        )
+        df = pd.read_sql_query(sql, conn, params=params + [start, end, start, width])
+    df['ts'] = pd.to_datetime(df['ts'], unit='s', utc=True)
+    return df[columns]
+
+
+# ===================
+# CLI
+# ===================
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--history', default=str(HISTORY_PATH), help='history file')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    record = commands.add_parser('record', help='append the KPIs of the CSVs in a data folder')
+    record.add_argument('--data', default=str(DATA_DIR), help='folder with the dashboard CSVs')
+    record.add_argument('--at', default=None, help='ISO timestamp to record the run under (default: now)')
+
+    show = commands.add_parser('show', help='print one KPI over time')
+    show.add_argument('metric')
+    show.add_argument('--max-points', type=int, default=DEFAULT_MAX_POINTS)
+    args = parser.parse_args(argv)
+
+    if args.command == 'record':
+        at = None
+        if args.at:
+            parsed = datetime.fromisoformat(args.at)
+            at = (parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)).timestamp()
+        points = points_from_csvs(args.data)
+        ts = append_run(points, args.history, ts=at, source=str(args.data))
+        print(f"Recorded {len(points):,} points at {datetime.fromtimestamp(ts, timezone.utc):%Y-%m-%d %H:%M} UTC")
+    else:
+        df = query('kpi', [args.metric], max_points=args.max_points, path=args.history)
+        print(df[['ts', 'value']].to_string(index=False) if len(df) else 'No history recorded yet')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,430 @@
+"""Streaming ingestion of the raw HateXplain dataset.json into the dashboard CSVs.
+
+The notebook loads the whole dump with json.loads and then walks it once per
+analysis. This module does the same work in one pass per post, spread over
+worker processes:
+
+1. The main process only cuts the file into byte ranges. Each worker reads
+   its own range, finds the first post boundary in it and decodes the posts
+   that start inside the range, so nothing is parsed serially and memory
+   holds one range per worker.
+2. Per post, the worker computes labels, agreement, rationale words, RCA
+   category, per-annotator counts and the Krippendorff coincidence counts.
+   Rows are written as Parquet chunks; only small aggregates are sent back.
+3. The chunks are appended into the final CSVs and the aggregates are merged
+   into annotators_analysis.csv and summary_metrics.csv.
+4. The run's KPIs are appended to the metric history (see pipeline.history).
+
+Usage:
+    python -m pipeline.ingest path/to/dataset.json --out data --workers 8
+"""
+import argparse
+import json
+import os
+import re
+import shutil
+import tempfile
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from pipeline import history
+
+LABELS = ['normal', 'offensive', 'hatespeech']
+LABEL_INDEX = {label: i for i, label in enumerate(LABELS)}
+
+# Same keyword taxonomy the notebook uses; first matching category wins
+RCA_MAP = {
+    'Racial Slurs': ['nigger', 'niggers', 'nigga', 'chink', 'kike', 'spic', 'coon', 'gook'],
+    'Religious Terms': ['jews', 'jewish', 'muslim', 'muslims', 'islam', 'moslem'],
+    'Gender/Sexuality': ['women', 'woman', 'bitch', 'gay', 'fag', 'faggot', 'faggots', 'dyke'],
+    'Disability Slurs': ['retarded', 'retard', 'autistic'],
+    'Group References': ['white', 'black', 'blacks', 'immigrants', 'illegal'],
+    'Profanity': ['fuck', 'fucking', 'shit', 'ass', 'hate'],
+    'Dehumanizing': ['ghetto', 'trash', 'garbage', 'animal', 'animals'],
+}
+
+POST_COLUMNS = [
+    'post_id', 'text', 'text_length', 'label_1', 'label_2', 'label_3', 'majority_label', 'agreement_type',
+    'unique_labels', 'has_disagreement', 'target_groups', 'highlighted_words', 'rca_category',
+]
+
+# Not a cause: no highlighted word matched, or the annotators agreed
+RCA_UNCATEGORIZED = ('Other/Unclear', 'N/A')
+MIN_ANNOTATOR_LABELS = 100
+SHARD_BYTES = 8 << 20
+# Read-ahead past the end of a range to finish its last post
+READ_BLOCK_BYTES = 64 << 10
+
+
+# ===================
+# Byte-range shards
+# ===================
+# Every post in dataset.json is an entry '"<id>": {"post_id": ...' of the
+# top-level object. Inside JSON strings every '"' is escaped, so '{"post_id":'
+# can only open a post; a worker can jump to any byte offset, find the next
+# post by that marker and step back over its key, without reading what came
+# before the range.
+POST_START = re.compile(rb'\{\s*"post_id"\s*:')
+# Bytes read before a range so a key that straddles its start is seen whole
+CONTEXT_BYTES = 256
+
+
+def shard_ranges(path, shard_bytes=SHARD_BYTES):
+    """Split the file into (start, end) byte ranges, one per worker task"""
+    with open(path, 'rb') as f:
+        head = f.read(64).lstrip()
+    if not head.startswith(b'{'):
+        raise ValueError(f"{path}: expected a JSON object at the top level")
+    size = os.path.getsize(path)
+    return [(start, min(start + shard_bytes, size)) for start in range(0, size, shard_bytes)]
+
+
+def _empty_object(path):
+    with open(path, 'rb') as f:
+        return b''.join(f.read(64).split()) == b'{}'
+
+
+def _skip_ws_back(buf, i):
+    while i >= 0 and buf[i] in b' \t\r\n':
+        i -= 1
+    return i
+
+
+def _entries(buf, pos=0):
+    """(key_start, key_end, value_start) of every entry whose post starts at or after pos
+
+    Entries whose key is cut off by the start of buf are skipped.
+    """
+    for match in POST_START.finditer(buf, pos):
+        colon = _skip_ws_back(buf, match.start() - 1)
+        key_end = _skip_ws_back(buf, colon - 1) + 1
+        if colon < 0 or buf[colon] != ord(':') or buf[key_end - 1:key_end] != b'"':
+            continue
+        # Opening quote of the key: the previous '"' not escaped by a backslash
+        key_start = key_end - 1
+        while key_start > 0:
+            key_start = buf.rfind(b'"', 0, key_start)
+            backslashes = key_start - _skip_back_slashes(buf, key_start - 1) - 1
+            if key_start < 0 or backslashes % 2 == 0:
+                break
+        before = _skip_ws_back(buf, key_start - 1)
+        if key_start >= 0 and before >= 0 and buf[before] in b',{':
+            yield key_start, key_end, match.start()
+
+
+def _skip_back_slashes(buf, i):
+    while i >= 0 and buf[i] == ord('\\'):
+        i -= 1
+    return i
+
+
+def iter_shard_posts(path, start, end):
+    """Yield (post_id, post) for every entry whose key starts in [start, end)
+
+    Reads past end only as far as the start of the next entry, so the range's
+    last post is complete.
+    """
+    begin = max(0, start - CONTEXT_BYTES)
+    with open(path, 'rb') as f:
+        f.seek(begin)
+        buf = f.read(end - begin)
+        first, limit = start - begin, end - begin
+        eof = end >= os.path.getsize(path)
+        while not eof and not any(key_start >= limit for key_start, _, _ in _entries(buf, limit)):
+            more = f.read(READ_BLOCK_BYTES)
+            eof = not more
+            buf += more
+
+    decoder = json.JSONDecoder()
+    entries = [entry for entry in _entries(buf, first) if entry[0] >= first]
+    for i, (key_start, key_end, value_start) in enumerate(entries):
+        if key_start >= limit:
+            break
+        # Up to the next entry's key, or to the end of the file; raw_decode
+        # stops at the end of the post and ignores the separator that follows
+        value_end = entries[i + 1][0] if i + 1 < len(entries) else len(buf)
+        post, _ = decoder.raw_decode(buf[value_start:value_end].decode('utf-8'))
+        yield json.loads(buf[key_start:key_end]), post
+
+
+# ===================
+# Fused per-post pass (runs in workers)
+# ===================
+def assign_rca(words):
+    for category, keywords in RCA_MAP.items():
+        if any(w in keywords for w in words):
+            return category
+    return 'Other/Unclear'
+
+
+def most_frequent_rca_category(rca_counts):
+    """RCA category with the most disagreement samples, excluding Other/Unclear
+
+    Counts posts per assigned category. The notebook's hard-coded 'Group References'
+    ranked categories by highlighted-word frequency instead, so the two can differ.
+    """
+    named = {k: v for k, v in rca_counts.items() if k not in RCA_UNCATEGORIZED}
+    return max(named, key=named.get) if named else 'N/A'
+
+
+def process_shard(shard, path, start, end, chunk_dir):
+    """Decode one byte range, write its row chunks and return merged-able aggregates"""
+    posts = []
+    annotations = []
+    coincidence = np.zeros((len(LABELS), len(LABELS)))
+    annotator_counts = {}
+    with_rationales = 0
+
+    for post_id, sample in iter_shard_posts(path, start, end):
+        tokens = sample['post_tokens']
+        labels = [ann['label'] for ann in sample['annotators']]
+        targets = [t for ann in sample['annotators'] for t in ann['target']]
+
+        # Agreement
+        counts = Counter(labels)
+        unique_labels = len(counts)
+        majority_label = counts.most_common(1)[0][0]
+        agreement_type = {1: 'Full', 2: 'Partial'}.get(unique_labels, 'None')
+
+        # Coincidence counts for nominal Krippendorff's alpha
+        m = len(labels)
+        if m > 1:
+            n_uc = np.array([counts.get(label, 0) for label in LABELS], dtype=float)
+            coincidence += (np.outer(n_uc, n_uc) - np.diag(n_uc)) / (m - 1)
+
+        # Rationales
+        rationales = sample.get('rationales') or []
+        if any(1 in r for r in rationales if r):
+            with_rationales += 1
+        highlighted = set()
+        for rationale in rationales:
+            if rationale and len(rationale) == len(tokens):
+                highlighted.update(tokens[j].lower() for j, val in enumerate(rationale) if val == 1)
+
+        # Per-annotator label counts and agreement with the majority
+        for ann in sample['annotators']:
+            stats = annotator_counts.setdefault(ann['annotator_id'], [0, 0, 0, 0])
+            stats[LABEL_INDEX[ann['label']]] += 1
+            stats[3] += ann['label'] == majority_label
+            annotations.append((post_id, ann['annotator_id'], ann['label'], majority_label))
+
+        posts.append({
+            'post_id': post_id,
+            'text': ' '.join(tokens),
+            'text_length': len(tokens),
+            'label_1': labels[0],
+            'label_2': labels[1],
+            'label_3': labels[2],
+            'majority_label': majority_label,
+            'agreement_type': agreement_type,
+            'unique_labels': unique_labels,
+            'has_disagreement': unique_labels > 1,
+            'target_groups': ','.join(sorted(set(targets))) if targets else 'None',
+            'highlighted_words': ','.join(sorted(highlighted)),
+            'rca_category': assign_rca(highlighted) if unique_labels > 1 else 'N/A',
+        })
+
+    posts_df = pd.DataFrame(posts, columns=POST_COLUMNS)
+    annotations_df = pd.DataFrame(annotations, columns=['post_id', 'annotator_id', 'label', 'majority_label'])
+    posts_df.to_parquet(Path(chunk_dir) / f"posts-{shard:06d}.parquet", index=False)
+    annotations_df.to_parquet(Path(chunk_dir) / f"annotations-{shard:06d}.parquet", index=False)
+
+    return {
+        'shard': shard,
+        'posts': len(posts_df),
+        'annotations': len(annotations_df),
+        'agreement': posts_df['agreement_type'].value_counts().to_dict(),
+        'majority': posts_df['majority_label'].value_counts().to_dict(),
+        'rca': posts_df.loc[posts_df['has_disagreement'].astype(bool), 'rca_category'].value_counts().to_dict(),
+        'with_rationales': with_rationales,
+        'coincidence': coincidence,
+        'annotators': annotator_counts,
+    }
+
+
+# ===================
+# Merge
+# ===================
+def krippendorff_alpha_nominal(coincidence):
+    """Nominal alpha from a label x label coincidence matrix"""
+    n_c = coincidence.sum(axis=1)
+    n = n_c.sum()
+    observed = coincidence.sum() - np.trace(coincidence)
+    expected = (n_c.sum() ** 2 - (n_c ** 2).sum()) / (n - 1)
+    return 1 - observed / expected if expected else float('nan')
+
+
+def merge_results(results):
+    merged = {
+        'posts': 0, 'annotations': 0, 'with_rationales': 0,
+        'agreement': Counter(), 'majority': Counter(), 'rca': Counter(),
+        'coincidence': np.zeros((len(LABELS), len(LABELS))), 'annotators': {},
+    }
+    for r in results:
+        merged['posts'] += r['posts']
+        merged['annotations'] += r['annotations']
+        merged['with_rationales'] += r['with_rationales']
+        merged['agreement'].update(r['agreement'])
+        merged['majority'].update(r['majority'])
+        merged['rca'].update(r['rca'])
+        merged['coincidence'] += r['coincidence']
+        for annotator_id, counts in r['annotators'].items():
+            total = merged['annotators'].setdefault(annotator_id, [0, 0, 0, 0])
+            for i, value in enumerate(counts):
+                total[i] += value
+    return merged
+
+
+def categorize_annotator(score):
+    if score > 20:
+        return 'Strict (harsh)'
+    elif score < -20:
+        return 'Lenient (soft)'
+    return 'Balanced'
+
+
+def build_annotators(annotator_counts, min_labels=MIN_ANNOTATOR_LABELS):
+    rows = []
+    for annotator_id, (normal, offensive, hatespeech, agrees) in annotator_counts.items():
+        total = normal + offensive + hatespeech
+        if total < min_labels:
+            continue
+        strictness = (hatespeech - normal) / total * 100
+        rows.append({
+            'annotator_id': annotator_id,
+            'total_labels': total,
+            'agreement_rate': round(agrees / total, 3),
+            'hatespeech_pct': round(hatespeech / total * 100, 1),
+            'normal_pct': round(normal / total * 100, 1),
+            'offensive_pct': round(offensive / total * 100, 1),
+            'strictness_score': round(strictness, 1),
+            'bias_category': categorize_annotator(strictness),
+        })
+    columns = ['annotator_id', 'total_labels', 'agreement_rate', 'hatespeech_pct',
+               'normal_pct', 'offensive_pct', 'strictness_score', 'bias_category']
+    df = pd.DataFrame(rows, columns=columns)
+    return df.sort_values('agreement_rate', ascending=False, kind='stable')
+
+
+def build_summary(merged, annotators):
+    total = merged['posts']
+
+    def pct(count, base):
+        return round(count / base * 100, 1) if base else 0.0
+
+    bias = annotators['bias_category'].value_counts()
+    return pd.DataFrame({
+        'metric': [
+            'total_posts', 'total_annotators', 'total_annotations', 'krippendorff_alpha',
+            'full_agreement_rate', 'partial_agreement_rate', 'no_agreement_rate',
+            'majority_normal_pct', 'majority_offensive_pct', 'majority_hatespeech_pct',
+            'annotator_mean_agreement', 'strict_annotators_pct', 'lenient_annotators_pct',
+            'balanced_annotators_pct', 'most_frequent_rca_category', 'samples_with_rationales_pct',
+        ],
+        'value': [
+            total,
+            len(merged['annotators']),
+            merged['annotations'],
+            round(krippendorff_alpha_nominal(merged['coincidence']), 4),
+            pct(merged['agreement']['Full'], total),
+            pct(merged['agreement']['Partial'], total),
+            pct(merged['agreement']['None'], total),
+            pct(merged['majority']['normal'], total),
+            pct(merged['majority']['offensive'], total),
+            pct(merged['majority']['hatespeech'], total),
+            round(annotators['agreement_rate'].mean() * 100, 1) if len(annotators) else 0.0,
+            pct(bias.get('Strict (harsh)', 0), len(annotators)),
+            pct(bias.get('Lenient (soft)', 0), len(annotators)),
+            pct(bias.get('Balanced', 0), len(annotators)),
+            most_frequent_rca_category(merged['rca']),
+            pct(merged['with_rationales'], total),
+        ],
+    })
+
+
+def append_chunks(chunk_paths, out_path, row_filter=None):
+    """Append Parquet chunks to one CSV, one chunk in memory at a time"""
+    tmp = Path(f"{out_path}.tmp")
+    header = True
+    with open(tmp, 'w', encoding='utf-8', newline='') as f:
+        for path in chunk_paths:
+            df = pd.read_parquet(path)
+            if row_filter is not None:
+                df = df[row_filter(df)]
+            df.to_csv(f, index=False, header=header)
+            header = False
+    os.replace(tmp, out_path)
+
+
+# ===================
+# Driver
+# ===================
+def ingest(source, out_dir, workers=None, shard_bytes=SHARD_BYTES, history_path=None):
+    """Run the full ingestion and return the merged aggregates
+
+    When history_path is given, the run's KPIs are appended to that history file.
+    """
+    workers = workers or os.cpu_count() or 1
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    chunk_dir = Path(tempfile.mkdtemp(prefix='ingest-', dir=out_dir))
+    try:
+        # Workers read their own byte ranges; only the range bounds and the small
+        # aggregates cross process boundaries
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [
+                pool.submit(process_shard, shard, source, start, end, chunk_dir)
+                for shard, (start, end) in enumerate(shard_ranges(source, shard_bytes))
+            ]
+            results = [f.result() for f in futures]
+
+        results.sort(key=lambda r: r['shard'])
+        shards = [r['shard'] for r in results]
+        post_chunks = [chunk_dir / f"posts-{s:06d}.parquet" for s in shards]
+        annotation_chunks = [chunk_dir / f"annotations-{s:06d}.parquet" for s in shards]
+
+        append_chunks(post_chunks, out_dir / 'posts_analysis.csv')
+        append_chunks(post_chunks, out_dir / 'disagreement_samples.csv', lambda df: df['has_disagreement'])
+        append_chunks(annotation_chunks, out_dir / 'annotations.csv')
+
+        merged = merge_results(results)
+        if merged['posts'] == 0 and not _empty_object(source):
+            raise ValueError(f"{source}: no posts found; expected entries like '\"<id>\": {{\"post_id\": ...}}'")
+        annotators = build_annotators(merged['annotators'])
+        annotators.to_csv(out_dir / 'annotators_analysis.csv', index=False)
+        summary = build_summary(merged, annotators)
+        summary.to_csv(out_dir / 'summary_metrics.csv', index=False)
+
+        if history_path:
+            points = history.collect_points(dict(zip(summary['metric'], summary['value'])), annotators, merged['rca'])
+            history.append_run(points, history_path, source=str(source))
+        return merged
+    finally:
+        shutil.rmtree(chunk_dir, ignore_errors=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('source', help='path to HateXplain dataset.json')
+    parser.add_argument('--out', default=str(Path(__file__).parent.parent / 'data'), help='output folder')
+    parser.add_argument('--workers', type=int, default=None, help='worker processes (default: all cores)')
+    parser.add_argument('--shard-mb', type=float, default=SHARD_BYTES / (1 << 20),
+                        help='MB of dataset.json per worker task (default 8)')
+    parser.add_argument('--history', default=str(history.HISTORY_PATH), help='metric history file to append to')
+    parser.add_argument('--no-history', action='store_true', help='do not record this run in the history')
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    history_path = None if args.no_history else args.history
+    merged = ingest(args.source, args.out, args.workers, int(args.shard_mb * (1 << 20)), history_path)
+    print(f"Ingested {merged['posts']:,} posts / {merged['annotations']:,} annotations "
+          f"into {args.out} in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == '__main__':
+    main()